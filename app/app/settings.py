@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 import os
+import sys
 
 from pathlib import Path
 
@@ -44,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so the whole middleware stack is inside the measured time
+    "core.metrics.MetricsMiddleware",
+    "core.query_inspector.QueryInspectorMiddleware",
+    "core.replicas.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -75,13 +80,22 @@ WSGI_APPLICATION = "app.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
+# DB_CONN_MAX_AGE keeps connections open between requests (0 closes them
+# after every request), set DB_POOLER=transaction when connecting through
+# a transaction pooling pgbouncer, which cannot hold server side cursors
+DB_POOLER = os.environ.get('DB_POOLER', '')
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
         "HOST": os.environ.get('DB_HOST'),
+        "PORT": os.environ.get('DB_PORT', ''),
         "NAME": os.environ.get('DB_NAME'),
         "USER": os.environ.get('DB_USER'),
         "PASSWORD": os.environ.get('DB_PASS'),
+        "CONN_MAX_AGE": int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "DISABLE_SERVER_SIDE_CURSORS": DB_POOLER == 'transaction',
     }
 }
 # DATABASES = {
@@ -109,6 +123,34 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# https://docs.djangoproject.com/en/4.0/topics/auth/passwords/
+
+# work factor of the preferred PBKDF2 hasher, hashes made with another
+# value are upgraded transparently on the next successful login
+PASSWORD_HASH_ITERATIONS = int(
+    os.environ.get('PASSWORD_HASH_ITERATIONS', 320000)
+)
+
+PASSWORD_HASHERS = [
+    "core.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+TESTING = sys.argv[1:2] == ['test']
+
+# a fast, insecure hasher for the test suite only, it is never preferred
+# outside of it; lower PASSWORD_HASH_ITERATIONS to speed up local seeding
+if TESTING:
+    PASSWORD_HASHERS.insert(0, "django.contrib.auth.hashers.MD5PasswordHasher")
+
+AUTHENTICATION_BACKENDS = [
+    "core.backends.TokenModelBackend",
+]
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
@@ -130,3 +172,115 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = "core.User"
+
+REST_FRAMEWORK = {
+    "DEFAULT_PAGINATION_CLASS": "recipe.pagination.RecipeCursorPagination",
+    # default number of rows per page for the cursor paginated list endpoints
+    "PAGE_SIZE": int(os.environ.get('API_PAGE_SIZE', 100)),
+    # same output as the default JSONRenderer, rendered by orjson
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# per-user cache of the recipe api list and detail responses, any backend
+# from CACHES can be used, shared backends keep workers consistent
+RESPONSE_CACHE = {
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 300,
+}
+
+# validated api tokens are kept in an in-process LRU for TTL seconds, set
+# CACHE_ALIAS to one of CACHES to share them between worker processes. the
+# other workers then drop their copy of a revoked token within LOCAL_TTL
+# seconds, without it they accept it for up to TTL seconds
+TOKEN_AUTH_CACHE = {
+    "MAX_SIZE": 10000,
+    "TTL": int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60)),
+    "LOCAL_TTL": int(os.environ.get('TOKEN_AUTH_CACHE_LOCAL_TTL', 5)),
+    "CACHE_ALIAS": os.environ.get('TOKEN_AUTH_CACHE_ALIAS') or None,
+}
+
+# per-view latency, query and response size histograms served at /metrics
+# in the Prometheus text format, set METRICS_TOKEN to require a bearer
+# token from the scraper. each process keeps its own, with several workers
+# set METRICS_DIRECTORY to a directory they share so /metrics adds them up
+METRICS = {
+    "ENABLED": os.environ.get('METRICS_ENABLED', '1') == '1',
+    "TOKEN": os.environ.get('METRICS_TOKEN') or None,
+    "DIRECTORY": os.environ.get('METRICS_DIRECTORY') or None,
+}
+
+# log queries repeated REPEAT_THRESHOLD times in one request (N+1 loops)
+# and queries slower than SLOW_QUERY_MS with the view name, the test suite
+# raises on the repeated ones so an N+1 fails its test
+QUERY_INSPECTOR = {
+    "ENABLED": TESTING or os.environ.get('QUERY_INSPECTOR_ENABLED') == '1',
+    "REPEAT_THRESHOLD": int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5)),
+    "SLOW_QUERY_MS": int(os.environ.get('SLOW_QUERY_MS', 100)),
+    "RAISE": TESTING,
+}
+
+# read replicas of the default database, DB_REPLICA_HOSTS is a comma
+# separated list of hosts serving it under the same name and credentials.
+# safe requests read from a replica unless their client wrote less than
+# STICKY_SECONDS ago, which should be longer than the replication lag. the
+# writes are recorded in the default cache, which must be shared by the
+# workers: `manage.py check` fails on a LocMem cache outside DEBUG
+DB_REPLICA_HOSTS = [
+    host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host
+]
+for index, host in enumerate(DB_REPLICA_HOSTS, 1):
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"], "HOST": host, "TEST": {"MIRROR": "default"},
+    }
+if TESTING:
+    # a separate test database stands in for a replica, the router tests
+    # write to it directly to play replication lag
+    DATABASES["replica"] = {
+        **DATABASES["default"], "TEST": {"NAME": "test_replica"},
+    }
+
+# each user's tags, ingredients and recipes live on one shard, recorded in
+# User.shard. DB_SHARD_HOSTS is a comma separated list of hosts serving
+# further databases with the default's name and credentials, new users go
+# to the shard with the fewest users and rebalance_shards moves them.
+# migrate every shard with `migrate --database shardN`
+DB_SHARD_HOSTS = [
+    host for host in os.environ.get('DB_SHARD_HOSTS', '').split(',') if host
+]
+for index, host in enumerate(DB_SHARD_HOSTS, 1):
+    DATABASES[f"shard{index}"] = {**DATABASES["default"], "HOST": host}
+if TESTING and not DB_SHARD_HOSTS:
+    # second shard for the sharding tests, which turn sharding on
+    DATABASES["shard1"] = {
+        **DATABASES["default"], "TEST": {"NAME": "test_shard1"},
+    }
+
+DATABASE_SHARDS = {
+    "ALIASES": ["default"] + [f"shard{index}"
+                              for index in range(1, len(DB_SHARD_HOSTS) + 1)],
+}
+
+# the shard router answers for the sharded models, the replica router for
+# the rest, so replicas serve the users and tokens of the default database
+DATABASE_ROUTERS = ["core.sharding.ShardRouter", "core.replicas.ReplicaRouter"]
+DATABASE_REPLICAS = {
+    "ALIASES": [f"replica{index}"
+                for index in range(1, len(DB_REPLICA_HOSTS) + 1)],
+    "STICKY_SECONDS": int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5)),
+}
+
+# minhash signatures of the similar recipes lookup, rebuild them with
+# rebuild_recipe_signatures after changing these
+RECIPE_SIMILARITY = {
+    "PERMUTATIONS": 64,
+    "BANDS": 32,
+}
@@ -0,0 +1,61 @@
+"""
+Production settings for app project, used by the gunicorn profile.
+
+Everything not overridden here comes from app.settings.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from app.settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+    if host
+]
+
+STATIC_ROOT = BASE_DIR / 'static'  # noqa: F405
+
+# the response cache versions, pantry index versions and replica pins are
+# read by every worker, so they need a cache server: CACHE_URL is a
+# redis://host:port/db or memcached://host:port url (the latter needs
+# pymemcache installed)
+CACHE_BACKENDS = {
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+    "memcached": "django.core.cache.backends.memcached.PyMemcacheCache",
+}
+CACHE_URL = os.environ.get('CACHE_URL', '')
+cache_scheme, _, cache_address = CACHE_URL.partition('://')
+if cache_scheme not in CACHE_BACKENDS or not cache_address:
+    raise ImproperlyConfigured(
+        'set CACHE_URL to a redis:// or memcached:// url'
+    )
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[cache_scheme],
+        "LOCATION": (cache_address if cache_scheme == "memcached"
+                     else CACHE_URL),
+    }
+}
+
+# the validated tokens are shared through it so that every worker stops
+# accepting a revoked token at once
+TOKEN_AUTH_CACHE = dict(TOKEN_AUTH_CACHE)  # noqa: F405
+TOKEN_AUTH_CACHE["CACHE_ALIAS"] = TOKEN_AUTH_CACHE["CACHE_ALIAS"] or "default"
+
+# gunicorn runs several workers, /metrics adds up the histograms they
+# write to this directory
+METRICS = dict(METRICS)  # noqa: F405
+METRICS["DIRECTORY"] = METRICS["DIRECTORY"] or '/tmp/recipe-api-metrics'
+
+# /metrics exposes per-view traffic, it is only served to a scraper that
+# sends METRICS_TOKEN unless METRICS_ENABLED=0 turns the endpoint off
+if METRICS["ENABLED"] and not METRICS["TOKEN"]:
+    raise ImproperlyConfigured(
+        'set METRICS_TOKEN, or METRICS_ENABLED=0 to turn /metrics off'
+    )
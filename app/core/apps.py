@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        # connect the cache invalidation and recipe counter receivers and
+        # register the checks
+        from core import authentication, checks, counters  # noqa: F401
+        from core.db import connect_health_checks
+        from core.sharding import connect_id_ranges
+        from core.metrics import connect_query_metrics
+        from core.query_inspector import connect_query_inspector
+        connect_health_checks()
+        connect_query_metrics()
+        connect_query_inspector()
+        connect_id_ranges(self)
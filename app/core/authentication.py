@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULTS = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'LOCAL_TTL': 5,
+    'CACHE_ALIAS': None,
+}
+SHARED_KEY_PREFIX = 'token-auth:'
+
+
+def get_setting(name):
+    """read a value from the TOKEN_AUTH_CACHE setting"""
+    return getattr(settings, 'TOKEN_AUTH_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def _fields(instance):
+    """the database alias and the concrete field values of a model
+    instance, the part of it that is safe to share between requests"""
+    return instance._state.db, {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+    }
+
+
+def _rebuild(model, fields):
+    db, values = fields
+    return model.from_db(db, list(values), list(values.values()))
+
+
+class TokenCache:
+    """in-process LRU of validated tokens with an optional shared cache
+
+    the field values of the user and the token are cached, and every hit
+    rebuilds them as new instances so that requests never share one.
+    deleting a token or deactivating a user evicts it from this process
+    and from the shared cache right away, the in-process entries of the
+    other workers are only dropped when they expire: they keep accepting
+    a revoked token for up to LOCAL_TTL seconds, or TTL seconds when no
+    shared cache is configured
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _shared(self):
+        alias = get_setting('CACHE_ALIAS')
+        return caches[alias] if alias else None
+
+    def _local_ttl(self):
+        if self._shared() is None:
+            return get_setting('TTL')
+        return min(get_setting('LOCAL_TTL'), get_setting('TTL'))
+
+    def _rebuild(self, value):
+        user, token = value
+        return _rebuild(get_user_model(), user), _rebuild(Token, token)
+
+    def get_local(self, key):
+        """return the (user, token) pair from the in-process LRU only, this
+        never does I/O and is safe to call from async code"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return self._rebuild(entry[1])
+
+    def get(self, key):
+        """return the cached (user, token) pair for the key or None"""
+        value = self.get_local(key)
+        if value is not None:
+            return value
+
+        shared = self._shared()
+        if shared is not None:
+            value = shared.get(SHARED_KEY_PREFIX + key)
+            if value is not None:
+                self._store_local(key, value, time.monotonic())
+                return self._rebuild(value)
+        return None
+
+    def set(self, key, user, token):
+        """cache the fields of the user and the token for the key"""
+        value = (_fields(user), _fields(token))
+        self._store_local(key, value, time.monotonic())
+        shared = self._shared()
+        if shared is not None:
+            shared.set(SHARED_KEY_PREFIX + key, value, get_setting('TTL'))
+
+    def _store_local(self, key, value, now):
+        with self._lock:
+            self._entries[key] = (now + self._local_ttl(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > get_setting('MAX_SIZE'):
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        """drop the given token keys from every cache layer"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        shared = self._shared()
+        if shared is not None and keys:
+            shared.delete_many([SHARED_KEY_PREFIX + key for key in keys])
+
+    def delete_user(self, user_id):
+        """drop every cached token that belongs to the user"""
+        with self._lock:
+            keys = [key for key, (_, (_, (_, token)))
+                    in self._entries.items() if token['user_id'] == user_id]
+        keys += list(Token.objects.filter(user_id=user_id)
+                     .values_list('key', flat=True))
+        self.delete(*set(keys))
+
+    def clear(self):
+        """empty the in-process cache"""
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """token authentication that skips the token/user query on cache hits"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """stop accepting a token as soon as it is deleted"""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_inactive_user(sender, instance, **kwargs):
+    """stop accepting the tokens of a user that has been deactivated"""
+    if not instance.is_active:
+        token_cache.delete_user(instance.pk)
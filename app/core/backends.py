@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class TokenModelBackend(ModelBackend):
+    """model backend that fetches the user's api token in the same query
+
+    the token view can then hand out an existing token without another
+    round trip, a user without a token has auth_token cached as missing
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        try:
+            user = UserModel._default_manager.select_related(
+                'auth_token'
+            ).get(**{UserModel.USERNAME_FIELD: username})
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            UserModel().set_password(password)
+        else:
+            # check_password rehashes the password if the preferred hasher
+            # or its work factor changed
+            if user.check_password(password) and \
+                    self.user_can_authenticate(user):
+                return user
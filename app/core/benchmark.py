@@ -0,0 +1,120 @@
+import random
+import time
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.urls import URLResolver
+
+from core.counters import refresh_recipe_counts
+from core.models import Tag, Ingredient, Recipe
+
+# password of the first seeded user, used to benchmark the token endpoint
+BENCHMARK_PASSWORD = 'benchmark-password'
+WORDS = ('rice', 'beans', 'beef', 'chicken', 'pepper', 'onion', 'tomato',
+         'plantain', 'yam', 'egg', 'fish', 'garlic', 'ginger', 'spinach')
+
+
+class Rollback(Exception):
+    """raised to undo the synthetic data created by a benchmark"""
+
+
+def seed(users=10, recipes=100, tags=20, ingredients=50, batch_size=5000,
+         email_prefix='bench', seed_value=0):
+    """bulk insert synthetic users with recipes, tags and ingredients
+
+    every user gets the given number of rows, recipes are linked to up to 3
+    tags and up to 8 ingredients, returns the list of created users
+    """
+    rnd = random.Random(seed_value)
+    User = get_user_model()
+    emails = [f'{email_prefix}{i}@example.com' for i in range(users)]
+    User.objects.bulk_create([
+        User(email=email, name=email.split('@')[0], password='!')
+        for email in emails
+    ], batch_size=batch_size)
+    created = list(User.objects.filter(email__in=emails).order_by('id'))
+
+    def words(i):
+        return f'{rnd.choice(WORDS)} {rnd.choice(WORDS)} {i}'
+
+    Tag.objects.bulk_create([
+        Tag(user=user, name=words(i))
+        for user in created for i in range(tags)
+    ], batch_size=batch_size)
+    Ingredient.objects.bulk_create([
+        Ingredient(user=user, name=words(i))
+        for user in created for i in range(ingredients)
+    ], batch_size=batch_size)
+    Recipe.objects.bulk_create([
+        Recipe(user=user, title=words(i), time_minutes=rnd.randint(1, 240),
+               price=rnd.randint(100, 99999) / 100)
+        for user in created for i in range(recipes)
+    ], batch_size=batch_size)
+
+    def pks_by_user(model):
+        grouped = {}
+        rows = model.objects.filter(user__in=created).values_list(
+            'user_id', 'pk')
+        for user_id, pk in rows.iterator():
+            grouped.setdefault(user_id, []).append(pk)
+        return grouped
+
+    user_tags = pks_by_user(Tag)
+    user_ingredients = pks_by_user(Ingredient)
+    tag_links, ingredient_links = [], []
+    for user_id, recipe_ids in pks_by_user(Recipe).items():
+        tag_pool = user_tags.get(user_id, [])
+        ingredient_pool = user_ingredients.get(user_id, [])
+        for recipe_id in recipe_ids:
+            count = min(len(tag_pool), rnd.randint(0, 3))
+            tag_links += [
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=pk)
+                for pk in rnd.sample(tag_pool, count)
+            ]
+            count = min(len(ingredient_pool), rnd.randint(1, 8))
+            ingredient_links += [
+                Recipe.ingredients.through(recipe_id=recipe_id,
+                                           ingredient_id=pk)
+                for pk in rnd.sample(ingredient_pool, count)
+            ]
+    Recipe.tags.through.objects.bulk_create(tag_links, batch_size=batch_size)
+    Recipe.ingredients.through.objects.bulk_create(ingredient_links,
+                                                   batch_size=batch_size)
+    for model in (Tag, Ingredient):
+        refresh_recipe_counts(model, model.objects.filter(user__in=created))
+    return created
+
+
+def timed(func, repeat=5):
+    """run func repeat times and return the best wall time in ms"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def percentile(values, pct):
+    """return the pct percentile of the values, nearest rank"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def route_names(urlconf, namespace):
+    """the names of every route in a urls module, prefixed by namespace"""
+    names = set()
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+            elif pattern.name:
+                names.add(f'{namespace}:{pattern.name}')
+
+    walk(import_module(urlconf).urlpatterns)
+    return names
@@ -0,0 +1,63 @@
+"""system checks of the settings that need a shared cache"""
+from django.conf import settings
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+from django.utils.module_loading import import_string
+
+from core import authentication, replicas
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def shared_cache_errors(alias, setting, purpose, check_id):
+    """an error unless the cache alias is shared by every worker process
+
+    a development server or the test suite runs in one process, so any
+    backend does there
+    """
+    if settings.DEBUG or getattr(settings, 'TESTING', False):
+        return []
+    config = settings.CACHES.get(alias)
+    if config is None:
+        return [Error(f'{setting} names the unknown cache {alias!r}.',
+                      id=check_id)]
+    if issubclass(import_string(config['BACKEND']), PROCESS_LOCAL_BACKENDS):
+        return [Error(
+            f'The {alias!r} cache of {setting} is local to each process, '
+            f'{purpose} would differ between the worker processes.',
+            hint='Point it at a shared backend such as Redis or Memcached.',
+            id=check_id,
+        )]
+    return []
+
+
+@register(Tags.caches, Tags.database)
+def check_replica_cache(app_configs, **kwargs):
+    """the read-your-writes pins must reach the worker serving the next
+    request of the client"""
+    if not replicas.get_setting('ALIASES'):
+        return []
+    return shared_cache_errors(
+        replicas.get_setting('CACHE_ALIAS'), 'DATABASE_REPLICAS',
+        'clients pinned to the primary after a write', 'core.E001',
+    )
+
+
+@register(Tags.caches, Tags.security)
+def check_token_cache(app_configs, **kwargs):
+    """a deleted token or deactivated user must be refused by every worker,
+    not only by the one that received the signal"""
+    if settings.DEBUG or getattr(settings, 'TESTING', False):
+        return []
+    alias = authentication.get_setting('CACHE_ALIAS')
+    if alias is None:
+        return [Error(
+            'TOKEN_AUTH_CACHE has no CACHE_ALIAS, the other worker '
+            'processes would accept revoked tokens for up to TTL seconds.',
+            hint='Set CACHE_ALIAS to a cache shared by the workers.',
+            id='core.E002',
+        )]
+    return shared_cache_errors(
+        alias, 'TOKEN_AUTH_CACHE', 'revoked tokens', 'core.E002',
+    )
@@ -0,0 +1,131 @@
+"""the recipe_count columns of Tag and Ingredient
+
+the receivers below keep the counts in step with the recipe/tag and
+recipe/ingredient through tables with single `UPDATE ... SET recipe_count
+= recipe_count +/- n` statements, inside the transaction of the change.
+code that writes the through tables with bulk_create, which sends no
+signals, calls `add_recipe_counts`, code that deletes their rows with a
+queryset delete calls `remove_recipe_counts`, and `refresh_recipe_counts`
+recomputes the columns from the through tables to repair any drift.
+decrements stop at zero, a count that drifted low must not fail the
+unsigned column's check in the middle of a user's change
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient
+
+RELATIONS = {Tag: 'tags', Ingredient: 'ingredients'}
+
+
+def _through(model):
+    return getattr(Recipe, RELATIONS[model]).through
+
+
+def _column(model):
+    return model._meta.model_name + '_id'
+
+
+def actual_recipe_count(model):
+    """expression counting the through rows of each tag or ingredient"""
+    column = _column(model)
+    counts = _through(model).objects.filter(
+        **{column: OuterRef('pk')}
+    ).order_by().values(column).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def refresh_recipe_counts(model, queryset=None, using=None):
+    """recompute recipe_count, return the number of rows that were off"""
+    if queryset is None:
+        queryset = model.objects.all()
+    if using is not None:
+        queryset = queryset.using(using)
+    actual = actual_recipe_count(model)
+    return queryset.exclude(recipe_count=actual).update(recipe_count=actual)
+
+
+def add_recipe_counts(model, pks, using=None):
+    """add through rows written without signals to recipe_count
+
+    `pks` holds the tag or ingredient id of every new row, ids repeated n
+    times get one update for all the ids with the same n
+    """
+    by_count = defaultdict(list)
+    for pk, count in Counter(pks).items():
+        by_count[count].append(pk)
+    for count, group in by_count.items():
+        model.objects.using(using).filter(pk__in=group).update(
+            recipe_count=F('recipe_count') + count
+        )
+
+
+def _decremented(count=1):
+    """recipe_count lowered by count, clamped at zero"""
+    return Greatest(F('recipe_count') - count, 0)
+
+
+def remove_recipe_counts(model, recipe_ids, using=None):
+    """take the through rows of the recipes off recipe_count, in one update,
+    before they are deleted without signals"""
+    column = _column(model)
+    removed = _through(model).objects.using(using).filter(
+        recipe_id__in=recipe_ids, **{column: OuterRef('pk')}
+    ).order_by().values(column).annotate(count=Count('pk')).values('count')
+    model.objects.using(using).filter(
+        pk__in=_linked(model, recipe_ids, using)
+    ).update(recipe_count=_decremented(
+        Subquery(removed, output_field=IntegerField())
+    ))
+
+
+def _linked(model, recipe_ids, using, pks=None):
+    """subquery of the ids linked to the recipes, optionally among pks"""
+    column = _column(model)
+    rows = _through(model).objects.using(using).filter(
+        recipe_id__in=recipe_ids
+    )
+    if pks is not None:
+        rows = rows.filter(**{f'{column}__in': pks})
+    return rows.values(column)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, model,
+                             pk_set, using, **kwargs):
+    # the rows are on the database of the change, which is not where the
+    # router sends them outside a request on a sharded setup
+    if reverse:
+        # tag.recipe_set.add(...) and friends, only the one row changes
+        row = type(instance).objects.using(using).filter(pk=instance.pk)
+        if action == 'post_add':
+            row.update(recipe_count=F('recipe_count') + len(pk_set))
+        elif action in ('post_remove', 'post_clear'):
+            refresh_recipe_counts(type(instance), row, using)
+        return
+
+    # post_add only gets the ids that were not linked yet, removals are
+    # counted before the delete so ids that were never linked are ignored
+    if action == 'post_add':
+        model.objects.using(using).filter(pk__in=pk_set).update(
+            recipe_count=F('recipe_count') + 1
+        )
+    elif action in ('pre_remove', 'pre_clear'):
+        model.objects.using(using).filter(
+            pk__in=_linked(model, [instance.pk], using, pk_set)
+        ).update(recipe_count=_decremented())
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, using, **kwargs):
+    # the through rows are removed by the delete cascade without any
+    # m2m_changed signal, and they are gone by post_delete
+    for model in RELATIONS:
+        model.objects.using(using).filter(
+            pk__in=_linked(model, [instance.pk], using)
+        ).update(recipe_count=_decremented())
@@ -0,0 +1,52 @@
+import django
+from django.db import connections
+
+
+def install_health_check(connection, **kwargs):
+    """connection_created receiver, pings the connection on its first use
+    after a request started
+
+    backport of the CONN_HEALTH_CHECKS database option of Django 4.1: a
+    persistent connection the server has closed while idle is replaced
+    before the first query of the request instead of failing it, and the
+    connections a request does not use are not pinged. the wrapper stays on
+    the connection object, so persistent connections are wrapped once
+    """
+    if django.VERSION >= (4, 1) or hasattr(connection, 'health_check_done'):
+        return
+    # a new connection needs no check until the next request
+    connection.health_check_done = True
+    ensure_connection = connection.ensure_connection
+
+    def checked_ensure_connection():
+        if not connection.health_check_done:
+            connection.health_check_done = True
+            if (connection.connection is not None
+                    and not connection.in_atomic_block
+                    and not connection.is_usable()):
+                connection.close()
+        ensure_connection()
+
+    connection.ensure_connection = checked_ensure_connection
+
+
+def reset_health_checks(**kwargs):
+    """request_started receiver, flags the open connections for a check on
+    their next use without any I/O"""
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and hasattr(connection, 'health_check_done')):
+            connection.health_check_done = False
+
+
+def connect_health_checks():
+    """register the health check on Django versions without it"""
+    if django.VERSION >= (4, 1):
+        return
+    from django.core.signals import request_started
+    from django.db.backends.signals import connection_created
+    connection_created.connect(install_health_check,
+                               dispatch_uid='core.db.health_checks')
+    request_started.connect(reset_health_checks,
+                            dispatch_uid='core.db.health_checks')
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 hasher with the work factor set by PASSWORD_HASH_ITERATIONS
+
+    it keeps the pbkdf2_sha256 algorithm name, so existing hashes still
+    verify and are rehashed on the next login when the iterations change
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS',
+                       hashers.PBKDF2PasswordHasher.iterations)
@@ -0,0 +1,274 @@
+import json
+import platform
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+from core.benchmark import BENCHMARK_PASSWORD, percentile, route_names
+from core.models import Tag, Ingredient, Recipe
+from recipe.cache import response_cache
+
+ROUTES = (('recipe.urls', 'recipe'), ('user.urls', 'user'))
+
+# route is the url name the case covers, writes run in a rolled back
+# transaction so every request sees the same data
+Case = namedtuple('Case', 'name route method path kwargs status')
+
+
+def case(name, route, method='get', path=None, args=(), status=200,
+         **kwargs):
+    return Case(name, route, method, path or reverse(route, args=args),
+                kwargs, status)
+
+
+def build_cases(user):
+    """the requests measured for every route of the recipe and user apps"""
+    recipe = Recipe.objects.filter(user=user).order_by('id').first()
+    tag = Tag.objects.filter(user=user).order_by('id').first()
+    ingredient = Ingredient.objects.filter(user=user).order_by('id').first()
+    if recipe is None or tag is None or ingredient is None:
+        raise CommandError(f'{user.email} has no data, run seed_benchmark')
+    tag_ids = list(recipe.tags.values_list('id', flat=True)) or [tag.id]
+    ingredient_ids = list(recipe.ingredients.values_list('id', flat=True))
+    word = recipe.title.split()[0]
+    week = Recipe.objects.filter(user=user).order_by('id').values_list(
+        'id', flat=True)[:20]
+    recipe_payload = {
+        'title': 'benchmark recipe', 'time_minutes': 30, 'price': '12.50',
+        'tags': tag_ids, 'ingredients': ingredient_ids,
+    }
+    import_rows = ''.join(
+        json.dumps({'title': f'imported {i}', 'time_minutes': 10,
+                    'price': '5.00', 'tags': [word],
+                    'ingredients': [word, 'salt']}) + '\n'
+        for i in range(100)
+    )
+
+    def upload():
+        return {'file': SimpleUploadedFile('recipes.ndjson',
+                                           import_rows.encode())}
+
+    return [
+        case('api-root', 'recipe:api-root'),
+        case('tag-list', 'recipe:tag-list'),
+        case('tag-list-by-usage', 'recipe:tag-list',
+             path=reverse('recipe:tag-list') + '?ordering=usage'),
+        case('tag-create', 'recipe:tag-list', 'post', status=201,
+             data={'name': 'benchmark tag'}),
+        case('ingredient-list', 'recipe:ingredient-list'),
+        case('ingredient-create', 'recipe:ingredient-list', 'post',
+             status=201, data={'name': 'benchmark ingredient'}),
+        case('recipe-list', 'recipe:recipe-list'),
+        case('recipe-list-filtered', 'recipe:recipe-list',
+             path=reverse('recipe:recipe-list')
+             + f'?tags={tag_ids[0]}&price_max=500'),
+        case('recipe-create', 'recipe:recipe-list', 'post', status=201,
+             data=recipe_payload, content_type='application/json'),
+        case('recipe-detail', 'recipe:recipe-detail', args=[recipe.id]),
+        case('recipe-update', 'recipe:recipe-detail', 'patch',
+             args=[recipe.id], data={'title': 'renamed'},
+             content_type='application/json'),
+        case('recipe-delete', 'recipe:recipe-detail', 'delete',
+             args=[recipe.id], status=204),
+        case('recipe-bulk', 'recipe:recipe-bulk', 'post', status=201,
+             data=[recipe_payload] * 100, content_type='application/json'),
+        case('recipe-search', 'recipe:recipe-search',
+             path=reverse('recipe:recipe-search') + f'?q={word}'),
+        case('recipe-what-can-i-cook', 'recipe:recipe-what-can-i-cook',
+             path=reverse('recipe:recipe-what-can-i-cook')
+             + f'?ingredients={ingredient.id}&missing=2'),
+        case('recipe-similar', 'recipe:recipe-similar', args=[recipe.id]),
+        case('recipe-shopping-list', 'recipe:recipe-shopping-list',
+             path=reverse('recipe:recipe-shopping-list') + '?recipes='
+             + ','.join(map(str, week))),
+        case('recipe-export', 'recipe:recipe-export',
+             path=reverse('recipe:recipe-export') + '?type=ndjson'),
+        case('recipe-import', 'recipe:recipe-import-recipes', 'post',
+             status=201, data=upload),
+        case('async-recipe-list', 'recipe:async-recipe-list'),
+        case('async-recipe-detail', 'recipe:async-recipe-detail',
+             args=[recipe.id]),
+        case('async-tag-list', 'recipe:async-tag-list'),
+        case('async-ingredient-list', 'recipe:async-ingredient-list'),
+        case('user-create', 'user:create', 'post', status=201,
+             data={'email': 'benchmark-new@example.com',
+                   'password': 'benchmark-password', 'name': 'new'}),
+        case('user-token', 'user:token', 'post',
+             data={'email': user.email, 'password': BENCHMARK_PASSWORD}),
+    ]
+
+
+class Command(BaseCommand):
+    """Django command to measure every api route against the data made by
+    seed_benchmark, write the results as JSON and compare them with an
+    earlier run
+
+        python manage.py seed_benchmark
+        python manage.py benchmark_api --output baseline.json
+        ... change things ...
+        python manage.py benchmark_api --baseline baseline.json
+    """
+
+    help = 'measure latency, throughput and queries of every api route'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email-prefix', default='bench',
+                            help='prefix given to seed_benchmark')
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--case', action='append',
+                            help='only run cases whose name contains this')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='keep the response and token caches '
+                                 'between requests')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--baseline',
+                            help='results of an earlier run to compare with')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='allowed p50 slowdown, 0.2 is 20%%')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        email = f'{options["email_prefix"]}0@example.com'
+        user = get_user_model().objects.filter(email=email).first()
+        if user is None:
+            raise CommandError(f'{email} does not exist, run seed_benchmark')
+        token = Token.objects.get(user=user)
+
+        cases = build_cases(user)
+        covered = {case.route for case in cases}
+        for urlconf, namespace in ROUTES:
+            for route in sorted(route_names(urlconf, namespace) - covered):
+                self.stdout.write(self.style.WARNING(
+                    f'no benchmark case for {route}'
+                ))
+        if options['case']:
+            cases = [case for case in cases
+                     if any(part in case.name for part in options['case'])]
+
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for case in cases:
+                results[case.name] = self.measure(
+                    client, case, options['requests'], options['warmup'],
+                    not options['warm_cache'],
+                )
+                self.report(case.name, results[case.name])
+
+        output = {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'requests': options['requests'],
+                'warm_cache': options['warm_cache'],
+                'recipes': Recipe.objects.filter(user=user).count(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as fh:
+            json.dump(output, fh, indent=2)
+        self.stdout.write(f'results written to {options["output"]}')
+
+        if options['baseline']:
+            with open(options['baseline']) as fh:
+                baseline = json.load(fh)
+            regressions = self.compare(results, baseline['results'],
+                                       options['tolerance'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(
+                    f'{len(regressions)} regressions: '
+                    + ', '.join(regressions)
+                )
+
+    def request(self, client, case, cold, count_queries=False):
+        """run the case once, return its latency in ms and its queries"""
+        if cold:
+            response_cache().clear()
+            token_cache.clear()
+        kwargs = dict(case.kwargs)
+        if callable(kwargs.get('data')):
+            kwargs['data'] = kwargs['data']()
+        queries = CaptureQueriesContext(connection) if count_queries \
+            else nullcontext()
+        with transaction.atomic(), queries:
+            start = time.perf_counter()
+            response = getattr(client, case.method)(case.path, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+            transaction.set_rollback(True)
+        if response.status_code != case.status:
+            raise CommandError(
+                f'{case.name}: expected {case.status}, got '
+                f'{response.status_code}'
+            )
+        return elapsed, len(queries) if count_queries else None
+
+    def measure(self, client, case, requests, warmup, cold):
+        for _ in range(warmup):
+            self.request(client, case, cold)
+        _, queries = self.request(client, case, cold, count_queries=True)
+        latencies = [self.request(client, case, cold)[0]
+                     for _ in range(requests)]
+        return {
+            'route': case.route,
+            'method': case.method.upper(),
+            'path': case.path,
+            'status': case.status,
+            'requests': requests,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'throughput_rps': round(requests / sum(latencies) * 1000, 1),
+            'queries': queries,
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:>24}: p50 {result["p50_ms"]:8.2f} ms  '
+            f'p95 {result["p95_ms"]:8.2f} ms  '
+            f'p99 {result["p99_ms"]:8.2f} ms  '
+            f'{result["throughput_rps"]:8.1f} req/s  '
+            f'{result["queries"]:3} queries'
+        )
+
+    def compare(self, results, baseline, tolerance):
+        """print the change of every case, return the regressed ones"""
+        self.stdout.write('\ncompared with the baseline:')
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                self.stdout.write(f'{name:>24}: new')
+                continue
+            ratio = result['p50_ms'] / before['p50_ms'] \
+                if before['p50_ms'] else 1
+            queries = result['queries'] - before['queries']
+            regressed = ratio > 1 + tolerance or queries > 0
+            line = (f'{name:>24}: p50 {before["p50_ms"]:8.2f} -> '
+                    f'{result["p50_ms"]:8.2f} ms ({ratio - 1:+7.1%})  '
+                    f'queries {before["queries"]} -> {result["queries"]}')
+            if regressed:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            elif ratio < 1 - tolerance or queries < 0:
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(line)
+        return regressions
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.benchmark import percentile
+from core.db import install_health_check
+
+
+class Command(BaseCommand):
+    """Django command to compare a request that opens a new database
+    connection with one that reuses a persistent connection, with and
+    without the CONN_HEALTH_CHECKS ping of its first query"""
+
+    help = 'measure the per-request cost of opening a database connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        requests = options['requests']
+
+        def query(connection):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+
+        def new_connection():
+            connection = connections.create_connection(alias)
+            try:
+                query(connection)
+            finally:
+                connection.close()
+
+        def checked_request():
+            # what request_started does with CONN_HEALTH_CHECKS, the first
+            # query of the request pings the connection
+            persistent.health_check_done = False
+            query(persistent)
+
+        persistent = connections.create_connection(alias)
+        persistent.ensure_connection()
+        install_health_check(connection=persistent)
+        try:
+            results = {
+                'new connection': self.measure(new_connection, requests),
+                'persistent': self.measure(lambda: query(persistent),
+                                           requests),
+                'health checked': self.measure(checked_request, requests),
+            }
+        finally:
+            persistent.close()
+
+        for name, latencies in results.items():
+            self.stdout.write(
+                f'{name:>16}: p50 {percentile(latencies, 50):7.3f} ms  '
+                f'p95 {percentile(latencies, 95):7.3f} ms'
+            )
+        new = percentile(results['new connection'], 50)
+        saved = new - percentile(results['persistent'], 50)
+        checked = new - percentile(results['health checked'], 50)
+        self.stdout.write(self.style.SUCCESS(
+            f'persistent connections save {saved:.3f} ms per request (p50), '
+            f'{checked:.3f} ms with the health check'
+        ))
+
+    def measure(self, func, requests):
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            func()
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.benchmark import Rollback, seed, timed
+from core.models import Tag, Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    """Django command to compare the list query plans with and without the
+    composite indexes on a synthetic dataset, everything is rolled back"""
+
+    help = 'show EXPLAIN plans of the list queries before and after indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=100)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('synthetic data rolled back'))
+
+    def run(self, options):
+        self.stdout.write('seeding synthetic dataset...')
+        users = seed(users=options['users'], recipes=options['recipes'],
+                     tags=options['tags'],
+                     ingredients=options['ingredients'],
+                     email_prefix='index-bench')
+        user = users[len(users) // 2]
+        limit = options['limit']
+        queries = {
+            'tag list': lambda: Tag.objects.filter(
+                user=user).order_by('-name', '-id')[:limit],
+            'ingredient list': lambda: Ingredient.objects.filter(
+                user=user).order_by('-name', '-id')[:limit],
+            'recipe list': lambda: Recipe.objects.filter(
+                user=user).order_by('id')[:limit],
+        }
+        self.analyze()
+        after = self.measure(queries)
+
+        with connection.cursor() as cursor:
+            for model in (Tag, Ingredient, Recipe):
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        'DROP INDEX ' + connection.ops.quote_name(index.name)
+                    )
+        self.analyze()
+        before = self.measure(queries)
+
+        for name in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, result in (('before', before), ('after', after)):
+                plan, elapsed = result[name]
+                self.stdout.write(f'  {label}: {elapsed:.2f} ms')
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+
+    def analyze(self):
+        """refresh planner statistics"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def measure(self, queries):
+        """return the plan and best run time of every query"""
+        return {
+            name: (build().explain(), timed(lambda: list(build())))
+            for name, build in queries.items()
+        }
@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.benchmark import Rollback, percentile
+
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    """Django command to load test the token endpoint with every configured
+    password hasher, the users it creates are rolled back"""
+
+    help = 'measure /api/users/token/ latency and throughput per hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--hasher', action='append',
+                            help='hasher path, defaults to PASSWORD_HASHERS')
+
+    def handle(self, *args, **options):
+        hashers = options['hasher'] or settings.PASSWORD_HASHERS
+        try:
+            with transaction.atomic():
+                for hasher in hashers:
+                    self.run(hasher, options['requests'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, hasher, requests):
+        with override_settings(PASSWORD_HASHERS=[hasher],
+                               ALLOWED_HOSTS=['testserver']):
+            algorithm = get_hasher('default').algorithm
+            try:
+                make_password(PASSWORD)
+            except ValueError as exc:
+                # the hasher library is not installed
+                self.stdout.write(f'{hasher}: skipped ({exc})')
+                return
+            user = get_user_model().objects.create_user(
+                email=f'login-bench-{algorithm}@example.com',
+                password=PASSWORD
+            )
+            client = Client()
+            url = reverse('user:token')
+            payload = {'email': user.email, 'password': PASSWORD}
+
+            # the first login creates the token, the rest reuse it
+            client.post(url, payload)
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(requests):
+                start = time.perf_counter()
+                res = client.post(url, payload)
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert res.status_code == 200, res.content
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{algorithm:>16}: p50 {percentile(latencies, 50):8.2f} ms  '
+            f'p95 {percentile(latencies, 95):8.2f} ms  '
+            f'{requests / elapsed:8.1f} logins/s per worker'
+        )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from core.metrics import MetricsMiddleware, registry
+
+
+class Command(BaseCommand):
+    """Django command to measure what the metrics middleware adds to a
+    request, against a view that does nothing"""
+
+    help = 'measure the per-request overhead of the metrics middleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        body = b'{}'
+        request = RequestFactory().get(reverse('recipe:recipe-list'))
+        request.resolver_match = resolve(request.path)
+
+        def view(request):
+            return HttpResponse(body)
+
+        middleware = MetricsMiddleware(view)
+        requests = options['requests']
+        bare = self.time(view, request, requests)
+        measured = self.time(middleware, request, requests)
+        registry.clear()
+
+        for label, value in (('view only', bare),
+                             ('with middleware', measured),
+                             ('overhead', measured - bare)):
+            self.stdout.write(f'{label + ":":16} {value:8.3f} us/request')
+
+    def time(self, handler, request, requests):
+        start = time.perf_counter()
+        for _ in range(requests):
+            handler(request)
+        return (time.perf_counter() - start) / requests * 1e6
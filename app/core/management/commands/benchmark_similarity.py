@@ -0,0 +1,108 @@
+import heapq
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core.benchmark import Rollback, percentile, seed
+from core.models import Recipe
+from recipe import similarity
+
+
+def exact_similar(tokens, recipe_id, limit):
+    """[(recipe id, jaccard similarity)] of the most similar recipes,
+    compared with every other recipe"""
+    mine = set(tokens[recipe_id])
+    scored = []
+    for pk, values in tokens.items():
+        if pk == recipe_id or not values:
+            continue
+        shared = len(mine.intersection(values))
+        if shared:
+            scored.append((-shared / len(mine.union(values)), pk))
+    return [(pk, -score) for score, pk in heapq.nsmallest(limit, scored)]
+
+
+def brute_force(user, recipe_id, limit):
+    """the similar recipes of the lookup without signatures: read every
+    link of the user and compare the recipe with all the others"""
+    _, tokens = similarity.read_tokens(Recipe.objects.filter(user=user),
+                                       DEFAULT_DB_ALIAS)
+    return exact_similar(tokens, recipe_id, limit)
+
+
+class Command(BaseCommand):
+    """Django command to compare the signature lookup of similar recipes
+    with a brute force comparison on a synthetic dataset: latency of both
+    and the recall of the lookup, everything is rolled back
+
+    recall@k counts the returned recipes at least as similar as the k-th
+    exact one, so ties at the cut do not count as misses
+    """
+
+    help = 'measure recall and latency of similar recipes against brute force'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=50)
+        parser.add_argument('--samples', type=int, default=50)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('synthetic data rolled back'))
+
+    def run(self, options):
+        self.stdout.write('seeding synthetic dataset...')
+        user, = seed(users=1, recipes=options['recipes'],
+                     tags=options['tags'],
+                     ingredients=options['ingredients'],
+                     email_prefix='similarity-bench')
+        recipes = Recipe.objects.filter(user=user)
+        start = time.perf_counter()
+        count = similarity.rebuild_signatures(recipes, DEFAULT_DB_ALIAS)
+        elapsed = time.perf_counter() - start
+        engine = 'numpy' if similarity.numpy is not None else 'python'
+        self.stdout.write(f'signatures: {count} recipes in {elapsed:.2f}s '
+                          f'({engine})')
+
+        _, tokens = similarity.read_tokens(recipes, DEFAULT_DB_ALIAS)
+        rnd = random.Random(0)
+        samples = rnd.sample(sorted(pk for pk, values in tokens.items()
+                                    if values),
+                             min(options['samples'], len(tokens)))
+        limit = options['limit']
+        latencies = {'signatures': [], 'brute force': []}
+        recalls = []
+        for recipe_id in samples:
+            start = time.perf_counter()
+            found = similarity.similar_recipes(user, recipe_id, limit)
+            latencies['signatures'].append(
+                (time.perf_counter() - start) * 1000
+            )
+            start = time.perf_counter()
+            exact = brute_force(user, recipe_id, limit)
+            latencies['brute force'].append(
+                (time.perf_counter() - start) * 1000
+            )
+            if not exact:
+                continue
+            cut = exact[-1][1]
+            scores = dict(exact_similar(tokens, recipe_id, len(tokens)))
+            hits = sum(scores.get(pk, 0) >= cut for pk, _ in found)
+            recalls.append(hits / len(exact))
+
+        for name, values in latencies.items():
+            self.stdout.write(
+                f'{name:>12}: p50 {percentile(values, 50):8.2f} ms  '
+                f'p95 {percentile(values, 95):8.2f} ms'
+            )
+        recall = sum(recalls) / len(recalls) if recalls else 0.0
+        self.stdout.write(f'recall@{limit}: {recall:.3f} over '
+                          f'{len(recalls)} recipes')
@@ -0,0 +1,91 @@
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import percentile
+
+
+class Command(BaseCommand):
+    """Django command to load test running servers and compare them
+
+        python manage.py loadtest \\
+            --target runserver=http://localhost:8000/api/recipe/recipe/ \\
+            --target gunicorn=http://localhost:8001/api/recipe/recipe/ \\
+            --token <api token>
+    """
+
+    help = 'measure throughput and latency of one or more running servers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True,
+                            help='name=url of a server to load test')
+        parser.add_argument('--token', help='api token sent with requests')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='seconds to run against each target')
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep:
+                raise CommandError(f'Expected name=url, got {target}')
+            latencies, errors, elapsed = self.run(
+                url, headers, options['concurrency'], options['duration']
+            )
+            self.stdout.write(
+                f'{name:>12}: {len(latencies) / elapsed:9.1f} req/s  '
+                f'p50 {percentile(latencies, 50):7.2f} ms  '
+                f'p95 {percentile(latencies, 95):7.2f} ms  '
+                f'p99 {percentile(latencies, 99):7.2f} ms  '
+                f'{errors} errors'
+            )
+
+    def run(self, url, headers, concurrency, duration):
+        """hit the url from concurrent keep-alive clients for duration"""
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        connection_class = http.client.HTTPSConnection \
+            if parts.scheme == 'https' else http.client.HTTPConnection
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client():
+            connection = connection_class(parts.netloc, timeout=30)
+            own = []
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    ok = response.status < 400
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    ok = False
+                if ok:
+                    own.append((time.perf_counter() - start) * 1000)
+                else:
+                    with lock:
+                        errors[0] += 1
+            connection.close()
+            with lock:
+                latencies.extend(own)
+
+        started = time.monotonic()
+        workers = [threading.Thread(target=client)
+                   for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return latencies, errors[0], time.monotonic() - started
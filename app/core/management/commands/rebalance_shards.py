@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sharding import (
+    ShardMoveConflict, get_setting, move_user, plan_moves, shard_loads,
+)
+
+
+class Command(BaseCommand):
+    """Django command to move users between shards while they stay online
+
+        python manage.py rebalance_shards --dry-run
+        python manage.py rebalance_shards
+        python manage.py rebalance_shards --user a@example.com --to shard2
+
+    without --user the users are spread so every shard holds about the
+    same number of recipes. a user's reads keep working during the move,
+    their writes get a 503 until it is done
+    """
+
+    help = 'move users between database shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append',
+                            help='email of a user to move, needs --to')
+        parser.add_argument('--to', help='shard to move the users to')
+        parser.add_argument('--wait', type=float,
+                            help='seconds for other processes to see a '
+                                 'lock or a move, the token cache TTL by '
+                                 'default')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='print the moves without making them')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        if options['user']:
+            if options['to'] not in get_setting('ALIASES'):
+                raise CommandError(
+                    f'--to must be one of {", ".join(get_setting("ALIASES"))}'
+                )
+            users = list(users.filter(email__in=options['user']))
+            missing = set(options['user']) - {user.email for user in users}
+            if missing:
+                raise CommandError(f'unknown users: {", ".join(missing)}')
+            moves = [(user, options['to']) for user in users
+                     if user.shard != options['to']]
+        else:
+            loads = shard_loads()
+            for alias, counts in loads.items():
+                self.stdout.write(f'{alias}: {len(counts)} users, '
+                                  f'{sum(counts.values())} recipes')
+            plan = plan_moves(loads)
+            by_id = users.in_bulk([user_id for user_id, _, _ in plan])
+            moves = [(by_id[user_id], target) for user_id, _, target in plan]
+
+        if not moves:
+            self.stdout.write('nothing to move')
+        for user, target in moves:
+            line = f'{user.email}: {user.shard} -> {target}'
+            if options['dry_run']:
+                self.stdout.write(line)
+                continue
+            try:
+                copied = move_user(user, target, options['wait'])
+            except ShardMoveConflict as exc:
+                raise CommandError(
+                    f'{line}: {exc}, check them before deleting them'
+                )
+            rows = ', '.join(f'{count} {model._meta.db_table}'
+                             for model, count in copied.items())
+            self.stdout.write(self.style.SUCCESS(f'{line} ({rows})'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.counters import RELATIONS, refresh_recipe_counts
+from core.sharding import get_setting, is_sharded
+
+
+class Command(BaseCommand):
+    """recompute the recipe_count of tags and ingredients
+
+    fixes counts that drifted, for instance after through table rows were
+    written or deleted with raw SQL, and backfills them after a restore
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int,
+                            help='only repair the rows of this user id')
+
+    def handle(self, *args, **options):
+        for alias in get_setting('ALIASES'):
+            prefix = f'{alias} ' if is_sharded() else ''
+            for model in RELATIONS:
+                queryset = model.objects.using(alias)
+                if options['user'] is not None:
+                    queryset = queryset.filter(user_id=options['user'])
+                with transaction.atomic(using=alias):
+                    fixed = refresh_recipe_counts(model, queryset)
+                self.stdout.write(
+                    f'{prefix}{model._meta.verbose_name_plural}: '
+                    f'{fixed} fixed'
+                )
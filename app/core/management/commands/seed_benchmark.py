@@ -0,0 +1,74 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import BENCHMARK_PASSWORD, seed
+from core.models import Recipe
+from recipe.similarity import rebuild_signatures
+
+
+class Command(BaseCommand):
+    """Django command to create the synthetic data benchmark_api runs on
+
+    every user gets an api token, the first one also gets a usable password
+    for the token endpoint
+    """
+
+    help = 'bulk insert benchmark users with recipes, tags and ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='recipes per user')
+        parser.add_argument('--tags', type=int, default=50,
+                            help='tags per user')
+        parser.add_argument('--ingredients', type=int, default=200,
+                            help='ingredients per user')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--email-prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='random seed, the same seed gives the '
+                                 'same data')
+        parser.add_argument('--replace', action='store_true',
+                            help='delete the users of an earlier run first')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        prefix = options['email_prefix']
+        existing = User.objects.filter(email__startswith=prefix,
+                                       email__endswith='@example.com')
+        if existing.exists():
+            if not options['replace']:
+                self.stdout.write(
+                    f'{existing.count()} {prefix}* users exist already, '
+                    f'use --replace to recreate them'
+                )
+                return
+            existing.delete()
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            users = seed(
+                users=options['users'], recipes=options['recipes'],
+                tags=options['tags'], ingredients=options['ingredients'],
+                batch_size=options['batch_size'], email_prefix=prefix,
+                seed_value=options['seed'],
+            )
+            Token.objects.bulk_create([
+                Token(user=user, key=Token.generate_key()) for user in users
+            ], batch_size=options['batch_size'])
+            if users:
+                users[0].set_password(BENCHMARK_PASSWORD)
+                users[0].save(update_fields=['password'])
+            # bulk inserts send no m2m signals to sign the recipes
+            rebuild_signatures(Recipe.objects.filter(user__in=users),
+                               DEFAULT_DB_ALIAS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'created {len(users)} users with {options["recipes"]} recipes, '
+            f'{options["tags"]} tags and {options["ingredients"]} '
+            f'ingredients each in {time.perf_counter() - start:.1f}s'
+        ))
@@ -1,18 +1,46 @@
 import time
 from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 class Command(BaseCommand):
     """DJango command to pause execution until databse is available"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='seconds to wait before giving up')
+        parser.add_argument('--delay', type=float, default=0.5,
+                            help='first wait, doubled after every failure')
+        parser.add_argument('--max-delay', type=float, default=5)
+
+    def ping(self, alias):
+        """open a real connection and run a trivial query on it"""
+        connection = connections[alias]
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
     def handle(self, *args, **options):
         self.stdout.write("waiting for database...")
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        delay = options['delay']
+        while True:
             try:
-                db_conn = connections['default']
+                self.ping(options['database'])
+                break
             except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 seconds')
-                time.sleep(1)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]} '
+                        f'seconds'
+                    )
+                delay = min(delay, remaining)
+                self.stdout.write(
+                    f'Database unavailable, waiting {delay:g} seconds'
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, options['max_delay'])
 
-        self.stdout.write(self.style.SUCCESS('Database available!'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Database available!'))
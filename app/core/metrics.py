@@ -0,0 +1,361 @@
+"""in-process request metrics per resolved view
+
+`MetricsMiddleware` times every request and, through a database execute
+wrapper and `MeasuredSerializerMixin`, adds up the time spent in queries
+and in serializers. Each request is folded into a few fixed-bucket
+histograms keyed by view name and method, which `render_metrics` writes
+in the Prometheus text format.
+
+the histograms live in the worker process. on their own, a scrape only
+sees the worker that answered it; with DIRECTORY set every worker also
+writes its histograms to a file of its own there, at most every
+FLUSH_SECONDS and when it exits, and `/metrics` serves the sum of all the
+files. once a worker has exited, the gunicorn master folds its file into
+the single EXITED file, so the counts never go down while the master runs
+and the directory keeps one file per live worker. the gunicorn profile
+empties the directory when it starts
+"""
+import asyncio
+import json
+import os
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic, perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TOKEN': None,
+    'DIRECTORY': None,
+    'FLUSH_SECONDS': 1,
+}
+PREFIX = 'recipe_api_'
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# name, help text, buckets
+HISTOGRAMS = (
+    ('request_duration_seconds', 'wall time of the request', SECONDS),
+    ('db_duration_seconds', 'time spent executing queries', SECONDS),
+    ('db_queries', 'queries executed', QUERIES),
+    ('serializer_duration_seconds', 'time spent in serializers', SECONDS),
+    ('response_size_bytes', 'size of the response body', BYTES),
+)
+BUCKETS = tuple(buckets for _, _, buckets in HISTOGRAMS)
+UNRESOLVED = '<unresolved>'
+# the histograms of the workers that exited, added up
+EXITED = 'exited.json'
+LOCK = 'lock'
+
+current_request = ContextVar('current_request', default=None)
+
+
+def get_setting(name):
+    """read a value from the METRICS setting"""
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+class RequestStats:
+    """what one request spent, shared with the threads it hands work to"""
+    __slots__ = ('db_time', 'queries', 'serializer_time', 'serializing')
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+
+class Registry:
+    """the histograms of every (view, method) seen by this process
+
+    each key holds a (bucket counts, buckets) pair and a sum per
+    histogram, the last count of a list is the +Inf bucket
+    """
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+        self._flushed = 0.0
+
+    def observe(self, key, values):
+        entry = self._views.get(key)
+        if entry is None:
+            entry = self._views.setdefault(key, (
+                [([0] * (len(buckets) + 1), buckets) for buckets in BUCKETS],
+                [0] * len(BUCKETS),
+            ))
+        histograms, sums = entry
+        with self._lock:
+            for (counts, buckets), value in zip(histograms, values):
+                counts[bisect_left(buckets, value)] += 1
+            for index, value in enumerate(values):
+                sums[index] += value
+
+    def snapshot(self):
+        """copy of the bucket counts and sums per key and histogram"""
+        with self._lock:
+            return {
+                key: [(list(counts), total)
+                      for (counts, _), total in zip(histograms, sums)]
+                for key, (histograms, sums) in self._views.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+    def flush(self, directory):
+        """write the snapshot to this process' file in the directory"""
+        self._flushed = monotonic()
+        os.makedirs(directory, exist_ok=True)
+        _write_snapshot(os.path.join(directory, f'{os.getpid()}.json'),
+                        self.snapshot())
+
+    def flush_every(self, directory, seconds):
+        if monotonic() - self._flushed >= seconds:
+            self.flush(directory)
+
+
+registry = Registry()
+
+
+def _write_snapshot(path, snapshot):
+    rows = [[view, method, histograms]
+            for (view, method), histograms in snapshot.items()]
+    partial = f'{path}.{threading.get_ident()}.tmp'
+    with open(partial, 'w') as f:
+        json.dump(rows, f)
+    # readers see the old file or the new one, never half of it
+    os.replace(partial, path)
+
+
+def _add_snapshot(merged, path):
+    """add the histograms of the file to merged, if the file exists"""
+    try:
+        with open(path) as f:
+            rows = json.load(f)
+    except FileNotFoundError:
+        return
+    for view, method, histograms in rows:
+        entry = merged.get((view, method))
+        if entry is None:
+            merged[view, method] = [(list(counts), total)
+                                    for counts, total in histograms]
+            continue
+        for index, (counts, total) in enumerate(histograms):
+            merged_counts, merged_total = entry[index]
+            entry[index] = (
+                [a + b for a, b in zip(merged_counts, counts)],
+                merged_total + total,
+            )
+
+
+@contextmanager
+def _locked(directory, operation):
+    """hold the directory's lock, readers share it and folding an exited
+    worker takes it alone, so no read sees a worker twice or not at all"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, getattr(fcntl, operation))
+        yield
+
+
+def merge_snapshots(directory):
+    """the snapshots the workers wrote to the directory, added up"""
+    merged = {}
+    with _locked(directory, 'LOCK_SH'):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.json'):
+                _add_snapshot(merged, os.path.join(directory, name))
+    return merged
+
+
+def collect():
+    """the histograms to export, of every worker with DIRECTORY set"""
+    directory = get_setting('DIRECTORY')
+    if directory is None:
+        return registry.snapshot()
+    registry.flush(directory)
+    return merge_snapshots(directory)
+
+
+def flush_metrics():
+    """write this process' histograms out, for a worker about to exit"""
+    directory = get_setting('DIRECTORY')
+    if directory is not None:
+        registry.flush(directory)
+
+
+def retire_snapshot(pid):
+    """fold the file of a worker that exited into the EXITED file, for
+    the gunicorn master once it has reaped the worker"""
+    directory = get_setting('DIRECTORY')
+    if directory is None:
+        return
+    path = os.path.join(directory, f'{pid}.json')
+    if not os.path.exists(path):
+        return
+    with _locked(directory, 'LOCK_EX'):
+        merged = {}
+        exited = os.path.join(directory, EXITED)
+        _add_snapshot(merged, exited)
+        _add_snapshot(merged, path)
+        _write_snapshot(exited, merged)
+        os.remove(path)
+    # a worker killed while writing leaves its partial file behind
+    for name in os.listdir(directory):
+        if name.startswith(f'{pid}.json.') and name.endswith('.tmp'):
+            os.remove(os.path.join(directory, name))
+
+
+def remove_snapshots():
+    """forget the histograms written by the workers of an earlier run"""
+    directory = get_setting('DIRECTORY')
+    if directory is None or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directory, name))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(snapshot=None):
+    """the histograms in the Prometheus text exposition format"""
+    if snapshot is None:
+        snapshot = registry.snapshot()
+    lines = []
+    for index, (name, help_text, buckets) in enumerate(HISTOGRAMS):
+        name = PREFIX + name
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (view, method), histograms in sorted(snapshot.items()):
+            counts, total = histograms[index]
+            labels = f'view="{_escape(view)}",method="{_escape(method)}"'
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{name}_sum{{{labels}}} {_number(total)}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def measure_query(execute, sql, params, many, context):
+    """execute wrapper adding each query to the current request"""
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += perf_counter() - start
+        stats.queries += 1
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created receiver, wraps every new database connection
+
+    the wrapper stays on the connection object, so persistent connections
+    are wrapped once instead of on every request
+    """
+    if measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(measure_query)
+
+
+def connect_query_metrics():
+    """wrap the connections opened from now on"""
+    connection_created.connect(install_query_wrapper,
+                               dispatch_uid='core.metrics.queries')
+
+
+class MeasuredSerializerMixin:
+    """adds the time spent turning instances into data to the request
+
+    only the outermost serializer is timed, so nested serializers and the
+    items of a list are not counted twice
+    """
+
+    def to_representation(self, instance):
+        stats = current_request.get()
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+        stats.serializing = True
+        start = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_time += perf_counter() - start
+            stats.serializing = False
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """record the metrics of every request, place it first in MIDDLEWARE"""
+
+    def __init__(self, get_response):
+        if not get_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        self.directory = get_setting('DIRECTORY')
+        self.flush_seconds = get_setting('FLUSH_SECONDS')
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = perf_counter()
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = perf_counter()
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        # streamed bodies are not buffered to be measured
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(
+            (match.view_name if match is not None else UNRESOLVED,
+             request.method),
+            (duration, stats.db_time, stats.queries,
+             stats.serializer_time, size),
+        )
+        if self.directory is not None:
+            registry.flush_every(self.directory, self.flush_seconds)
@@ -0,0 +1,136 @@
+# Generated by Django 4.0.10 on 2026-10-18 04:44
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# the search document of a recipe: title, tag names and ingredient names
+# weighted A, B and C
+FORWARD = [
+    '''
+    CREATE FUNCTION core_recipe_search_document(rid bigint, rtitle text)
+    RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('english', coalesce(rtitle, '')), 'A')
+            || setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(t.name, ' ') FROM core_tag t
+                JOIN core_recipe_tags rt ON rt.tag_id = t.id
+                WHERE rt.recipe_id = rid), '')), 'B')
+            || setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(i.name, ' ') FROM core_ingredient i
+                JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+                WHERE ri.recipe_id = rid), '')), 'C')
+    $$ LANGUAGE sql STABLE
+    ''',
+    '''
+    CREATE FUNCTION core_recipe_search_row() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := core_recipe_search_document(NEW.id, NEW.title);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE TRIGGER core_recipe_search_row
+    BEFORE INSERT OR UPDATE OF title ON core_recipe
+    FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_row()
+    ''',
+    '''
+    CREATE FUNCTION core_recipe_search_links() RETURNS trigger AS $$
+    BEGIN
+        UPDATE core_recipe r
+        SET search_vector = core_recipe_search_document(r.id, r.title)
+        WHERE r.id IN (SELECT recipe_id FROM changed_rows);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    UPDATE core_recipe
+    SET search_vector = core_recipe_search_document(id, title)
+    ''',
+    '''
+    CREATE INDEX core_recipe_search_vector_idx
+    ON core_recipe USING gin (search_vector)
+    ''',
+]
+
+for table in ('core_recipe_tags', 'core_recipe_ingredients'):
+    for event, rows in (('INSERT', 'NEW'), ('DELETE', 'OLD')):
+        FORWARD.append(f'''
+        CREATE TRIGGER {table}_search_{event.lower()}
+        AFTER {event} ON {table}
+        REFERENCING {rows} TABLE AS changed_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_links()
+        ''')
+
+for table, link, column in (('core_tag', 'core_recipe_tags', 'tag_id'),
+                            ('core_ingredient', 'core_recipe_ingredients',
+                             'ingredient_id')):
+    # renaming a tag or ingredient changes the document of its recipes
+    FORWARD += [f'''
+    CREATE FUNCTION {table}_search_names() RETURNS trigger AS $$
+    BEGIN
+        UPDATE core_recipe r
+        SET search_vector = core_recipe_search_document(r.id, r.title)
+        WHERE r.id IN (
+            SELECT l.recipe_id FROM {link} l
+            JOIN new_rows n ON n.id = l.{column}
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.name IS DISTINCT FROM o.name
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''', f'''
+    CREATE TRIGGER {table}_search_names
+    AFTER UPDATE ON {table}
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE {table}_search_names()
+    ''']
+
+BACKWARD = [
+    'DROP INDEX IF EXISTS core_recipe_search_vector_idx',
+    'DROP TRIGGER IF EXISTS core_tag_search_names ON core_tag',
+    'DROP TRIGGER IF EXISTS core_ingredient_search_names ON core_ingredient',
+    'DROP TRIGGER IF EXISTS core_recipe_search_row ON core_recipe',
+] + [
+    f'DROP TRIGGER IF EXISTS {table}_search_{event} ON {table}'
+    for table in ('core_recipe_tags', 'core_recipe_ingredients')
+    for event in ('insert', 'delete')
+] + [
+    'DROP FUNCTION IF EXISTS core_tag_search_names()',
+    'DROP FUNCTION IF EXISTS core_ingredient_search_names()',
+    'DROP FUNCTION IF EXISTS core_recipe_search_links()',
+    'DROP FUNCTION IF EXISTS core_recipe_search_row()',
+    'DROP FUNCTION IF EXISTS core_recipe_search_document(bigint, text)',
+]
+
+
+def create_search_triggers(apps, schema_editor):
+    """maintain the search vector in the database, postgres only"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in FORWARD:
+        schema_editor.execute(sql, None)
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in BACKWARD:
+        schema_editor.execute(sql, None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.10 on 2026-10-18 04:59
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_recipe_counts(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    for name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', name)
+        column = name.lower() + '_id'
+        counts = getattr(Recipe, field).through.objects.filter(
+            **{column: OuterRef('pk')}
+        ).order_by().values(column).annotate(count=Count('pk')).values('count')
+        model.objects.update(recipe_count=Coalesce(
+            Subquery(counts, output_field=IntegerField()), 0
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_ingr_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_tag_user_count_idx'),
+        ),
+        migrations.RunPython(backfill_recipe_counts, migrations.RunPython.noop),
+    ]
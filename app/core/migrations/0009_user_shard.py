@@ -0,0 +1,23 @@
+# Generated by Django 4.0.10 on 2026-10-18 05:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='shard',
+            field=models.CharField(default='default', editable=False, max_length=63),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='shard_locked',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+def backfill_recipe_signatures(apps, schema_editor):
+    # only the pure minhash helpers, the rows are read and written through
+    # the historical models of the database being migrated
+    from recipe import similarity
+
+    alias = schema_editor.connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeSignature = apps.get_model('core', 'RecipeSignature')
+    RecipeBand = apps.get_model('core', 'RecipeBand')
+    batch_size = similarity.get_setting('BATCH_SIZE')
+    recipes = list(Recipe.objects.using(alias).order_by('pk').values_list(
+        'pk', 'user_id'
+    ))
+    for start in range(0, len(recipes), batch_size):
+        users = dict(recipes[start:start + batch_size])
+        tokens = {pk: [] for pk in users}
+        for field, kind in similarity.RELATIONS:
+            relation = getattr(Recipe, field)
+            rows = relation.through.objects.using(alias).filter(
+                recipe_id__in=list(users)
+            ).values_list('recipe_id', relation.field.m2m_reverse_name())
+            for recipe_id, pk in rows:
+                tokens[recipe_id].append(similarity.token(pk, kind))
+        signed = [(pk, signature) for pk, signature
+                  in similarity.minhash_many(tokens).items()
+                  if signature is not None]
+        RecipeSignature.objects.using(alias).bulk_create([
+            RecipeSignature(recipe_id=pk, user_id=users[pk],
+                            minhash=signature)
+            for pk, signature in signed
+        ])
+        RecipeBand.objects.using(alias).bulk_create([
+            RecipeBand(recipe_id=pk, user_id=users[pk], key=key)
+            for pk, signature in signed
+            for key in set(similarity.band_keys(signature))
+        ], batch_size=batch_size)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_signatures'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_recipe_signatures,
+                             migrations.RunPython.noop),
+    ]
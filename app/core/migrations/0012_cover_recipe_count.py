@@ -0,0 +1,29 @@
+# Generated by Django 4.0.10 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_backfill_recipe_signatures'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='core_ingr_user_name_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='core_tag_user_name_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name', 'id'], include=('recipe_count',), name='core_ingr_user_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name', 'id'], include=('recipe_count',), name='core_tag_user_name_id_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import (
     BaseUserManager,
     AbstractBaseUser,
@@ -34,6 +35,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # database alias holding the user's tags, ingredients and recipes, see
+    # core.sharding, writes to them are refused while shard_locked is set
+    shard = models.CharField(max_length=63, default='default',
+                             editable=False)
+    shard_locked = models.BooleanField(default=False, editable=False)
 
     objects = UserManager()
     USERNAME_FIELD = "email"
@@ -43,6 +49,21 @@ class Tag(models.Model):
     """Tag to be used for a recipe"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # number of recipes using the tag, maintained by core.counters
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # serves the per-user list ordered by -name, -id as an index
+            # only scan on PostgreSQL, recipe_count is included so that the
+            # index holds every column the list selects
+            models.Index(fields=['user', 'name', 'id'],
+                         include=['recipe_count'],
+                         name='core_tag_user_name_id_idx'),
+            # the list ordered by usage and the assigned_only filter
+            models.Index(fields=['user', 'recipe_count', 'id'],
+                         name='core_tag_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -52,6 +73,17 @@ class Ingredient(models.Model):
     """ingredients to be used for recipe"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # same list access patterns as Tag
+            models.Index(fields=['user', 'name', 'id'],
+                         include=['recipe_count'],
+                         name='core_ingr_user_name_id_idx'),
+            models.Index(fields=['user', 'recipe_count', 'id'],
+                         name='core_ingr_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -66,6 +98,53 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
+    # weighted title, tag and ingredient names kept up to date by database
+    # triggers, the triggers and GIN index are created by migration 0007 on
+    # postgres only and the column stays empty on other backends
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # per-user list ordered by id without a sort step
+            models.Index(fields=['user', 'id'],
+                         name='core_recipe_user_id_idx'),
+            # list filters, the title prefix filter needs a pattern
+            # opclass on postgres to use the index for LIKE 'prefix%'
+            models.Index(fields=['user', 'title'],
+                         name='core_recipe_user_title_idx',
+                         opclasses=['int8_ops', 'varchar_pattern_ops']),
+            models.Index(fields=['user', 'price'],
+                         name='core_recipe_user_price_idx'),
+            models.Index(fields=['user', 'time_minutes'],
+                         name='core_recipe_user_time_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class RecipeSignature(models.Model):
+    """minhash signature of the ingredients and tags of a recipe, kept by
+    recipe.similarity"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE,
+                                  related_name='signature')
+    minhash = models.BinaryField()
+
+
+class RecipeBand(models.Model):
+    """one LSH bucket of a recipe signature, recipes sharing a bucket are
+    the candidates of a similarity lookup"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='bands')
+    # the band number and its rows of the signature, hashed
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'key'],
+                         name='core_band_user_key_idx'),
+        ]
@@ -0,0 +1,192 @@
+"""repeated and slow query detection per request
+
+every query of a request is reduced to a fingerprint, its SQL with the
+placeholders, literals and value lists collapsed, so that the queries of
+an N+1 loop share one fingerprint whatever ids they ask for. at the end of
+the request fingerprints seen REPEAT_THRESHOLD times or more, and queries
+slower than SLOW_QUERY_MS, are logged with the view name. with RAISE set
+the repeated fingerprints are also raised as `QueryProblem`, which is how
+the test suite fails on an N+1; slow queries are only logged, their time
+depends on the machine rather than on the code.
+
+fingerprints are cached per SQL string, so a request pays a dict lookup
+per query once the cache is warm
+"""
+import asyncio
+import logging
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'REPEAT_THRESHOLD': 5,
+    'SLOW_QUERY_MS': 100,
+    'RAISE': False,
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_UNION_ROWS = re.compile(
+    r'(SELECT (?:\?, )*\?)(?: UNION ALL SELECT (?:\?, )*\?)+'
+)
+_SPACE = re.compile(r'\s+')
+
+current_inspection = ContextVar('current_inspection', default=None)
+
+
+def get_setting(name):
+    """read a value from the QUERY_INSPECTOR setting"""
+    return getattr(settings, 'QUERY_INSPECTOR', {}).get(name, DEFAULTS[name])
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """the shape of a query, without the values it was run with"""
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _LIST.sub('(...)', sql)
+    sql = _ROWS.sub('(...)', sql)
+    return _UNION_ROWS.sub(r'\1 UNION ALL ...', sql)
+
+
+class QueryProblem(Exception):
+    """a request repeated a query shape"""
+
+
+class QueryInspection:
+    """the queries of one request or block"""
+
+    def __init__(self, repeat_threshold=None, slow_query_ms=None):
+        if repeat_threshold is None:
+            repeat_threshold = get_setting('REPEAT_THRESHOLD')
+        if slow_query_ms is None:
+            slow_query_ms = get_setting('SLOW_QUERY_MS')
+        self.repeat_threshold = repeat_threshold
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.counts = {}
+        self.slow = []
+
+    def add(self, sql, duration):
+        shape = fingerprint(sql)
+        self.counts[shape] = self.counts.get(shape, 0) + 1
+        if duration >= self.slow_query_seconds:
+            self.slow.append((duration, sql))
+
+    def repeated(self):
+        """one message per repeated fingerprint"""
+        return [
+            f'{count} queries with the same shape: {shape}'
+            for shape, count in self.counts.items()
+            if count >= self.repeat_threshold
+        ]
+
+    def problems(self):
+        """one message per repeated fingerprint and per slow query"""
+        return self.repeated() + [
+            f'slow query ({duration * 1000:.1f} ms): {sql}'
+            for duration, sql in self.slow
+        ]
+
+    def check(self, label, raise_errors=None):
+        """log the problems found under the label, raise the repeated
+        fingerprints if asked to"""
+        problems = self.problems()
+        for problem in problems:
+            logger.warning('%s: %s', label, problem)
+        if raise_errors is None:
+            raise_errors = get_setting('RAISE')
+        repeated = self.repeated()
+        if repeated and raise_errors:
+            raise QueryProblem(f'{label}: ' + '; '.join(repeated))
+        return problems
+
+
+def inspect_query(execute, sql, params, many, context):
+    """execute wrapper adding each query to the current inspection"""
+    inspection = current_inspection.get()
+    if inspection is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        inspection.add(sql, perf_counter() - start)
+
+
+def install_query_inspector(sender, connection, **kwargs):
+    """connection_created receiver, wraps every new database connection"""
+    if inspect_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(inspect_query)
+
+
+def connect_query_inspector():
+    """wrap the connections opened from now on"""
+    connection_created.connect(install_query_inspector,
+                               dispatch_uid='core.query_inspector')
+
+
+@contextmanager
+def inspect_queries(label, raise_errors=None, **thresholds):
+    """inspect the queries run inside the block, for tests and commands
+
+        with inspect_queries('export', raise_errors=True):
+            list(iter_recipes(user))
+    """
+    inspection = QueryInspection(**thresholds)
+    token = current_inspection.set(inspection)
+    try:
+        yield inspection
+    finally:
+        current_inspection.reset(token)
+    inspection.check(label, raise_errors)
+
+
+class QueryInspectorMiddleware(MiddlewareMixin):
+    """inspect the queries of every request, named after its view"""
+
+    def __init__(self, get_response):
+        if not get_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        inspection = QueryInspection()
+        token = current_inspection.set(inspection)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_inspection.reset(token)
+        self.check(request, inspection)
+        return response
+
+    async def __acall__(self, request):
+        inspection = QueryInspection()
+        token = current_inspection.set(inspection)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_inspection.reset(token)
+        self.check(request, inspection)
+        return response
+
+    def check(self, request, inspection):
+        match = request.resolver_match
+        inspection.check(match.view_name if match else request.path)
@@ -0,0 +1,42 @@
+"""a drop-in JSON renderer backed by orjson
+
+`FastJSONRenderer` writes the same bytes as DRF's compact `JSONRenderer`
+for the data the api returns: dicts, lists, strings, integers, booleans
+and None, with anything else (Decimal, datetime, lazy strings) handed to
+DRF's encoder. Pretty printed and ascii-only output, and a missing orjson,
+fall back to `JSONRenderer`.
+
+orjson writes floats in exponent notation without a `+` (`1e16`) and NaN
+as null, payloads built around such floats should keep `JSONRenderer`
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+               | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer with the same output, rendered by orjson"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder_class().default,
+                           option=OPTIONS)
+        # escaped like JSONRenderer, to stay a strict javascript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+                b'\xe2\x80\xa9', b'\\u2029'
+            )
+        return ret
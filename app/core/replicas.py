@@ -0,0 +1,144 @@
+"""read replica routing with read-your-writes stickiness
+
+`ReplicaRouter` sends the reads of safe requests to one of the
+DATABASE_REPLICAS aliases and everything else to the default database.
+`ReplicaMiddleware` decides per request whether reads may go to a
+replica: unsafe methods read from the primary, and a request that wrote
+pins the client that sent it (its Authorization header or session cookie)
+to the primary for STICKY_SECONDS, so the next pages it loads show what it
+just saved even while the replicas lag behind.
+
+a request that writes reads from the primary from then on, and queries
+run outside a request (commands, the shell, migrations) always use the
+primary
+"""
+import asyncio
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.authentication import get_authorization_header
+
+DEFAULTS = {
+    'ALIASES': [],
+    'STICKY_SECONDS': 5,
+    'CACHE_ALIAS': 'default',
+    # read from the primary even on safe requests, a token issued by a
+    # POST must authenticate the very next request
+    'PRIMARY_MODELS': ('authtoken.token',),
+}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+current_routing = ContextVar('current_routing', default=None)
+
+
+def get_setting(name):
+    """read a value from the DATABASE_REPLICAS setting"""
+    return getattr(settings, 'DATABASE_REPLICAS', {}).get(
+        name, DEFAULTS[name]
+    )
+
+
+def sticky_cache():
+    return caches[get_setting('CACHE_ALIAS')]
+
+
+def client_key(request):
+    """cache key naming the client of the request, None if anonymous"""
+    credential = get_authorization_header(request) or \
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME, '').encode()
+    if not credential:
+        return None
+    return 'replica-sticky:' + hashlib.sha256(credential).hexdigest()[:32]
+
+
+class RequestRouting:
+    """whether the request reads from the primary, and whether it wrote"""
+    __slots__ = ('primary', 'wrote')
+
+    def __init__(self, primary):
+        self.primary = primary
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """database router for the default database and its read replicas"""
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or routing.primary:
+            return DEFAULT_DB_ALIAS
+        aliases = get_setting('ALIASES')
+        if not aliases or \
+                model._meta.label_lower in get_setting('PRIMARY_MODELS'):
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.primary = routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # every alias is the primary or a copy of it
+        return True
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """decide where the reads of each request go, pin clients that wrote"""
+
+    def __init__(self, get_response):
+        if not get_setting('ALIASES'):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key = client_key(request)
+        routing = RequestRouting(self.reads_primary(request, key))
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote and key is not None:
+            self.pin(key)
+        return response
+
+    async def __acall__(self, request):
+        key = client_key(request)
+        routing = RequestRouting(
+            await self.run_cache(self.reads_primary, request, key)
+        )
+        token = current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote and key is not None:
+            await self.run_cache(self.pin, key)
+        return response
+
+    async def run_cache(self, func, *args):
+        """call func on the loop if the cache is local, else in a thread"""
+        if isinstance(sticky_cache(), LocMemCache):
+            return func(*args)
+        return await sync_to_async(func)(*args)
+
+    def reads_primary(self, request, key):
+        if request.method not in SAFE_METHODS:
+            return True
+        return key is not None and sticky_cache().get(key) is not None
+
+    def pin(self, key):
+        sticky_cache().set(key, 1, get_setting('STICKY_SECONDS'))
@@ -0,0 +1,414 @@
+"""horizontal sharding of recipe data by user
+
+users, tokens and the rest of the auth tables stay on the default
+database, the directory. each user's tags, ingredients, recipes, their
+through rows and similarity signatures live on the alias stored in
+`User.shard`, one of the DATABASE_SHARDS ALIASES, together with a copy of
+the user row so their foreign keys hold. `ShardRouter` sends the queries
+of those models to the shard of the request's user, which
+`ShardedViewMixin` sets once the user is authenticated; code running
+outside a request passes `.using()` or wraps itself in `use_shard`.
+
+every shard gets its own block of ID_RANGE ids (`reserve_id_ranges`), so
+ids stay unique across shards and rows keep their id when `move_user`
+copies them to another shard. a move locks the user's writes, which then
+fail with 503 while the rows are copied, and the old rows are deleted
+once no process can still be routing the user to them, unless they
+changed after the copy
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from rest_framework import exceptions, status
+
+from core.authentication import get_setting as get_token_setting, token_cache
+from core.models import (
+    Recipe, RecipeBand, RecipeSignature, Tag, Ingredient,
+)
+
+DEFAULTS = {
+    'ALIASES': [DEFAULT_DB_ALIAS],
+    'ID_RANGE': 2 ** 48,
+    'BATCH_SIZE': 1000,
+    # the users per shard that new users are placed by are counted at most
+    # once per COUNT_TIMEOUT seconds, and counted up in between
+    'CACHE_ALIAS': 'default',
+    'COUNT_TIMEOUT': 300,
+}
+USERS_KEY = 'recipe-api:shard-users:{}'
+THROUGH_MODELS = (Recipe.tags.through, Recipe.ingredients.through)
+# parents before children, the order rows are copied in
+SHARDED_MODELS = (Tag, Ingredient, Recipe) + THROUGH_MODELS + (
+    RecipeSignature, RecipeBand,
+)
+
+current_shard = ContextVar('current_shard', default=None)
+
+
+def get_setting(name):
+    """read a value from the DATABASE_SHARDS setting"""
+    return getattr(settings, 'DATABASE_SHARDS', {}).get(name, DEFAULTS[name])
+
+
+def is_sharded():
+    return len(get_setting('ALIASES')) > 1
+
+
+class ShardMoveConflict(Exception):
+    """the user's rows on the old shard changed after they were copied"""
+
+
+class ShardMoving(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your recipes are being moved, try again shortly.'
+    default_code = 'shard_moving'
+
+
+class UserShard:
+    """the shard of the current user, and whether it is locked"""
+    __slots__ = ('alias', 'locked')
+
+    def __init__(self, alias, locked=False):
+        self.alias = alias
+        self.locked = locked
+
+
+@contextmanager
+def use_shard(alias, locked=False):
+    """route the sharded models of the block to the alias"""
+    token = current_shard.set(UserShard(alias, locked))
+    try:
+        yield
+    finally:
+        current_shard.reset(token)
+
+
+class ShardRouter:
+    """database router for the models kept on the users' shards
+
+    place it before the replica router, it answers for the sharded models
+    only and only when more than one shard is configured
+    """
+
+    def route(self, model, hints):
+        if model not in SHARDED_MODELS or not is_sharded():
+            return None, None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db is not None:
+            return instance._state.db, None
+        shard = current_shard.get()
+        if shard is None:
+            return DEFAULT_DB_ALIAS, None
+        return shard.alias, shard
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints)[0]
+
+    def db_for_write(self, model, **hints):
+        alias, shard = self.route(model, hints)
+        if shard is not None and shard.locked:
+            raise ShardMoving()
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if type(obj1) in SHARDED_MODELS and type(obj2) in SHARDED_MODELS:
+            return obj1._state.db == obj2._state.db
+        return None
+
+
+class ShardedViewMixin:
+    """route the view's queries to the shard of the authenticated user"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        if user.is_authenticated:
+            self._shard_token = current_shard.set(
+                UserShard(user.shard, user.shard_locked)
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_shard_token', None)
+        if token is not None:
+            current_shard.reset(token)
+            self._shard_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def shard_user_counts(new_user):
+    """{alias: users}, from the cache when it was counted recently"""
+    cache = caches[get_setting('CACHE_ALIAS')]
+    aliases = get_setting('ALIASES')
+    keys = {alias: USERS_KEY.format(alias) for alias in aliases}
+    cached = cache.get_many(keys.values())
+    if len(cached) == len(keys):
+        return {alias: cached[key] for alias, key in keys.items()}
+    counts = dict(
+        get_user_model().objects.using(DEFAULT_DB_ALIAS).exclude(
+            pk=new_user.pk
+        ).values_list('shard').annotate(count=Count('pk')).order_by()
+    )
+    counts = {alias: counts.get(alias, 0) for alias in aliases}
+    cache.set_many({keys[alias]: count for alias, count in counts.items()},
+                   get_setting('COUNT_TIMEOUT'))
+    return counts
+
+
+def pick_shard(new_user):
+    """the shard with the fewest users, besides the new one
+
+    the counts are approximate, concurrent signups may pick the same shard
+    until the next count, which evens out over many users
+    """
+    counts = shard_user_counts(new_user)
+    alias = min(counts, key=counts.get)
+    try:
+        caches[get_setting('CACHE_ALIAS')].incr(USERS_KEY.format(alias))
+    except ValueError:
+        pass
+    return alias
+
+
+def ensure_user_row(user, alias):
+    """copy a stub of the user row to a shard, for the foreign keys of
+    its data; the directory keeps the password and everything else"""
+    if alias != DEFAULT_DB_ALIAS:
+        stub = get_user_model()(pk=user.pk, email=user.email, shard=alias)
+        stub.set_unusable_password()
+        get_user_model().objects.using(alias).bulk_create(
+            [stub], ignore_conflicts=True
+        )
+
+
+@receiver(post_save, sender=get_user_model())
+def place_new_user(sender, instance, created, using, **kwargs):
+    if not created or using != DEFAULT_DB_ALIAS or not is_sharded():
+        return
+    alias = pick_shard(instance)
+    if alias != instance.shard:
+        sender.objects.using(using).filter(pk=instance.pk).update(shard=alias)
+        instance.shard = alias
+    ensure_user_row(instance, alias)
+
+
+@receiver(post_delete, sender=get_user_model())
+def delete_user_data(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and instance.shard != DEFAULT_DB_ALIAS:
+        delete_user_rows(instance.pk, instance.shard)
+
+
+def reserve_id_ranges(alias):
+    """start the id sequences of the shard at its block of ids
+
+    the n-th alias hands out ids from n * ID_RANGE, rows copied in from
+    other shards keep ids from their own blocks
+    """
+    aliases = get_setting('ALIASES')
+    if alias not in aliases or not aliases.index(alias):
+        return
+    start = aliases.index(alias) * get_setting('ID_RANGE')
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for model in SHARDED_MODELS:
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'SELECT setval(pg_get_serial_sequence(%s, %s), '
+                    f'GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM '
+                    f'{connection.ops.quote_name(table)})))',
+                    [table, 'id', start],
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    'UPDATE sqlite_sequence SET seq = MAX(seq, %s) '
+                    'WHERE name = %s', [start, table]
+                )
+                if not cursor.rowcount:
+                    cursor.execute(
+                        'INSERT INTO sqlite_sequence (name, seq) '
+                        'VALUES (%s, %s)', [table, start]
+                    )
+
+
+def reserve_migrated_id_ranges(sender, using, **kwargs):
+    """post_migrate receiver, the ranges of a shard are set on migrate"""
+    reserve_id_ranges(using)
+
+
+def connect_id_ranges(sender):
+    post_migrate.connect(reserve_migrated_id_ranges, sender=sender,
+                         dispatch_uid='core.sharding.id_ranges')
+
+
+def _user_rows(model, user_id, alias):
+    queryset = model.objects.using(alias)
+    if model in THROUGH_MODELS:
+        return queryset.filter(recipe__user_id=user_id)
+    return queryset.filter(user_id=user_id)
+
+
+def delete_user_rows(user_id, alias):
+    """delete the user's data and user row from a shard
+
+    raw deletes, without the signals that would count down the recipe
+    counts of tags and ingredients that are deleted too
+    """
+    with transaction.atomic(using=alias):
+        for model in reversed(SHARDED_MODELS):
+            _user_rows(model, user_id, alias)._raw_delete(alias)
+        if alias != DEFAULT_DB_ALIAS:
+            get_user_model().objects.using(alias).filter(
+                pk=user_id
+            )._raw_delete(alias)
+
+
+def _digest_rows(digest, model, rows):
+    """add the field values of the rows to a hash"""
+    fields = model._meta.concrete_fields
+    for row in rows:
+        values = [getattr(row, field.attname) for field in fields]
+        digest.update(repr([
+            bytes(value) if isinstance(value, memoryview) else value
+            for value in values
+        ]).encode())
+
+
+def user_rows_digest(user_id, alias):
+    """hash of every row the user has on a shard"""
+    digest = hashlib.sha256()
+    for model in SHARDED_MODELS:
+        _digest_rows(digest, model, _user_rows(model, user_id, alias).order_by(
+            'pk'
+        ).iterator(chunk_size=get_setting('BATCH_SIZE')))
+    return digest.hexdigest()
+
+
+def copy_user_rows(user, source, target, digest=None):
+    """copy the user's data from one shard to another, keeping the ids,
+    and add the copied rows to the digest when one is given"""
+    batch_size = get_setting('BATCH_SIZE')
+    with transaction.atomic(using=target):
+        # rows left behind by an interrupted move
+        delete_user_rows(user.pk, target)
+        ensure_user_row(user, target)
+        copied = {}
+        for model in SHARDED_MODELS:
+            rows = _user_rows(model, user.pk, source).order_by('pk').iterator(
+                chunk_size=batch_size
+            )
+            copied[model] = 0
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                model.objects.using(target).bulk_create(batch)
+                if digest is not None:
+                    _digest_rows(digest, model, batch)
+                copied[model] += len(batch)
+    return copied
+
+
+def set_user_shard(user, **fields):
+    """update the user's shard fields and drop its cached tokens"""
+    get_user_model().objects.using(DEFAULT_DB_ALIAS).filter(
+        pk=user.pk
+    ).update(**fields)
+    for name, value in fields.items():
+        setattr(user, name, value)
+    token_cache.delete_user(user.pk)
+
+
+def move_user(user, target, wait=None):
+    """move the user's data to the target shard while it stays readable
+
+    writes are locked first, and the copy only starts after `wait` seconds
+    (the token cache TTL by default) so no process still holds the user
+    unlocked; the old rows are deleted after another wait, once every
+    process reads from the new shard. returns the rows copied per model
+
+    a process that still wrote to the old shard after the copy, with a
+    user loaded before the lock, would lose that write with the old rows:
+    they are compared with the copy first and kept on a difference, which
+    raises ShardMoveConflict
+    """
+    if target not in get_setting('ALIASES'):
+        raise ValueError(f'{target} is not a shard')
+    source = user.shard
+    if source == target:
+        return {}
+    if wait is None:
+        wait = get_token_setting('TTL')
+
+    set_user_shard(user, shard_locked=True)
+    digest = hashlib.sha256()
+    try:
+        time.sleep(wait)
+        copied = copy_user_rows(user, source, target, digest)
+    except BaseException:
+        set_user_shard(user, shard_locked=False)
+        raise
+    set_user_shard(user, shard=target, shard_locked=False)
+    time.sleep(wait)
+    if user_rows_digest(user.pk, source) != digest.hexdigest():
+        raise ShardMoveConflict(
+            f'the rows of user {user.pk} on {source} changed after they '
+            f'were copied to {target}, they were kept on {source}'
+        )
+    delete_user_rows(user.pk, source)
+    return copied
+
+
+def shard_loads():
+    """recipes per user and shard, as {alias: {user_id: recipes}}"""
+    users = dict(
+        get_user_model().objects.using(DEFAULT_DB_ALIAS).values_list(
+            'pk', 'shard'
+        )
+    )
+    loads = {alias: {} for alias in get_setting('ALIASES')}
+    for alias in loads:
+        counts = Recipe.objects.using(alias).values_list('user_id').annotate(
+            count=Count('pk')
+        ).order_by()
+        for user_id, count in counts:
+            # rows of users placed elsewhere are leftovers of a move
+            if users.get(user_id) == alias:
+                loads[alias][user_id] = count
+    for user_id, alias in users.items():
+        loads.setdefault(alias, {}).setdefault(user_id, 0)
+    return loads
+
+
+def plan_moves(loads):
+    """moves that even out the recipes per shard, [(user_id, source,
+    target)], each moving the biggest user that narrows the gap between
+    the fullest and the emptiest shard
+    """
+    loads = {alias: dict(users) for alias, users in loads.items()}
+    totals = {alias: sum(users.values()) for alias, users in loads.items()}
+    moves = []
+    while True:
+        source = max(totals, key=totals.get)
+        target = min(totals, key=totals.get)
+        gap = totals[source] - totals[target]
+        movable = [(count, user_id)
+                   for user_id, count in loads[source].items()
+                   if 0 < count * 2 <= gap]
+        if not movable:
+            return moves
+        count, user_id = max(movable)
+        del loads[source][user_id]
+        loads[target][user_id] = count
+        totals[source] -= count
+        totals[target] += count
+        moves.append((user_id, source, target))
@@ -0,0 +1,164 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache
+from core.checks import check_token_cache
+
+TAG_URL = reverse('recipe:tag-list')
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tokens': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+               'LOCATION': 'token-auth-tests'},
+}
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """test the cached token authentication used by the recipe api"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_second_request_skips_token_query(self):
+        """a cached token does not hit the database again"""
+        with self.assertNumQueries(2):
+            res = self.client.get(TAG_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAG_URL, {'page_size': 10})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_invalid_token_rejected(self):
+        """an unknown token is still refused"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token wrong')
+        res = self.client.get(TAG_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_invalidated(self):
+        """deleting a token evicts it from the cache"""
+        self.client.get(TAG_URL)
+        self.token.delete()
+
+        res = self.client.get(TAG_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_invalidated(self):
+        """deactivating a user evicts their tokens from the cache"""
+        self.client.get(TAG_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(TAG_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_entries_expire_after_ttl(self):
+        """an entry older than the ttl is validated again"""
+        with patch('core.authentication.time.monotonic', return_value=0):
+            self.client.get(TAG_URL)
+        with patch('core.authentication.time.monotonic', return_value=3600):
+            with self.assertNumQueries(2):
+                self.client.get(TAG_URL, {'page_size': 10})
+
+    @override_settings(TOKEN_AUTH_CACHE={'MAX_SIZE': 1})
+    def test_least_recently_used_evicted(self):
+        """the cache never holds more than MAX_SIZE tokens"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        token_cache.set(self.token.key, self.user, self.token)
+        token_cache.set('other', other, Token.objects.create(user=other))
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertIsNotNone(token_cache.get('other'))
+
+    def test_requests_get_their_own_user(self):
+        """a cache hit builds new instances, changes to one request's user
+        are not seen by the next"""
+        token_cache.set(self.token.key, self.user, self.token)
+
+        first, token = token_cache.get(self.token.key)
+        first.name = 'changed'
+        second, _ = token_cache.get(self.token.key)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.pk, self.user.pk)
+        self.assertEqual(second.name, self.user.name)
+        self.assertEqual(token.key, self.token.key)
+        self.assertFalse(second._state.adding)
+
+    @override_settings(CACHES=LOCMEM_CACHES,
+                       TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'tokens',
+                                         'LOCAL_TTL': 5})
+    def test_short_local_ttl_with_shared_cache(self):
+        """with a shared cache the in-process copies expire after LOCAL_TTL
+        seconds, another process only serves a revoked token that long"""
+        with patch('core.authentication.time.monotonic', return_value=0):
+            self.client.get(TAG_URL)
+        # revoked through the shared cache only, as by another process
+        caches['tokens'].clear()
+        with patch('core.authentication.time.monotonic', return_value=4):
+            self.assertIsNotNone(token_cache.get(self.token.key))
+        with patch('core.authentication.time.monotonic', return_value=6):
+            self.assertIsNone(token_cache.get(self.token.key))
+
+    @override_settings(CACHES=LOCMEM_CACHES,
+                       TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'tokens'})
+    def test_shared_cache_layer(self):
+        """a token cached by another process is found in the shared cache"""
+        self.client.get(TAG_URL)
+        token_cache.clear()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAG_URL, {'page_size': 10})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.token.delete()
+        token_cache.clear()
+        res = self.client.get(TAG_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(DEBUG=False, TESTING=False, CACHES=LOCMEM_CACHES)
+class TokenCacheCheckTests(SimpleTestCase):
+    """revoked tokens must be dropped by every worker"""
+
+    def check_ids(self):
+        return [error.id for error in check_token_cache(None)]
+
+    def test_missing_alias_rejected(self):
+        with override_settings(TOKEN_AUTH_CACHE={}):
+            self.assertEqual(self.check_ids(), ['core.E002'])
+
+    def test_process_local_cache_rejected(self):
+        with override_settings(TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'tokens'}):
+            self.assertEqual(self.check_ids(), ['core.E002'])
+
+    @override_settings(CACHES={'shared': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    }}, TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'shared'})
+    def test_shared_cache_accepted(self):
+        self.assertEqual(self.check_ids(), [])
+
+    @override_settings(DEBUG=True, TOKEN_AUTH_CACHE={})
+    def test_skipped_when_debugging(self):
+        self.assertEqual(self.check_ids(), [])
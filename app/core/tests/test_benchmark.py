@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import BENCHMARK_PASSWORD, route_names
+from core.management.commands.benchmark_api import ROUTES, build_cases
+from core.models import Recipe
+
+
+class BenchmarkCommandTests(TestCase):
+    """test the seed_benchmark and benchmark_api commands"""
+
+    def setUp(self):
+        call_command('seed_benchmark', users=2, recipes=5, tags=3,
+                     ingredients=4, stdout=StringIO())
+        self.user = get_user_model().objects.get(email='bench0@example.com')
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def test_seed_benchmark(self):
+        """users get their rows, a token and the first one a password"""
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(Token.objects.filter(
+            user__email__startswith='bench').count(), 2)
+        self.assertTrue(self.user.check_password(BENCHMARK_PASSWORD))
+
+    def test_seed_benchmark_keeps_existing_data(self):
+        """a second run leaves the data alone unless asked to replace it"""
+        call_command('seed_benchmark', users=2, recipes=1, stdout=StringIO())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+
+        call_command('seed_benchmark', users=2, recipes=1, replace=True,
+                     stdout=StringIO())
+        user = get_user_model().objects.get(email='bench0@example.com')
+        self.assertEqual(Recipe.objects.filter(user=user).count(), 1)
+
+    def test_every_route_has_a_case(self):
+        """the benchmark covers every route of the recipe and user apps"""
+        covered = {case.route for case in build_cases(self.user)}
+
+        for urlconf, namespace in ROUTES:
+            self.assertLessEqual(route_names(urlconf, namespace), covered)
+
+    def test_writes_results_and_rolls_back(self):
+        """results are written as JSON and writes leave no rows behind"""
+        call_command('benchmark_api', requests=2, warmup=0,
+                     case=['tag-list', 'recipe-create', 'recipe-delete'],
+                     output=self.path('out.json'), stdout=StringIO())
+
+        with open(self.path('out.json')) as fh:
+            results = json.load(fh)['results']
+        self.assertEqual(set(results),
+                         {'tag-list', 'tag-list-by-usage', 'async-tag-list',
+                          'recipe-create', 'recipe-delete'})
+        self.assertEqual(results['tag-list']['method'], 'GET')
+        self.assertGreater(results['tag-list']['queries'], 0)
+        self.assertGreater(results['tag-list']['throughput_rps'], 0)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+
+    def test_regression_against_baseline(self):
+        """a slower or chattier case fails against the baseline"""
+        baseline = {'results': {'recipe-detail': {
+            'p50_ms': 0.001, 'queries': 0,
+        }}}
+        with open(self.path('baseline.json'), 'w') as fh:
+            json.dump(baseline, fh)
+        out = StringIO()
+
+        with self.assertRaisesRegex(CommandError, '1 regressions'):
+            call_command('benchmark_api', requests=2, warmup=0,
+                         case=['recipe-detail'],
+                         output=self.path('out.json'),
+                         baseline=self.path('baseline.json'),
+                         fail_on_regression=True, stdout=out)
+        self.assertIn('compared with the baseline', out.getvalue())
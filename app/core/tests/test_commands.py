@@ -1,22 +1,49 @@
 from unittest.mock import patch
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+PING = 'core.management.commands.wait_for_db.Command.ping'
+
+
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
         """Test waiting for db when db is available"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
+        with patch(PING) as ping:
+            call_command("wait_for_db")
+            self.assertEqual(ping.call_count, 1)
+
+    def test_wait_for_db_connects(self):
+        """Test the command really queries the database"""
+        with self.assertNumQueries(1):
             call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 1)
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         """Test waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
+        with patch(PING) as ping:
+            ping.side_effect = [OperationalError] * 5 + [True]
             call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 6)
+            self.assertEqual(ping.call_count, 6)
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_backoff(self, ts):
+        """Test the wait doubles after every failure up to the maximum"""
+        with patch(PING) as ping:
+            ping.side_effect = [OperationalError] * 5 + [True]
+            call_command("wait_for_db", delay=1, max_delay=5)
+        delays = [call.args[0] for call in ts.call_args_list]
+        self.assertEqual(delays, [1, 2, 4, 5, 5])
+
+    @patch('time.sleep', return_value=True)
+    @patch('time.monotonic')
+    def test_wait_for_db_timeout(self, monotonic, ts):
+        """Test the command gives up once the timeout has passed"""
+        monotonic.side_effect = [0, 1, 2, 11]
+        with patch(PING, side_effect=OperationalError):
+            with self.assertRaises(CommandError):
+                call_command("wait_for_db", timeout=10)
+        self.assertEqual(ts.call_count, 2)
@@ -0,0 +1,136 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.counters import add_recipe_counts, refresh_recipe_counts
+from core.models import Recipe, Tag, Ingredient
+
+
+def sample_recipe(user, **params):
+    """create and return sample recipe"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeCountTests(TestCase):
+    """test the maintained recipe_count of tags and ingredients"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dessert = Tag.objects.create(user=self.user, name='Dessert')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+
+    def assertCounts(self, *expected):
+        """assert the stored counts of (obj, count, obj, count, ...)"""
+        for obj in expected[::2]:
+            obj.refresh_from_db()
+        self.assertEqual([obj.recipe_count for obj in expected[::2]],
+                         list(expected[1::2]))
+
+    def test_add_and_remove(self):
+        """adding and removing links moves the counts"""
+        soup = sample_recipe(self.user, title='Soup')
+        stew = sample_recipe(self.user, title='Stew')
+        soup.tags.add(self.vegan, self.dessert)
+        stew.tags.add(self.vegan)
+        stew.tags.add(self.vegan)
+        soup.ingredients.add(self.salt)
+        self.assertCounts(self.vegan, 2, self.dessert, 1, self.salt, 1)
+
+        soup.tags.remove(self.vegan)
+        stew.tags.remove(self.dessert)
+        self.assertCounts(self.vegan, 1, self.dessert, 1)
+
+        soup.tags.clear()
+        self.assertCounts(self.vegan, 1, self.dessert, 0)
+
+    def test_reverse_add_and_clear(self):
+        """changes made from the tag side are counted too"""
+        soup = sample_recipe(self.user, title='Soup')
+        stew = sample_recipe(self.user, title='Stew')
+        self.vegan.recipe_set.add(soup, stew)
+        self.assertCounts(self.vegan, 2)
+
+        self.vegan.recipe_set.remove(soup)
+        self.assertCounts(self.vegan, 1)
+
+        self.vegan.recipe_set.clear()
+        self.assertCounts(self.vegan, 0)
+
+    def test_set_replaces_links(self):
+        """set() counts the links it adds and removes"""
+        soup = sample_recipe(self.user)
+        soup.tags.set([self.vegan])
+        soup.tags.set([self.dessert])
+
+        self.assertCounts(self.vegan, 0, self.dessert, 1)
+
+    def test_recipe_delete(self):
+        """deleting a recipe takes it off its tags and ingredients"""
+        soup = sample_recipe(self.user, title='Soup')
+        stew = sample_recipe(self.user, title='Stew')
+        for recipe in (soup, stew):
+            recipe.tags.add(self.vegan)
+            recipe.ingredients.add(self.salt)
+
+        soup.delete()
+        self.assertCounts(self.vegan, 1, self.salt, 1)
+
+        Recipe.objects.all().delete()
+        self.assertCounts(self.vegan, 0, self.salt, 0)
+
+    def test_drifted_count_not_negative(self):
+        """removing a link from a count that drifted to zero keeps it at
+        zero instead of failing the unsigned column"""
+        soup = sample_recipe(self.user)
+        soup.tags.add(self.vegan)
+        soup.ingredients.add(self.salt)
+        Tag.objects.update(recipe_count=0)
+
+        soup.tags.remove(self.vegan)
+        Ingredient.objects.update(recipe_count=0)
+        soup.delete()
+
+        self.assertCounts(self.vegan, 0, self.salt, 0)
+
+    def test_add_recipe_counts(self):
+        """bulk written links are added once per repetition"""
+        add_recipe_counts(Tag, [self.vegan.id, self.vegan.id,
+                                self.dessert.id])
+
+        self.assertCounts(self.vegan, 2, self.dessert, 1)
+
+    def test_refresh_recipe_counts(self):
+        """refresh fixes drifted counts and reports how many"""
+        soup = sample_recipe(self.user)
+        soup.tags.add(self.vegan)
+        Tag.objects.update(recipe_count=7)
+
+        self.assertEqual(refresh_recipe_counts(Tag), 2)
+        self.assertCounts(self.vegan, 1, self.dessert, 0)
+        self.assertEqual(refresh_recipe_counts(Tag), 0)
+
+    def test_repair_command(self):
+        """the repair command recomputes every count"""
+        soup = sample_recipe(self.user)
+        soup.ingredients.add(self.salt)
+        Ingredient.objects.update(recipe_count=0)
+        Tag.objects.update(recipe_count=3)
+        out = StringIO()
+
+        call_command('repair_recipe_counts', stdout=out)
+
+        self.assertCounts(self.vegan, 0, self.salt, 1)
+        self.assertIn('tags: 2 fixed', out.getvalue())
+        self.assertIn('ingredients: 1 fixed', out.getvalue())
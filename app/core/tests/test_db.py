@@ -0,0 +1,83 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from core.db import install_health_check, reset_health_checks
+
+
+def mock_connection(usable=True, health_checks=True, open_=True):
+    connection = MagicMock(spec=['connection', 'settings_dict',
+                                 'in_atomic_block', 'is_usable', 'close',
+                                 'ensure_connection'],
+                           in_atomic_block=False)
+    connection.connection = object() if open_ else None
+    connection.settings_dict = {'CONN_HEALTH_CHECKS': health_checks}
+    connection.is_usable.return_value = usable
+    install_health_check(connection=connection)
+    return connection
+
+
+class HealthCheckTests(SimpleTestCase):
+    """test the persistent connection health checks"""
+
+    def start_request(self, *connections):
+        with patch('core.db.connections') as all_connections:
+            all_connections.all.return_value = connections
+            reset_health_checks()
+
+    def test_unusable_connection_closed(self):
+        """a connection the server dropped is closed on its first use"""
+        connection = mock_connection(usable=False)
+        self.start_request(connection)
+
+        connection.ensure_connection()
+
+        connection.close.assert_called_once()
+
+    def test_usable_connection_kept(self):
+        """a healthy connection is reused"""
+        connection = mock_connection()
+        self.start_request(connection)
+
+        connection.ensure_connection()
+
+        connection.close.assert_not_called()
+
+    def test_pinged_once_per_request(self):
+        """only the first use of the request is checked"""
+        connection = mock_connection()
+        self.start_request(connection)
+
+        connection.ensure_connection()
+        connection.ensure_connection()
+        self.assertEqual(connection.is_usable.call_count, 1)
+
+        self.start_request(connection)
+        connection.ensure_connection()
+        self.assertEqual(connection.is_usable.call_count, 2)
+
+    def test_unused_connection_not_pinged(self):
+        """starting a request does no I/O"""
+        connection = mock_connection(usable=False)
+        self.start_request(connection)
+        connection.is_usable.assert_not_called()
+
+    def test_new_connection_not_pinged(self):
+        """a connection opened during the request needs no check"""
+        connection = mock_connection()
+        connection.ensure_connection()
+        connection.is_usable.assert_not_called()
+
+    def test_checks_disabled(self):
+        """nothing is checked without CONN_HEALTH_CHECKS"""
+        connection = mock_connection(usable=False, health_checks=False)
+        self.start_request(connection)
+        connection.ensure_connection()
+        connection.is_usable.assert_not_called()
+
+    def test_closed_connection_skipped(self):
+        """a connection that is not open is not pinged"""
+        connection = mock_connection(open_=False)
+        self.start_request(connection)
+        connection.ensure_connection()
+        connection.is_usable.assert_not_called()
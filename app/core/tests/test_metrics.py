@@ -0,0 +1,201 @@
+import json
+import os
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.metrics import (
+    flush_metrics, merge_snapshots, registry, remove_snapshots,
+    render_metrics, retire_snapshot,
+)
+from core.models import Recipe
+
+RECIPE_URL = reverse('recipe:recipe-list')
+ASYNC_RECIPE_URL = reverse('recipe:async-recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+class MetricsTests(TestCase):
+    """test the request metrics middleware and endpoint"""
+
+    def setUp(self):
+        registry.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        registry.clear()
+
+    def test_request_recorded_by_view_name(self):
+        """a request is recorded under its view name and method"""
+        Recipe.objects.create(user=self.user, title='Soup',
+                              time_minutes=10, price=5.00)
+
+        res = self.client.get(RECIPE_URL)
+
+        snapshot = registry.snapshot()
+        duration, db_time, queries, serializer_time, size = \
+            snapshot['recipe:recipe-list', 'GET']
+        self.assertEqual(sum(duration[0]), 1)
+        self.assertGreater(duration[1], 0)
+        self.assertGreater(db_time[1], 0)
+        self.assertGreater(queries[1], 0)
+        self.assertGreater(serializer_time[1], 0)
+        self.assertLess(serializer_time[1], duration[1])
+        self.assertEqual(size[1], len(res.content))
+
+    async def test_async_request_recorded(self):
+        """requests served on the async path are measured too"""
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+
+        res = await AsyncClient().get(ASYNC_RECIPE_URL,
+                                      AUTHORIZATION=f'Token {token.key}')
+
+        self.assertEqual(res.status_code, 200)
+        queries = registry.snapshot()['recipe:async-recipe-list', 'GET'][2]
+        self.assertGreater(queries[1], 0)
+
+    def test_cached_response_has_no_queries(self):
+        """a response cache hit records zero queries"""
+        self.client.get(RECIPE_URL)
+        self.client.get(RECIPE_URL)
+
+        queries = registry.snapshot()['recipe:recipe-list', 'GET'][2]
+        # the first bucket is le="0"
+        self.assertEqual(queries[0][0], 1)
+
+    def test_unresolved_requests(self):
+        """requests that match no url share one label"""
+        self.client.get('/no-such-page/')
+
+        self.assertIn(('<unresolved>', 'GET'), registry.snapshot())
+
+    def test_prometheus_format(self):
+        """the endpoint renders cumulative buckets, sum and count"""
+        self.client.get(RECIPE_URL)
+        self.client.get(RECIPE_URL + '?page_size=5')
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        lines = res.content.decode().splitlines()
+        self.assertIn('# TYPE recipe_api_db_queries histogram', lines)
+        labels = 'view="recipe:recipe-list",method="GET"'
+        self.assertIn(
+            f'recipe_api_request_duration_seconds_bucket{{{labels},'
+            f'le="+Inf"}} 2', lines
+        )
+        self.assertIn(
+            f'recipe_api_request_duration_seconds_count{{{labels}}} 2', lines
+        )
+        buckets = [
+            int(line.rsplit(' ', 1)[1]) for line in lines
+            if line.startswith(f'recipe_api_db_queries_bucket{{{labels}')
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+
+    def test_render_escapes_labels(self):
+        """quotes in label values are escaped"""
+        registry.observe(('a"b', 'GET'), (0.1, 0.0, 0, 0.0, 10))
+
+        self.assertIn('view="a\\"b"', render_metrics())
+
+    @override_settings(METRICS={'TOKEN': 'secret'})
+    def test_token_required(self):
+        """with a token configured the scraper must send it"""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 403)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, 200)
+
+
+class SharedMetricsTests(TestCase):
+    """test adding up the metrics of several worker processes"""
+
+    def setUp(self):
+        registry.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(METRICS={
+            'DIRECTORY': self.tmpdir.name, 'FLUSH_SECONDS': 0,
+        })
+        self.settings.enable()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tmpdir.cleanup()
+        registry.clear()
+
+    def other_worker(self):
+        """write the file of another worker that served one request"""
+        registry.observe(('recipe:recipe-list', 'GET'),
+                         (0.5, 0.1, 2, 0.1, 100))
+        flush_metrics()
+        os.rename(os.path.join(self.tmpdir.name, f'{os.getpid()}.json'),
+                  os.path.join(self.tmpdir.name, '1.json'))
+        registry.clear()
+
+    def test_requests_written_to_directory(self):
+        self.client.get(RECIPE_URL)
+
+        with open(os.path.join(self.tmpdir.name,
+                               f'{os.getpid()}.json')) as f:
+            rows = json.load(f)
+        self.assertEqual([row[:2] for row in rows],
+                         [['recipe:recipe-list', 'GET']])
+
+    def test_workers_added_up(self):
+        """the endpoint serves the sum of every worker's histograms"""
+        self.other_worker()
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertIn(
+            'recipe_api_db_queries_count{view="recipe:recipe-list",'
+            'method="GET"} 2', res.content.decode()
+        )
+
+    def test_exited_workers_folded(self):
+        """the files of exited workers are added up into one"""
+        for pid in (1, 2):
+            self.other_worker()
+            os.rename(os.path.join(self.tmpdir.name, '1.json'),
+                      os.path.join(self.tmpdir.name, f'{pid}0.json'))
+        before = merge_snapshots(self.tmpdir.name)
+
+        retire_snapshot(10)
+        retire_snapshot(20)
+        retire_snapshot(30)
+
+        self.assertEqual(merge_snapshots(self.tmpdir.name), before)
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.tmpdir.name)
+                   if name.endswith('.json')), ['exited.json']
+        )
+        counts, _ = before['recipe:recipe-list', 'GET'][2]
+        self.assertEqual(sum(counts), 2)
+
+    def test_remove_snapshots(self):
+        self.other_worker()
+
+        remove_snapshots()
+
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
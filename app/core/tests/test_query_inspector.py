@@ -0,0 +1,118 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.query_inspector import QueryProblem, fingerprint, inspect_queries
+
+RECIPE_URL = reverse('recipe:recipe-list')
+SEARCH_URL = reverse('recipe:recipe-search') + '?q=r'
+
+
+def unprefetched_recipes(user):
+    """the recipe queryset without its prefetches, an N+1 on purpose"""
+    return Recipe.objects.filter(user=user).order_by('id')
+
+
+class FingerprintTests(TestCase):
+
+    def test_values_are_collapsed(self):
+        """queries that differ only in their values share a fingerprint"""
+        self.assertEqual(
+            fingerprint('SELECT "a" FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            fingerprint('SELECT "a" FROM "t" WHERE "id" IN (%s)'),
+        )
+        self.assertEqual(
+            fingerprint("SELECT 1 FROM t WHERE name = 'x' LIMIT 21"),
+            'SELECT ? FROM t WHERE name = ? LIMIT ?',
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO "t" ("a") VALUES (%s), (%s), (%s)'),
+            'INSERT INTO "t" ("a") VALUES (...)',
+        )
+
+    def test_different_shapes_differ(self):
+        """different tables and columns keep different fingerprints"""
+        self.assertNotEqual(
+            fingerprint('SELECT "a" FROM "t1" WHERE "id" = %s'),
+            fingerprint('SELECT "a" FROM "t2" WHERE "id" = %s'),
+        )
+
+
+class QueryInspectorTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                     for i in range(5)]
+
+    def test_repeated_queries_raise(self):
+        """a query shape repeated up to the threshold is a problem"""
+        with self.assertRaisesRegex(QueryProblem, '5 queries'):
+            with inspect_queries('loop', raise_errors=True,
+                                 repeat_threshold=5):
+                for tag in self.tags:
+                    Tag.objects.get(pk=tag.pk)
+
+    def test_below_threshold_passes(self):
+        """fewer repeats than the threshold are fine"""
+        with inspect_queries('loop', raise_errors=True,
+                             repeat_threshold=6) as inspection:
+            for tag in self.tags:
+                Tag.objects.get(pk=tag.pk)
+
+        self.assertEqual(list(inspection.counts.values()), [5])
+
+    def test_slow_query_logged(self):
+        """queries over the slow threshold are logged, not raised"""
+        with self.assertLogs('core.query_inspector', 'WARNING') as logs:
+            with inspect_queries('slow', raise_errors=True, slow_query_ms=0):
+                Tag.objects.count()
+
+        self.assertIn('slow: slow query', logs.output[0])
+
+
+class QueryInspectorMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(5):
+            recipe = Recipe.objects.create(user=self.user, title=f'r {i}',
+                                           time_minutes=10, price=5.00)
+            recipe.tags.add(tag)
+
+    def test_list_has_no_repeated_queries(self):
+        """the recipe list passes the inspector run by the test suite"""
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, 200)
+
+    @patch('recipe.views.user_recipes', unprefetched_recipes)
+    def test_n_plus_one_fails_request(self):
+        """an N+1 in a view raises in the test suite"""
+        with self.assertRaisesRegex(QueryProblem, 'recipe:recipe-search'):
+            self.client.get(SEARCH_URL)
+
+    @override_settings(QUERY_INSPECTOR={'ENABLED': True, 'RAISE': False})
+    @patch('recipe.views.user_recipes', unprefetched_recipes)
+    def test_n_plus_one_logged_with_view_name(self):
+        """outside of the tests problems are logged with the view name"""
+        with self.assertLogs('core.query_inspector', 'WARNING') as logs:
+            res = self.client.get(SEARCH_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('recipe:recipe-search: 5 queries with the same shape',
+                      logs.output[0])
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import UUID
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTests(SimpleTestCase):
+
+    def assertSameOutput(self, data, accepted_media_type=None):
+        self.assertEqual(
+            FastJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_same_output(self):
+        """api data renders to the same bytes as JSONRenderer"""
+        self.assertSameOutput({
+            'id': 1,
+            'title': 'Ọbẹ̀ "ata"\n\t\\ 🍲',
+            'price': '5.00',
+            'tags': [1, 2, 3],
+            'empty': [],
+            'nested': {'next': None, 'ok': True, 'no': False},
+            'errors': [ErrorDetail('This field is required.',
+                                   code='required')],
+            'rows_per_second': 1234.5,
+        })
+
+    def test_other_types_use_the_drf_encoder(self):
+        """values orjson does not handle the same way go through DRF"""
+        self.assertSameOutput({
+            'decimal': Decimal('1.50'),
+            'when': datetime(2022, 5, 1, 12, 30, 1, 123456,
+                             tzinfo=timezone.utc),
+            'uuid': UUID('12345678123456781234567812345678'),
+            'lazy': gettext_lazy('Not found.'),
+            1: 'int key',
+        })
+
+    def test_line_separators_escaped(self):
+        """U+2028 and U+2029 are escaped like JSONRenderer does"""
+        self.assertSameOutput({'title': 'a\u2028b\u2029c'})
+        self.assertIn(b'\\u2028', FastJSONRenderer().render('\u2028'))
+
+    def test_indent_falls_back(self):
+        """pretty printed output is left to JSONRenderer"""
+        self.assertSameOutput({'a': [1, 2]}, 'application/json; indent=4')
+
+    def test_none_is_empty(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
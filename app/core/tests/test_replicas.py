@@ -0,0 +1,149 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache
+from core.checks import check_replica_cache
+from core.models import Recipe, Tag
+from core.replicas import ReplicaRouter
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def replicate(*objs):
+    """copy rows to the replica database, as replication eventually does"""
+    for obj in objs:
+        obj.save(using='replica')
+
+
+@override_settings(DATABASE_REPLICAS={'ALIASES': ['replica'],
+                                      'STICKY_SECONDS': 5})
+class ReplicaRoutingTests(TestCase):
+    """the replica test database lags behind until rows are replicated"""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        caches['default'].clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Replicated', time_minutes=10, price=5
+        )
+        replicate(self.user, self.tag, self.recipe)
+        self.client = self.token_client(self.user)
+
+    def token_client(self, user):
+        client = APIClient()
+        token = Token.objects.create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def titles(self, client):
+        res = client.get(RECIPE_URL)
+        self.assertEqual(res.status_code, 200)
+        return [recipe['title'] for recipe in res.data['results']]
+
+    def test_reads_go_to_replica(self):
+        """safe requests read from the replica"""
+        Recipe.objects.create(user=self.user, title='Not replicated',
+                              time_minutes=10, price=5)
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.titles(self.client), ['Replicated'])
+
+        self.assertTrue(replica.captured_queries)
+
+    def test_client_sticks_to_primary_after_write(self):
+        """a client reads its own writes until the window runs out"""
+        res = self.client.post(RECIPE_URL, {
+            'title': 'Just saved', 'time_minutes': 5, 'price': '2.00',
+            'tags': [self.tag.id], 'ingredients': [],
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.titles(self.client),
+                             ['Replicated', 'Just saved'])
+        self.assertEqual(replica.captured_queries, [])
+
+        # the window ran out, the replica has not caught up yet
+        caches['default'].clear()
+        self.assertEqual(self.titles(self.client), ['Replicated'])
+
+    def test_other_clients_not_pinned(self):
+        """a write pins only the client that made it"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        replicate(other)
+        other_client = self.token_client(other)
+        self.client.post(reverse('recipe:tag-list'), {'name': 'Quick'})
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.titles(other_client), [])
+
+        self.assertTrue(replica.captured_queries)
+
+    def test_unsafe_requests_read_primary(self):
+        """writes validate against the primary, not the lagging replica"""
+        tag = Tag.objects.create(user=self.user, name='Not replicated')
+
+        res = self.client.post(RECIPE_URL, {
+            'title': 'Tagged', 'time_minutes': 5, 'price': '2.00',
+            'tags': [tag.id], 'ingredients': [],
+        }, format='json')
+
+        self.assertEqual(res.status_code, 201)
+
+    def test_new_token_authenticates(self):
+        """tokens are read from the primary, a fresh one works at once"""
+        res = self.client.post(reverse('user:token'), {
+            'email': 'testuser@gmail.com', 'password': 'testpass',
+        })
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {res.data["token"]}')
+
+        self.assertEqual(self.titles(client), ['Replicated'])
+
+    def test_outside_requests_use_primary(self):
+        """commands and the shell read from the primary"""
+        router = ReplicaRouter()
+
+        self.assertEqual(router.db_for_read(Recipe), 'default')
+        self.assertEqual(router.db_for_write(Recipe), 'default')
+
+
+@override_settings(DEBUG=False, TESTING=False, CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}})
+class ReplicaCacheCheckTests(SimpleTestCase):
+    """the pins must live in a cache shared by the workers"""
+
+    def test_no_replicas(self):
+        with override_settings(DATABASE_REPLICAS={'ALIASES': []}):
+            self.assertEqual(check_replica_cache(None), [])
+
+    @override_settings(DATABASE_REPLICAS={'ALIASES': ['replica']})
+    def test_process_local_cache_rejected(self):
+        self.assertEqual([error.id for error in check_replica_cache(None)],
+                         ['core.E001'])
+
+    @override_settings(DATABASE_REPLICAS={'ALIASES': ['replica'],
+                                          'CACHE_ALIAS': 'shared'},
+                       CACHES={'shared': {
+                           'BACKEND': 'django.core.cache.backends.memcached.'
+                                      'PyMemcacheCache',
+                       }})
+    def test_shared_cache_accepted(self):
+        self.assertEqual(check_replica_cache(None), [])
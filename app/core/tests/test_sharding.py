@@ -0,0 +1,248 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command, CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from core.sharding import (
+    SHARDED_MODELS, plan_moves, reserve_id_ranges, use_shard,
+)
+from core import sharding
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+SHARDS = {'ALIASES': ['default', 'shard1'], 'ID_RANGE': 10 ** 6}
+
+
+def create_user(email):
+    return get_user_model().objects.create_user(email=email,
+                                                password='testpass')
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        caches['default'].clear()
+        reserve_id_ranges('shard1')
+        # new users go to the shard with the fewest users
+        self.first = create_user('first@gmail.com')
+        self.user = create_user('testuser@gmail.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, client=None):
+        client = client or self.client
+        tag = client.post(TAG_URL, {'name': 'Vegan'}).data
+        ingredient = client.post(reverse('recipe:ingredient-list'),
+                                 {'name': 'Beans'}).data
+        res = client.post(RECIPE_URL, {
+            'title': 'Moi Moi', 'time_minutes': 30, 'price': '5.00',
+            'tags': [tag['id']], 'ingredients': [ingredient['id']],
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+        return res.data
+
+    def test_new_users_spread(self):
+        """users are placed on the emptiest shard with a copy of their row"""
+        self.assertEqual(self.first.shard, 'default')
+        self.assertEqual(self.user.shard, 'shard1')
+        stub = get_user_model().objects.using('shard1').get(pk=self.user.pk)
+        self.assertEqual(stub.email, self.user.email)
+        self.assertFalse(stub.has_usable_password())
+
+    def test_shard_counts_cached(self):
+        """placing a user reads the cached counts and counts it up"""
+        with self.assertNumQueries(0, using='default'):
+            alias = sharding.pick_shard(self.user)
+        self.assertEqual(alias, 'default')
+        self.assertEqual(sharding.shard_user_counts(self.user),
+                         {'default': 2, 'shard1': 1})
+
+    def test_writes_and_reads_use_the_users_shard(self):
+        """the api reads and writes the rows on the user's shard"""
+        recipe = self.create_recipe()
+
+        self.assertFalse(Recipe.objects.using('default').exists())
+        stored = Recipe.objects.using('shard1').get()
+        self.assertEqual(stored.id, recipe['id'])
+        self.assertGreater(stored.id, SHARDS['ID_RANGE'])
+        self.assertEqual(
+            Tag.objects.using('shard1').get().recipe_count, 1
+        )
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual([item['id'] for item in res.data['results']],
+                         [recipe['id']])
+        res = self.client.get(reverse('recipe:recipe-detail',
+                                      args=[recipe['id']]))
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegan')
+
+    def test_users_see_only_their_shard(self):
+        """users on different shards do not see each other's rows"""
+        self.create_recipe()
+        client = APIClient()
+        client.force_authenticate(self.first)
+
+        self.assertEqual(client.get(RECIPE_URL).data['results'], [])
+        self.create_recipe(client)
+        self.assertEqual(Recipe.objects.using('default').count(), 1)
+        self.assertEqual(Recipe.objects.using('shard1').count(), 1)
+
+    def test_export_reads_the_users_shard(self):
+        """the streamed export, read after the view returned"""
+        self.create_recipe()
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertIn(b'Moi Moi', b''.join(res.streaming_content))
+
+    def test_counts_follow_changes_outside_requests(self):
+        """shell and admin changes count on the recipe's shard"""
+        self.create_recipe()
+        recipe = Recipe.objects.using('shard1').get()
+        quick = Tag.objects.using('shard1').create(user=self.user,
+                                                   name='Quick')
+
+        recipe.tags.add(quick)
+        self.assertEqual(
+            Tag.objects.using('shard1').get(pk=quick.pk).recipe_count, 1
+        )
+        recipe.delete()
+        self.assertEqual(
+            sorted(Tag.objects.using('shard1').values_list('recipe_count',
+                                                           flat=True)),
+            [0, 0]
+        )
+        self.assertEqual(
+            Ingredient.objects.using('shard1').get().recipe_count, 0
+        )
+
+    def test_bulk_changes_use_the_users_shard(self):
+        """bulk updates and deletes write to the user's shard"""
+        recipe = self.create_recipe()
+
+        res = self.client.patch(reverse('recipe:recipe-bulk'), [
+            {'id': recipe['id'], 'tags': []},
+        ], format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            Tag.objects.using('shard1').get().recipe_count, 0
+        )
+        res = self.client.delete(reverse('recipe:recipe-bulk'),
+                                 [recipe['id']], format='json')
+        self.assertEqual(res.status_code, 204)
+        self.assertFalse(Recipe.objects.using('shard1').exists())
+        self.assertEqual(
+            Ingredient.objects.using('shard1').get().recipe_count, 0
+        )
+
+    def test_locked_user_cannot_write(self):
+        """writes are refused while the user is moved, reads still work"""
+        self.create_recipe()
+        self.user.shard_locked = True
+
+        res = self.client.post(TAG_URL, {'name': 'Quick'})
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(self.client.get(RECIPE_URL).status_code, 200)
+
+    def test_rebalance_moves_user(self):
+        """a moved user keeps its rows and ids on the new shard"""
+        client = APIClient()
+        client.force_authenticate(self.first)
+        recipe = self.create_recipe(client)
+        out = StringIO()
+
+        call_command('rebalance_shards', '--user', self.first.email,
+                     '--to', 'shard1', '--wait', '0', stdout=out)
+
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.shard, 'shard1')
+        self.assertIn('first@gmail.com: default -> shard1', out.getvalue())
+        for model in SHARDED_MODELS:
+            self.assertFalse(model.objects.using('default').exists())
+        moved = Recipe.objects.using('shard1').get(pk=recipe['id'])
+        self.assertEqual(moved.user_id, self.first.pk)
+        with use_shard('shard1'):
+            self.assertEqual(
+                list(moved.ingredients.values_list('name', flat=True)),
+                ['Beans'],
+            )
+
+        client.force_authenticate(self.first)
+        res = client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'][0]['id'], recipe['id'])
+
+    def test_move_keeps_rows_written_after_the_copy(self):
+        """a write that reaches the old shard after the copy stops the
+        move before the old rows are deleted"""
+        client = APIClient()
+        client.force_authenticate(self.first)
+        self.create_recipe(client)
+        copy = sharding.copy_user_rows
+
+        def copy_then_write(user, source, target, digest=None):
+            copied = copy(user, source, target, digest)
+            Tag.objects.using(source).create(user=user, name='Late')
+            return copied
+
+        with mock.patch.object(sharding, 'copy_user_rows', copy_then_write):
+            with self.assertRaisesMessage(CommandError, 'changed after'):
+                call_command('rebalance_shards', '--user', self.first.email,
+                             '--to', 'shard1', '--wait', '0',
+                             stdout=StringIO())
+
+        self.assertTrue(Tag.objects.using('default').filter(
+            name='Late').exists())
+        self.assertEqual(Recipe.objects.using('default').count(), 1)
+
+    def test_rebalance_plan(self):
+        """without --user the command evens out the shards"""
+        extra = create_user('extra@gmail.com')
+        self.assertEqual(extra.shard, 'default')
+        for user, recipes in ((self.first, 2), (extra, 1)):
+            client = APIClient()
+            client.force_authenticate(user)
+            for _ in range(recipes):
+                self.create_recipe(client)
+        out = StringIO()
+
+        call_command('rebalance_shards', '--dry-run', stdout=out)
+
+        self.assertIn('default: 2 users, 3 recipes', out.getvalue())
+        self.assertIn('shard1: 1 users, 0 recipes', out.getvalue())
+        self.assertIn('extra@gmail.com: default -> shard1', out.getvalue())
+        self.assertNotIn('first@gmail.com', out.getvalue())
+        self.assertEqual(Recipe.objects.using('default').count(), 3)
+
+    def test_deleted_user_data_removed(self):
+        """deleting a user deletes its rows on its shard"""
+        self.create_recipe()
+
+        self.user.delete()
+
+        self.assertFalse(Recipe.objects.using('shard1').exists())
+        self.assertFalse(Ingredient.objects.using('shard1').exists())
+
+
+class PlanMovesTests(SimpleTestCase):
+
+    def test_moves_even_out_shards(self):
+        loads = {'a': {1: 50, 2: 30, 3: 20}, 'b': {4: 10}, 'c': {}}
+
+        moves = plan_moves(loads)
+
+        self.assertEqual(moves, [(1, 'a', 'c'), (3, 'a', 'b')])
+
+    def test_balanced_shards_stay(self):
+        self.assertEqual(plan_moves({'a': {1: 10}, 'b': {2: 12}}), [])
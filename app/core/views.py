@@ -0,0 +1,25 @@
+import hmac
+
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_safe
+
+from core.metrics import collect, get_setting, render_metrics
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@require_safe
+def metrics(request):
+    """the request metrics for a Prometheus scraper, of every worker when
+    METRICS['DIRECTORY'] is set and of this process otherwise
+
+    when METRICS['TOKEN'] is set the scraper has to send it as a bearer
+    token
+    """
+    token = get_setting('TOKEN')
+    if token and not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(collect()),
+                        content_type=CONTENT_TYPE)
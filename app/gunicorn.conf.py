@@ -0,0 +1,62 @@
+"""
+Gunicorn configuration for the production profile.
+
+    gunicorn app.wsgi -c gunicorn.conf.py
+
+The app is imported once in the master and the workers are forked from
+it, so they share its memory copy-on-write. Code changes therefore need a
+new master: send USR2 to start one next to the old one, then TERM the old
+master once the new workers are up, no request is dropped. HUP only
+restarts the workers with the preloaded code.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# sync workers are CPU bound on serialization and hashing, the usual
+# 2 * cores + 1 keeps every core busy while some workers wait on the db
+workers = int(
+    os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1
+)
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+preload_app = True
+
+# recycle workers now and then so slow leaks cannot grow without bound
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # move everything loaded so far out of the collector's reach, otherwise
+    # the first collection in a worker touches and copies every page
+    gc.freeze()
+
+
+def on_starting(server):
+    # the metrics files of an earlier run belong to workers that are gone
+    from core.metrics import remove_snapshots
+    remove_snapshots()
+
+
+def worker_exit(server, worker):
+    # write out the requests served since the worker last wrote its metrics
+    from core.metrics import flush_metrics
+    flush_metrics()
+
+
+def child_exit(server, worker):
+    # in the master: add the exited worker's metrics to those of the
+    # workers before it and drop its file
+    from core.metrics import retire_snapshot
+    retire_snapshot(worker.pid)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe'
+
+    def ready(self):
+        # connect the response cache invalidation, pantry index and
+        # similarity signature signal receivers and register the checks
+        from recipe import cache, checks, pantry, similarity  # noqa: F401
@@ -0,0 +1,173 @@
+"""async read endpoints for recipes, tags and ingredients
+
+these serve the same payloads as the list and retrieve actions of the
+viewsets, but as coroutines so an ASGI worker can keep many slow clients
+in flight without a thread each. Django 4.0 has no async ORM, so a cache
+miss runs the sync queryset, paginator and serializer in one
+`sync_to_async` call; token lookups in the in-process cache, ETag checks
+and (with a local-memory backend) response cache hits stay on the event
+loop and never touch a thread
+"""
+from asgiref.sync import sync_to_async
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+from rest_framework import exceptions, status
+from rest_framework.authentication import get_authorization_header
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from core.authentication import CachedTokenAuthentication, token_cache
+from core.renderers import FastJSONRenderer
+from core.sharding import use_shard
+from core.models import Tag, Ingredient
+from recipe import serializers
+from recipe.cache import (
+    cache_keys, etag_matches, get_setting, response_cache,
+)
+from recipe.filters import filter_recipe_attrs, filter_recipes
+from recipe.pagination import RecipeCursorPagination
+from recipe.views import user_recipe_attrs, user_recipes
+
+MEDIA_TYPE = 'application/json'
+renderer = FastJSONRenderer()
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    response = HttpResponse(
+        renderer.render(data), status=status_code, content_type=MEDIA_TYPE
+    )
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def error_response(exc, headers=None):
+    """render an exception the way the viewsets' exception handler does"""
+    response = exception_handler(exc, {})
+    del response['Content-Type']
+    return json_response(response.data, response.status_code,
+                         {**response.headers, **(headers or {})})
+
+
+async def run_cache(func, *args):
+    """call a response cache function, off the loop unless it is local"""
+    if isinstance(response_cache(), LocMemCache):
+        return func(*args)
+    return await sync_to_async(func)(*args)
+
+
+async def authenticate(request):
+    """return the user of the request's token
+
+    a token found in the in-process cache is accepted without a thread
+    hop, anything else goes through the sync authentication class
+    """
+    authentication = CachedTokenAuthentication()
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != authentication.keyword.lower().encode():
+        raise exceptions.NotAuthenticated()
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed(
+            'Invalid token header. Token string should not contain spaces.'
+        )
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed(
+            'Invalid token header. Token string should not contain '
+            'invalid characters.'
+        )
+
+    cached = token_cache.get_local(key)
+    if cached is None:
+        cached = await sync_to_async(
+            authentication.authenticate_credentials
+        )(key)
+    return cached[0]
+
+
+def read_view(build):
+    """make a cached, token authenticated async GET view of a payload
+
+    `build(request, user, **kwargs)` is sync and returns the response data
+    """
+    async def view(request, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return error_response(exceptions.MethodNotAllowed(request.method))
+        try:
+            user = await authenticate(request)
+        except exceptions.APIException as exc:
+            return error_response(exc, {'WWW-Authenticate': 'Token'})
+
+        etag, key = await run_cache(
+            cache_keys, user.pk, request.get_full_path(), MEDIA_TYPE
+        )
+        if etag_matches(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = await run_cache(response_cache().get, key)
+            if data is None:
+                try:
+                    with use_shard(user.shard, user.shard_locked):
+                        data = await sync_to_async(build)(request, user,
+                                                          **kwargs)
+                except (exceptions.APIException, Http404) as exc:
+                    return error_response(exc)
+                await run_cache(
+                    response_cache().set, key, data, get_setting('TIMEOUT')
+                )
+            response = json_response(data)
+
+        response['ETag'] = etag
+        patch_cache_control(response, private=True)
+        return response
+
+    view.__name__ = build.__name__
+    view.__doc__ = build.__doc__
+    return view
+
+
+def paginate(request, queryset, serializer_class):
+    """serialize one cursor page of the queryset like the viewsets do"""
+    request = Request(request)
+    paginator = RecipeCursorPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True,
+                                  context={'request': request})
+    return paginator.get_paginated_response(serializer.data).data
+
+
+@read_view
+def recipe_list(request, user):
+    """the user's recipes, filtered the same way as the recipe list"""
+    queryset = serializers.recipe_rows(
+        filter_recipes(user_recipes(user), request.GET)
+    )
+    return paginate(request, queryset, serializers.RecipeListSerializer)
+
+
+@read_view
+def recipe_detail(request, user, pk):
+    """one of the user's recipes with its tags and ingredients"""
+    recipe = user_recipes(user).filter(pk=pk).first()
+    if recipe is None:
+        raise Http404
+    return serializers.RecipeDetailSerializer(
+        recipe, context={'request': Request(request)}
+    ).data
+
+
+@read_view
+def tag_list(request, user):
+    """the user's tags, filtered the same way as the tag list"""
+    queryset = filter_recipe_attrs(user_recipe_attrs(Tag, user), request.GET)
+    return paginate(request, queryset, serializers.TagSerializer)
+
+
+@read_view
+def ingredient_list(request, user):
+    """the user's ingredients, filtered the same way as the list"""
+    queryset = filter_recipe_attrs(user_recipe_attrs(Ingredient, user),
+                                   request.GET)
+    return paginate(request, queryset, serializers.IngredientSerializer)
@@ -0,0 +1,159 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import Tag, Ingredient, Recipe
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+VERSION_KEY = 'recipe-api:version:{}'
+RESPONSE_KEY = 'recipe-api:response:{}:{}:{}'
+
+
+def get_setting(name):
+    """read a value from the RESPONSE_CACHE setting"""
+    return getattr(settings, 'RESPONSE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def response_cache():
+    return caches[get_setting('CACHE_ALIAS')]
+
+
+def initial_version():
+    """starting point of a version counter
+
+    time based so a counter evicted from the cache restarts above every
+    version it could have reached before, old responses are never reused
+    """
+    return time.time_ns()
+
+
+def get_version(user_id):
+    """return the current cache version of the user's recipe data"""
+    cache = response_cache()
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    """invalidate every cached response of the user"""
+    cache = response_cache()
+    key = VERSION_KEY.format(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, initial_version(), timeout=None)
+
+
+def version_changed(user_id, using=None):
+    """bump the user's version once the transaction commits
+
+    a bump made inside the transaction lets a concurrent request cache the
+    data it still reads from before the commit under the new version
+    """
+    transaction.on_commit(lambda: bump_version(user_id), using=using)
+
+
+def cache_keys(user_id, path, media_type):
+    """return the ETag and the cache key of a response for the user"""
+    version = get_version(user_id)
+    digest = hashlib.sha1(
+        '|'.join((path, media_type or '')).encode()
+    ).hexdigest()[:20]
+    etag = f'"{version}-{digest}"'
+    return etag, RESPONSE_KEY.format(user_id, version, digest)
+
+
+def etag_matches(request, etag):
+    """whether the request's If-None-Match still matches the etag"""
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+class CachedListMixin:
+    """cache the list responses of a viewset per user
+
+    cached data is keyed by the user's version counter, which is bumped
+    when a change to their recipes, tags and ingredients commits, so
+    entries never need to be deleted. The version also makes up the ETag,
+    a request whose If-None-Match still matches gets a 304 without touching
+    the database
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        user_id = request.user.pk
+        etag, key = cache_keys(user_id, request.get_full_path(),
+                               request.accepted_media_type)
+
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = response_cache()
+            data = cache.get(key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, get_setting('TIMEOUT'))
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        patch_cache_control(response, private=True)
+        return response
+
+
+class CachedResponseMixin(CachedListMixin):
+    """cache the list and retrieve responses of a viewset per user
+
+    kept apart from CachedListMixin because the router adds a detail route
+    for any viewset that has a retrieve method
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request,
+                                    *args, **kwargs)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, **kwargs):
+    # a new user starts from a fresh version, even if their id was used
+    # before, as happens when a test database is rolled back. they have no
+    # data to cache yet, so the bump need not wait for the commit
+    if created:
+        bump_version(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_data_changed(sender, instance, using, **kwargs):
+    version_changed(instance.user_id, using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, using, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        version_changed(instance.user_id, using)
@@ -0,0 +1,13 @@
+from django.core.checks import Tags, register
+
+from core.checks import shared_cache_errors
+from recipe.cache import get_setting
+
+
+@register(Tags.caches)
+def check_response_cache(app_configs, **kwargs):
+    """the cache versions and the pantry index versions must be shared"""
+    return shared_cache_errors(
+        get_setting('CACHE_ALIAS'), 'RESPONSE_CACHE',
+        'the cached responses and pantry indexes', 'recipe.E001',
+    )
@@ -0,0 +1,80 @@
+import csv
+import json
+from itertools import islice
+
+from core.models import Recipe
+
+RECIPE_FIELDS = ('id', 'title', 'price', 'time_minutes', 'link')
+CSV_HEADER = RECIPE_FIELDS + ('tags', 'ingredients')
+
+
+def _related_by_recipe(field, recipe_ids, using):
+    """map recipe ids to the id and name of their tags or ingredients"""
+    through = getattr(Recipe, field).through
+    target = getattr(Recipe, field).field.m2m_reverse_field_name()
+    rows = through.objects.using(using).filter(
+        recipe_id__in=recipe_ids
+    ).values_list(
+        'recipe_id', f'{target}__id', f'{target}__name'
+    ).order_by(f'{target}__id')
+    related = {}
+    for recipe_id, pk, name in rows:
+        related.setdefault(recipe_id, []).append({'id': pk, 'name': name})
+    return related
+
+
+def iter_recipes(user, chunk_size=1000):
+    """yield every recipe of the user with its tags and ingredients
+
+    recipes are read through a server side cursor and their relations are
+    fetched once per chunk, so memory use depends on chunk_size only. the
+    rows are read after the view returned, from the user's shard
+    """
+    rows = Recipe.objects.using(user.shard).filter(
+        user=user
+    ).order_by('id').values_list(
+        *RECIPE_FIELDS
+    ).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        ids = [row[0] for row in chunk]
+        tags = _related_by_recipe('tags', ids, user.shard)
+        ingredients = _related_by_recipe('ingredients', ids, user.shard)
+        for row in chunk:
+            recipe = dict(zip(RECIPE_FIELDS, row))
+            recipe['price'] = str(recipe['price'])
+            recipe['tags'] = tags.get(recipe['id'], [])
+            recipe['ingredients'] = ingredients.get(recipe['id'], [])
+            yield recipe
+
+
+def ndjson_lines(recipes):
+    """render recipes as newline delimited json"""
+    for recipe in recipes:
+        yield json.dumps(recipe, separators=(',', ':')) + '\n'
+
+
+class Echo:
+    """file-like object that hands back what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(recipes):
+    """render recipes as csv, tag and ingredient names are joined by |"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for recipe in recipes:
+        yield writer.writerow([recipe[field] for field in RECIPE_FIELDS] + [
+            '|'.join(item['name'] for item in recipe['tags']),
+            '|'.join(item['name'] for item in recipe['ingredients']),
+        ])
+
+
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
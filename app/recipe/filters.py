@@ -0,0 +1,161 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count
+from rest_framework.exceptions import ValidationError
+
+from core.models import Recipe
+
+MATCH_CHOICES = ('any', 'all')
+ATTR_ORDERINGS = {
+    'name': ('-name', '-id'),
+    'usage': ('-recipe_count', '-id'),
+}
+FLAGS = {'0': False, 'false': False, '1': True, 'true': True}
+
+
+def _params_to_ints(params, name):
+    """convert a comma separated query param into a list of integers"""
+    value = params.get(name)
+    if not value:
+        return []
+    try:
+        return list(dict.fromkeys(int(pk) for pk in value.split(',')))
+    except ValueError:
+        raise ValidationError({
+            name: 'Expected a comma separated list of ids.'
+        })
+
+
+def _param(params, name, convert):
+    """convert a single query param, returning None when it is missing"""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return convert(value)
+    except (ValueError, KeyError, InvalidOperation):
+        raise ValidationError({name: f'Invalid value "{value}".'})
+
+
+def _related_recipe_ids(field, ids, match):
+    """subquery of recipe ids linked to any or all of the given ids
+
+    all-of is answered by one GROUP BY over the through table with a HAVING
+    on the number of matched rows instead of one join per requested id
+    """
+    through = getattr(Recipe, field).through
+    column = getattr(Recipe, field).field.m2m_reverse_name()
+    rows = through.objects.filter(**{f'{column}__in': ids})
+    if match == 'all':
+        rows = rows.values('recipe_id').annotate(
+            matched=Count(column)
+        ).filter(matched=len(ids))
+    return rows.values('recipe_id')
+
+
+def filter_recipes(queryset, params):
+    """apply the recipe list query params to the queryset
+
+    tags, ingredients      comma separated ids
+    tags_match,
+    ingredients_match      any (default) or all
+    price_min, price_max   inclusive price range
+    time_minutes_min,
+    time_minutes_max       inclusive preparation time range
+    title                  title prefix
+    """
+    for field in ('tags', 'ingredients'):
+        ids = _params_to_ints(params, field)
+        match = params.get(f'{field}_match') or 'any'
+        if match not in MATCH_CHOICES:
+            raise ValidationError({f'{field}_match': 'Expected any or all.'})
+        if ids:
+            queryset = queryset.filter(
+                pk__in=_related_recipe_ids(field, ids, match)
+            )
+
+    ranges = (
+        ('price', Decimal),
+        ('time_minutes', int),
+    )
+    for field, convert in ranges:
+        low = _param(params, f'{field}_min', convert)
+        high = _param(params, f'{field}_max', convert)
+        if low is not None:
+            queryset = queryset.filter(**{f'{field}__gte': low})
+        if high is not None:
+            queryset = queryset.filter(**{f'{field}__lte': high})
+
+    title = params.get('title')
+    if title:
+        queryset = queryset.filter(title__startswith=title)
+    return queryset
+
+
+def filter_recipe_attrs(queryset, params):
+    """apply the tag and ingredient list query params to the queryset
+
+    both params read the maintained recipe_count column, so neither needs
+    a join with the recipes. the cursor of a usage page holds the count and
+    the id of its last row, tags with the same count are paged by id; a
+    tag whose count changes while a client pages moves to its new place
+    and may be seen twice or not at all
+
+    assigned_only          1 to only list the ones used by a recipe
+    ordering               name (default) or usage, most used first
+    """
+    if _param(params, 'assigned_only', lambda value: FLAGS[value.lower()]):
+        queryset = queryset.filter(recipe_count__gt=0)
+
+    ordering = params.get('ordering') or 'name'
+    if ordering not in ATTR_ORDERINGS:
+        raise ValidationError(
+            {'ordering': f'Expected one of {", ".join(ATTR_ORDERINGS)}.'}
+        )
+    return queryset.order_by(*ATTR_ORDERINGS[ordering])
+
+
+def import_params(params):
+    """read the skip query param of the import, the number of rows of the
+    file imported by an earlier, interrupted upload"""
+    skip = _param(params, 'skip', int) or 0
+    if skip < 0:
+        raise ValidationError({'skip': 'Expected a number of rows.'})
+    return skip
+
+
+def pantry_params(params, max_missing):
+    """read the what-can-i-cook query params, as (ids, names, missing)
+
+    ingredients            comma separated ids of the ingredients at hand
+    names                  comma separated names of the ingredients at
+                           hand, case insensitive
+    missing                how many ingredients a recipe may lack, 0 by
+                           default
+    """
+    ids = _params_to_ints(params, 'ingredients')
+    names = [name.strip() for name in params.get('names', '').split(',')
+             if name.strip()]
+    if not ids and not names:
+        raise ValidationError(
+            {'ingredients': 'Expected ingredients or names.'}
+        )
+    missing = _param(params, 'missing', int) or 0
+    if not 0 <= missing <= max_missing:
+        raise ValidationError(
+            {'missing': f'Expected a number from 0 to {max_missing}.'}
+        )
+    return ids, names, missing
+
+
+def shopping_list_params(params, max_recipes):
+    """read the recipes query param of the shopping list, comma separated
+    ids of at most max_recipes recipes"""
+    ids = _params_to_ints(params, 'recipes')
+    if not ids:
+        raise ValidationError({'recipes': 'This query param is required.'})
+    if len(ids) > max_recipes:
+        raise ValidationError(
+            {'recipes': f'Expected at most {max_recipes} ids.'}
+        )
+    return ids
@@ -0,0 +1,249 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.db import transaction
+from rest_framework import serializers
+
+from core.counters import add_recipe_counts
+from core.models import Tag, Ingredient, Recipe
+from core.sharding import use_shard
+from recipe.cache import version_changed
+from recipe.pantry import index_changed
+from recipe.similarity import signatures_changed
+
+IMPORT_TYPES = ('ndjson', 'csv')
+
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """validate one imported recipe, relations are given by name"""
+    ingredients = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False,
+        default=list
+    )
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False,
+        default=list
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('title', 'price', 'time_minutes', 'link',
+                  'ingredients', 'tags')
+
+
+def _names(value):
+    """accept names as a list of strings or dicts, or a | joined string"""
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        return [name for name in value.split('|') if name]
+    if isinstance(value, list):
+        return [item.get('name') if isinstance(item, dict) else item
+                for item in value]
+    return value
+
+
+class DecodedLines:
+    """iterate the byte lines of a file as text
+
+    a line that is not valid in the encoding raises UnicodeDecodeError at
+    its turn only, unlike codecs.iterdecode the iteration then goes on with
+    the following line
+    """
+
+    def __init__(self, lines, encoding='utf-8'):
+        self.lines = iter(lines)
+        self.encoding = encoding
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.lines).decode(self.encoding)
+
+
+class InvalidRow:
+    """a row of the file that could not be parsed"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _json_rows(lines):
+    """(line number, row) of every non blank ndjson line"""
+    lines = iter(lines)
+    number = 0
+    while True:
+        number += 1
+        try:
+            line = next(lines)
+        except StopIteration:
+            return
+        except UnicodeDecodeError as exc:
+            yield number, InvalidRow(str(exc))
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = InvalidRow(str(exc))
+        yield number, row
+
+
+def _csv_rows(lines):
+    """(line number, row) of every csv row, the line it ends on"""
+    rows = csv.DictReader(lines)
+    # the reader does not count the lines that failed to decode
+    undecoded = 0
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except UnicodeDecodeError as exc:
+            undecoded += 1
+            row = InvalidRow(str(exc))
+        except (ValueError, csv.Error) as exc:
+            row = InvalidRow(str(exc))
+        yield rows.line_num + undecoded, row
+
+
+def parse_rows(lines, import_type):
+    """lazily parse an iterable of text lines into (line number, recipe
+    dict) pairs
+
+    both formats match what the export endpoint produces. a line that does
+    not decode or parse gives an InvalidRow and the parsing goes on
+    """
+    if import_type == 'csv':
+        rows = _csv_rows(lines)
+    else:
+        rows = _json_rows(lines)
+    for number, row in rows:
+        if isinstance(row, dict):
+            for field in ('tags', 'ingredients'):
+                row[field] = _names(row.get(field))
+        yield number, row
+
+
+class RecipeImporter:
+    """write parsed recipes for a user in fixed size batches
+
+    tags and ingredients are upserted by (user, name), every batch is
+    written with bulk_create in its own short transaction. `done` counts
+    the rows handled in committed batches and is the offset to pass as
+    `skip` (the upload's query param or the command's --skip) when
+    resuming an interrupted import. rows that fail to parse or validate
+    are skipped and reported with their row and line numbers
+    """
+
+    def __init__(self, user, batch_size=1000, skip=0, on_batch=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.skip = skip
+        self.on_batch = on_batch
+        self.done = skip
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self.started = None
+        self._ids = {Tag: {}, Ingredient: {}}
+
+    @property
+    def rate(self):
+        """rows handled per second since the import started"""
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return (self.done - self.skip) / elapsed if elapsed else 0.0
+
+    def run(self, rows):
+        """import every row after the first `skip` rows"""
+        self.started = time.monotonic()
+        rows = islice(rows, self.skip, None)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return self
+            with use_shard(self.user.shard, self.user.shard_locked):
+                self.write_batch(batch)
+            if self.on_batch is not None:
+                self.on_batch(self)
+
+    def write_batch(self, batch):
+        valid = []
+        for offset, (line, row) in enumerate(batch):
+            if isinstance(row, InvalidRow):
+                errors = {'non_field_errors': [row.error]}
+            else:
+                serializer = RecipeImportSerializer(data=row)
+                if serializer.is_valid():
+                    valid.append(serializer.validated_data)
+                    continue
+                errors = serializer.errors
+            if len(self.errors) < 100:
+                self.errors.append({'row': self.done + offset + 1,
+                                    'line': line, 'errors': errors})
+
+        with transaction.atomic(using=self.user.shard):
+            tag_ids = self._upsert(Tag, valid, 'tags')
+            ingredient_ids = self._upsert(Ingredient, valid, 'ingredients')
+            recipes = Recipe.objects.bulk_create([
+                Recipe(user=self.user, **{
+                    key: value for key, value in data.items()
+                    if key not in ('tags', 'ingredients')
+                }) for data in valid
+            ])
+            links = Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=pk)
+                for recipe, data in zip(recipes, valid)
+                for pk in {tag_ids[name] for name in data['tags']}
+            ])
+            add_recipe_counts(Tag, [link.tag_id for link in links],
+                              self.user.shard)
+            links = Recipe.ingredients.through.objects.bulk_create([
+                Recipe.ingredients.through(recipe_id=recipe.pk,
+                                           ingredient_id=pk)
+                for recipe, data in zip(recipes, valid)
+                for pk in {ingredient_ids[name]
+                           for name in data['ingredients']}
+            ])
+            add_recipe_counts(Ingredient,
+                              [link.ingredient_id for link in links],
+                              self.user.shard)
+        version_changed(self.user.pk, self.user.shard)
+        index_changed(self.user.pk)
+        signatures_changed([recipe.pk for recipe in recipes], self.user.shard)
+        self.created += len(recipes)
+        self.skipped += len(batch) - len(valid)
+        self.done += len(batch)
+
+    def _upsert(self, model, rows, field):
+        """return the ids of every name used in the batch, creating the
+        names that do not exist yet for the user"""
+        ids = self._ids[model]
+        missing = {name for data in rows for name in data[field]} - set(ids)
+        if missing:
+            existing = model.objects.filter(
+                user=self.user, name__in=missing
+            ).order_by('-id').values_list('name', 'id')
+            ids.update(existing)
+            model.objects.bulk_create([
+                model(user=self.user, name=name)
+                for name in missing - set(ids)
+            ])
+            ids.update(model.objects.filter(
+                user=self.user, name__in=missing - set(ids)
+            ).values_list('name', 'id'))
+        return ids
+
+    def report(self):
+        """summary of the import so far"""
+        return {
+            'created': self.created,
+            'skipped': self.skipped,
+            'done': self.done,
+            'rows_per_second': round(self.rate, 1),
+            'errors': self.errors,
+        }
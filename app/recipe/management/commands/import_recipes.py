@@ -0,0 +1,74 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.importer import (
+    IMPORT_TYPES, DecodedLines, RecipeImporter, parse_rows,
+)
+
+
+class Command(BaseCommand):
+    """Django command to stream a csv or ndjson file of recipes into the db"""
+
+    help = 'import recipes for a user from a csv or ndjson file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True,
+                            help='email of the user that owns the recipes')
+        parser.add_argument('--type', choices=IMPORT_TYPES,
+                            help='file type, guessed from the extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skip', type=int, default=0,
+                            help='number of rows already imported')
+        parser.add_argument('--checkpoint',
+                            help='file that records the progress, an '
+                                 'interrupted import resumes from it')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["user"]}')
+
+        import_type = options['type'] or os.path.splitext(
+            options['path'])[1].lstrip('.').lower()
+        if import_type not in IMPORT_TYPES:
+            raise CommandError('Unable to tell the file type, use --type')
+
+        checkpoint = options['checkpoint']
+        skip = options['skip']
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                skip = max(skip, int(f.read().strip() or 0))
+            self.stdout.write(f'resuming after row {skip}')
+
+        def on_batch(importer):
+            if checkpoint:
+                with open(checkpoint, 'w') as f:
+                    f.write(str(importer.done))
+            self.stdout.write(
+                f'{importer.done} rows, {importer.created} created, '
+                f'{importer.rate:.0f} rows/s'
+            )
+
+        importer = RecipeImporter(user, batch_size=options['batch_size'],
+                                  skip=skip, on_batch=on_batch)
+        with open(options['path'], 'rb') as f:
+            try:
+                importer.run(parse_rows(DecodedLines(f), import_type))
+            except Exception:
+                self.stderr.write(
+                    f'import stopped after row {importer.done}, rerun with '
+                    f'--skip {importer.done} or the same --checkpoint'
+                )
+                raise
+
+        for error in importer.errors:
+            self.stderr.write(f'row {error["row"]} (line {error["line"]}): '
+                              f'{error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'imported {importer.created} recipes, skipped '
+            f'{importer.skipped} invalid rows ({importer.rate:.0f} rows/s)'
+        ))
@@ -0,0 +1,51 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+from core.sharding import get_setting, is_sharded
+from recipe import similarity
+
+
+class Command(BaseCommand):
+    """Django command to recompute the similarity signatures of recipes
+
+    run it after changing RECIPE_SIMILARITY and after writing through
+    table rows with raw SQL, migration 0011 signs the recipes that existed
+    before the lookup. the signatures of a batch are computed together,
+    vectorized when NumPy is installed
+    """
+
+    help = 'recompute the minhash signatures of the similar recipes lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append',
+                            help='email of a user whose recipes to sign')
+        parser.add_argument('--batch-size', type=int,
+                            default=similarity.get_setting('BATCH_SIZE'))
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = list(get_user_model().objects.filter(
+                email__in=options['user']
+            ))
+            missing = set(options['user']) - {user.email for user in users}
+            if missing:
+                raise CommandError(f'unknown users: {", ".join(missing)}')
+        if similarity.numpy is None:
+            self.stdout.write('NumPy is not installed, signing in Python')
+
+        for alias in get_setting('ALIASES'):
+            prefix = f'{alias} ' if is_sharded() else ''
+            recipes = Recipe.objects.all()
+            if users is not None:
+                recipes = recipes.filter(user__in=[user.pk for user in users])
+            start = time.perf_counter()
+            count = similarity.rebuild_signatures(recipes, alias,
+                                                  options['batch_size'])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{prefix}recipes: {count} signed in {elapsed:.2f}s'
+            )
@@ -0,0 +1,136 @@
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+
+
+class RecipeCursorPagination(pagination.CursorPagination):
+    """keyset pagination that follows the ordering of the viewset queryset
+
+    the cursor encodes the value of every ordering column of the last row
+    seen, and the ordering always ends with the primary key, so the next
+    page is the rows after that row's (value, ..., id) tuple. ties on the
+    leading columns are broken by the following ones instead of by an
+    OFFSET into the tied rows, pages are fetched with a
+    `WHERE ... ORDER BY ... LIMIT` and rows inserted while a client is
+    paging do not shift the pages
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        """use the ordering already applied by the viewset's get_queryset,
+        with the primary key last so that every position is unique"""
+        if queryset.query.order_by:
+            ordering = tuple(queryset.query.order_by)
+        else:
+            ordering = super().get_ordering(request, queryset, view)
+        pk = queryset.model._meta.pk.attname
+        if not {field.lstrip('-') for field in ordering} & {pk, 'pk'}:
+            ordering += (pk,)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            _, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(
+                *pagination._reverse_ordering(self.ordering)
+            )
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            try:
+                # the values are converted by their fields here, before
+                # the queryset runs
+                queryset = queryset.filter(
+                    self.after_position(current_position, reverse)
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # one extra row tells whether a page follows this one
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after_position(self, position, reverse):
+        """the condition `(a, b, id) > (x, y, z)` in the ordering direction
+        of every column, as `a > x OR (a = x AND b > y) OR ...`"""
+        values = json.loads(position)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValueError('the cursor does not match the ordering')
+
+        conditions = []
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            field = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            conditions.append(equal & Q(**{f'{field}__{lookup}': value}))
+            equal &= Q(**{field: value})
+        return reduce(or_, conditions)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = (self._get_position_from_instance(self.page[-1],
+                                                     self.ordering)
+                    if self.page else self.next_position)
+        return self.encode_cursor(
+            pagination.Cursor(offset=0, reverse=False, position=position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = (self._get_position_from_instance(self.page[0],
+                                                     self.ordering)
+                    if self.page else self.previous_position)
+        return self.encode_cursor(
+            pagination.Cursor(offset=0, reverse=True, position=position)
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(instance[field])
+            else:
+                values.append(getattr(instance, field))
+        return json.dumps(values, default=str, separators=(',', ':'))
@@ -0,0 +1,325 @@
+"""per-user inverted ingredient index for "what can I cook?"
+
+`PantryIndex` keeps, for one user, a bitmap of recipes per ingredient (a
+Python int with bit n set for the recipe at position n), so matching a
+pantry is a handful of bitwise operations per ingredient rather than
+joins on the through table: the bitmaps of the ingredients the user does
+not have are added up in k + 1 saturating bit planes, which give the
+recipes missing 0, 1, ... k ingredients.
+
+indexes are built on first use, kept in an in-process LRU and updated
+incrementally by the signal receivers below once the change commits.
+every committed change also increments the user's index version in the
+response cache: a process that sees a version other than the one its
+index was built or updated at, because another process made the change,
+rebuilds the index. writes that skip signals (bulk_create) call
+`index_changed` to force that rebuild. the version only reaches the other
+processes through a shared cache, a system check rejects process-local
+backends outside DEBUG
+"""
+import threading
+from collections import OrderedDict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe
+from core.sharding import is_sharded
+from recipe.cache import initial_version, response_cache
+
+MAX_MISSING = 5
+VERSION_KEY = 'recipe-api:pantry:{}'
+
+
+def get_version(user_id):
+    """the version of the user's ingredient links, set on first use"""
+    cache = response_cache()
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    """increment the version, return the new one or None if it was lost"""
+    cache = response_cache()
+    key = VERSION_KEY.format(user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial_version(), timeout=None)
+        return None
+
+
+def _bits(bitmap):
+    """positions of the set bits, lowest first"""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+class PantryIndex:
+    """ingredient to recipe bitmaps of one user's recipes"""
+
+    def __init__(self, version):
+        self.version = version
+        self.lock = threading.Lock()
+        self.recipe_ids = []
+        self.positions = {}
+        self.ingredients = []
+        self.alive = 0
+        self.bitmaps = {}
+        self.names = {}
+
+    def add_recipe(self, recipe_id):
+        position = self.positions.get(recipe_id)
+        if position is None:
+            # positions are not reused, deleted ones are cleared from alive
+            position = self.positions[recipe_id] = len(self.recipe_ids)
+            self.recipe_ids.append(recipe_id)
+            self.ingredients.append(set())
+            self.alive |= 1 << position
+        return position
+
+    def remove_recipe(self, recipe_id):
+        position = self.positions.pop(recipe_id, None)
+        if position is not None:
+            self.unlink(recipe_id, list(self.ingredients[position]),
+                        position)
+            self.alive &= ~(1 << position)
+
+    def link(self, recipe_id, ingredient_ids):
+        position = self.add_recipe(recipe_id)
+        bit = 1 << position
+        for ingredient_id in ingredient_ids:
+            self.bitmaps[ingredient_id] = \
+                self.bitmaps.get(ingredient_id, 0) | bit
+            self.ingredients[position].add(ingredient_id)
+
+    def unlink(self, recipe_id, ingredient_ids, position=None):
+        if position is None:
+            position = self.positions.get(recipe_id)
+            if position is None:
+                return
+        mask = ~(1 << position)
+        for ingredient_id in ingredient_ids:
+            bitmap = self.bitmaps.get(ingredient_id, 0) & mask
+            if bitmap:
+                self.bitmaps[ingredient_id] = bitmap
+            else:
+                self.bitmaps.pop(ingredient_id, None)
+            self.ingredients[position].discard(ingredient_id)
+
+    def name_ingredient(self, ingredient_id, name):
+        self.forget_name(ingredient_id)
+        self.names.setdefault(name.lower(), set()).add(ingredient_id)
+
+    def forget_name(self, ingredient_id):
+        for name, ids in list(self.names.items()):
+            ids.discard(ingredient_id)
+            if not ids:
+                del self.names[name]
+
+    def remove_ingredient(self, ingredient_id):
+        self.forget_name(ingredient_id)
+        for position in _bits(self.bitmaps.pop(ingredient_id, 0)):
+            self.ingredients[position].discard(ingredient_id)
+
+    def resolve(self, ingredient_ids=(), names=()):
+        """the ids of the given ingredient ids and names, case insensitive"""
+        on_hand = set(ingredient_ids)
+        for name in names:
+            on_hand |= self.names.get(name.lower(), set())
+        return on_hand
+
+    def match(self, on_hand, max_missing=0, limit=None):
+        """[(recipe id, missing ingredient ids)] of the recipes missing at
+        most max_missing of their ingredients, fewest missing first"""
+        # planes[j] holds the recipes missing more than j ingredients
+        planes = [0] * (max_missing + 1)
+        for ingredient_id, bitmap in self.bitmaps.items():
+            if ingredient_id in on_hand:
+                continue
+            for j in range(max_missing, 0, -1):
+                planes[j] |= planes[j - 1] & bitmap
+            planes[0] |= bitmap
+
+        matches = []
+        fewer = self.alive
+        for plane in planes:
+            found = sorted(self.recipe_ids[position]
+                           for position in _bits(fewer & ~plane))
+            for recipe_id in found:
+                position = self.positions[recipe_id]
+                matches.append((recipe_id, sorted(
+                    self.ingredients[position] - on_hand
+                )))
+                if limit is not None and len(matches) >= limit:
+                    return matches
+            fewer &= plane
+        return matches
+
+
+def build_index(user, version):
+    """read the user's recipes and ingredient links into a new index
+
+    from the user's primary database, an index built from a lagging
+    replica would stay behind until the user's next change
+    """
+    alias = user.shard if is_sharded() else DEFAULT_DB_ALIAS
+    index = PantryIndex(version)
+    rows = Recipe.objects.using(alias).filter(user=user).order_by(
+        'id'
+    ).values_list('id', 'ingredients')
+    for recipe_id, ingredient_id in rows:
+        index.link(recipe_id,
+                   () if ingredient_id is None else (ingredient_id,))
+    for ingredient_id, name in Ingredient.objects.using(alias).filter(
+            user=user).values_list('id', 'name'):
+        index.name_ingredient(ingredient_id, name)
+    return index
+
+
+class PantryIndexes:
+    """in-process LRU of the indexes of the most recently used users"""
+    max_size = 1000
+
+    def __init__(self):
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_local(self, user_id):
+        with self._lock:
+            return self._indexes.get(user_id)
+
+    def get(self, user):
+        """the user's index, rebuilt when another process changed it"""
+        # read before the database, a change committed in between only
+        # makes the next call rebuild again
+        version = get_version(user.pk)
+        with self._lock:
+            index = self._indexes.get(user.pk)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(user.pk)
+                return index
+        index = build_index(user, version)
+        with self._lock:
+            self._indexes[user.pk] = index
+            self._indexes.move_to_end(user.pk)
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def drop(self, user_id):
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+indexes = PantryIndexes()
+
+
+def index_changed(user_id, using=None, update=None):
+    """once the transaction commits, bump the user's version and apply
+    update(index) to this process' index if it was current, else drop it
+    """
+    def commit():
+        version = bump_version(user_id)
+        index = indexes.get_local(user_id)
+        if index is None:
+            return
+        with index.lock:
+            if update is not None and version is not None and \
+                    index.version == version - 1:
+                update(index)
+                index.version = version
+                return
+        indexes.drop(user_id)
+
+    transaction.on_commit(commit, using=using)
+
+
+def what_can_i_cook(user, ingredient_ids=(), names=(), max_missing=0,
+                    limit=None):
+    """match the pantry against the user's recipes, see PantryIndex.match"""
+    index = indexes.get(user)
+    with index.lock:
+        return index.match(index.resolve(ingredient_ids, names),
+                           max_missing, limit)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, instance, action, reverse, pk_set,
+                               using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    pk_set = set(pk_set or ())
+    if reverse:
+        # ingredient.recipe_set.add(...) and friends
+        ingredient_id = instance.pk
+        if action == 'post_add':
+            def update(index):
+                for recipe_id in pk_set:
+                    index.link(recipe_id, (ingredient_id,))
+        elif action == 'post_remove':
+            def update(index):
+                for recipe_id in pk_set:
+                    index.unlink(recipe_id, (ingredient_id,))
+        else:
+            name = instance.name
+
+            def update(index):
+                index.remove_ingredient(ingredient_id)
+                index.name_ingredient(ingredient_id, name)
+    else:
+        recipe_id = instance.pk
+        if action == 'post_add':
+            def update(index):
+                index.link(recipe_id, pk_set)
+        elif action == 'post_remove':
+            def update(index):
+                index.unlink(recipe_id, pk_set)
+        else:
+            def update(index):
+                position = index.positions.get(recipe_id)
+                if position is not None:
+                    index.unlink(recipe_id,
+                                 list(index.ingredients[position]))
+    index_changed(instance.user_id, using, update)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, using, **kwargs):
+    if created:
+        recipe_id = instance.pk
+        index_changed(instance.user_id, using,
+                      lambda index: index.add_recipe(recipe_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, using, **kwargs):
+    recipe_id = instance.pk
+    index_changed(instance.user_id, using,
+                  lambda index: index.remove_recipe(recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, using, **kwargs):
+    ingredient_id, name = instance.pk, instance.name
+    index_changed(instance.user_id, using,
+                  lambda index: index.name_ingredient(ingredient_id, name))
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, using, **kwargs):
+    # the through rows go with it, without m2m_changed
+    ingredient_id = instance.pk
+    index_changed(instance.user_id, using,
+                  lambda index: index.remove_ingredient(ingredient_id))
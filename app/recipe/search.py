@@ -0,0 +1,30 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+
+from core.models import Recipe
+
+SEARCH_CONFIG = 'english'
+
+
+def search_recipes(queryset, text):
+    """filter and rank the queryset by the search text
+
+    on postgres this matches the stored, trigger maintained search vector
+    through its GIN index, other backends fall back to requiring every term
+    to appear in the title or the name of a tag or ingredient
+    """
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', 'id')
+
+    for term in text.split():
+        matches = Recipe.objects.filter(
+            Q(title__icontains=term)
+            | Q(tags__name__icontains=term)
+            | Q(ingredients__name__icontains=term)
+        ).values('pk')
+        queryset = queryset.filter(pk__in=matches)
+    return queryset.order_by('id')
@@ -1,32 +1,98 @@
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections, transaction
+from django.db.models import OuterRef
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from rest_framework.settings import api_settings
+from core.counters import (
+    RELATIONS, add_recipe_counts, remove_recipe_counts,
+)
+from core.metrics import MeasuredSerializerMixin
 from core.models import Tag, Ingredient, Recipe
+from recipe.similarity import delete_signatures
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """ serializer for tag object """
 
     class Meta:
         model = Tag
-        fields = ['id', 'name']
-        read_only_fields = ('id',)
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ('id', 'recipe_count')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(MeasuredSerializerMixin,
+                           serializers.ModelSerializer):
     """serializer for ingredient"""
 
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """many related field that resolves all submitted pks in one query"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            # to_python would take True as pk 1, PrimaryKeyRelatedField
+            # rejects booleans
+            if isinstance(item, bool):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+            try:
+                pks.append(pk_field.to_python(item))
+            except (TypeError, ValueError, DjangoValidationError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+        pks = list(dict.fromkeys(pks))
+
+        found = queryset.in_bulk(pks) if pks else {}
+        missing = [pk for pk in pks if pk not in found]
+        if missing:
+            raise serializers.ValidationError([
+                child.error_messages['does_not_exist'].format(pk_value=pk)
+                for pk in missing
+            ], code='does_not_exist')
+        return [found[pk] for pk in pks]
+
+
+class UserOwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """primary key field limited to objects owned by the requesting user"""
 
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
 
-class RecipeSerializer(serializers.ModelSerializer):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None:
+            return queryset
+        return queryset.filter(user=request.user)
+
+
+class RecipeSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """serialiser for recipe"""
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserOwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all())
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserOwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -43,3 +109,299 @@ class RecipeDetailSerializer(RecipeSerializer):
     ingredients = IngredientSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
 
+
+# value key holding the ids of each relation in a recipe_rows dict
+ROW_ID_KEYS = {'ingredients': 'ingredient_ids', 'tags': 'tag_ids'}
+
+
+def _id_column(field):
+    return getattr(Recipe, field).field.m2m_reverse_name()
+
+
+def recipe_rows(queryset):
+    """the recipe queryset as dicts for RecipeListSerializer
+
+    on postgres the ids of the tags and ingredients are read in the same
+    query as arrays, elsewhere the list serializer adds them per page
+    """
+    queryset = queryset.prefetch_related(None).values(
+        'id', 'title', 'price', 'time_minutes', 'link'
+    )
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset
+    return queryset.annotate(**{
+        key: ArraySubquery(
+            getattr(Recipe, field).through.objects.filter(
+                recipe_id=OuterRef('pk')
+            ).order_by(_id_column(field)).values(_id_column(field))
+        )
+        for field, key in ROW_ID_KEYS.items()
+    })
+
+
+def add_related_ids(rows):
+    """set the tag and ingredient id lists of rows read without them"""
+    recipe_ids = [row['id'] for row in rows]
+    for field, key in ROW_ID_KEYS.items():
+        column = _id_column(field)
+        related = {}
+        for recipe_id, pk in getattr(Recipe, field).through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by(column).values_list('recipe_id', column):
+            related.setdefault(recipe_id, []).append(pk)
+        for row in rows:
+            row[key] = related.get(row['id'], [])
+
+
+class RecipeRowListSerializer(MeasuredSerializerMixin,
+                              serializers.ListSerializer):
+    """serialize a page of recipe_rows, reading their ids where missing"""
+
+    def to_representation(self, data):
+        rows = list(data)
+        if rows and ROW_ID_KEYS['tags'] not in rows[0]:
+            add_related_ids(rows)
+        return super().to_representation(rows)
+
+
+class RecipeListSerializer(serializers.BaseSerializer):
+    """read only serializer for recipe_rows, with the output of
+    RecipeSerializer
+
+    the list endpoint skips building model instances and a field object
+    per relation, each row is turned into the same keys, in the same order
+    and with the same price formatting as RecipeSerializer gives
+    """
+    price = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        list_serializer_class = RecipeRowListSerializer
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'price': self.price.to_representation(row['price']),
+            'time_minutes': row['time_minutes'],
+            'ingredients': row['ingredient_ids'],
+            'tags': row['tag_ids'],
+            'link': row['link'],
+        }
+
+
+def validate_bulk_list(data, max_items, expected):
+    """the checks on the payload of a bulk endpoint as a whole"""
+    if not isinstance(data, list):
+        raise serializers.ValidationError({
+            api_settings.NON_FIELD_ERRORS_KEY: [expected]
+        }, code='not_a_list')
+    if not data:
+        raise serializers.ValidationError({
+            api_settings.NON_FIELD_ERRORS_KEY: [
+                _('This list may not be empty.')
+            ]
+        }, code='empty')
+    if len(data) > max_items:
+        raise serializers.ValidationError({
+            api_settings.NON_FIELD_ERRORS_KEY: [
+                _('Ensure this list has at most {max} recipes.').format(
+                    max=max_items)
+            ]
+        }, code='max_length')
+
+
+def does_not_exist(pk):
+    return _('Invalid pk "{pk_value}" - object does not exist.').format(
+        pk_value=pk
+    )
+
+
+def link_recipes(model, links, using):
+    """bulk insert the through rows of [(recipe id, [pks])] and count them"""
+    through = getattr(Recipe, RELATIONS[model]).through
+    column = model._meta.model_name + '_id'
+    rows = through.objects.using(using).bulk_create([
+        through(recipe_id=recipe_id, **{column: pk})
+        for recipe_id, pks in links
+        for pk in pks
+    ])
+    add_recipe_counts(model, [getattr(row, column) for row in rows], using)
+
+
+def unlink_recipes(model, recipe_ids, using):
+    """delete the through rows of the recipes in one query and uncount
+    them"""
+    remove_recipe_counts(model, recipe_ids, using)
+    getattr(Recipe, RELATIONS[model]).through.objects.using(using).filter(
+        recipe_id__in=recipe_ids
+    ).delete()
+
+
+class RecipeBulkListSerializer(serializers.ListSerializer):
+    """validate and create or update a batch of recipes in a fixed number
+    of queries
+
+    to update, pass the queryset of the recipes that may be changed as the
+    instance, every item then needs the id of one of them. a partial update
+    only replaces the tags or ingredients of the items that list them
+    """
+    related_models = {'tags': Tag, 'ingredients': Ingredient}
+    max_items = 5000
+
+    def to_internal_value(self, data):
+        """validate every item and resolve all related ids in one pass"""
+        validate_bulk_list(data, self.max_items,
+                           _('Expected a list of recipes.'))
+
+        items, errors = [], []
+        for item in data:
+            try:
+                items.append(self.child.run_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                items.append(None)
+                errors.append(exc.detail)
+
+        if self.instance is not None:
+            self.resolve_recipes(data, items, errors)
+
+        user = self.context['request'].user
+        for name, model in self.related_models.items():
+            wanted = {pk for item in items if item
+                      for pk in item.get(name, ())}
+            found = set(model.objects.filter(
+                user=user, pk__in=wanted
+            ).values_list('pk', flat=True)) if wanted else set()
+            for item, error in zip(items, errors):
+                missing = [pk for pk in item.get(name, ())
+                           if pk not in found] if item else []
+                if missing:
+                    error[name] = [does_not_exist(pk) for pk in missing]
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def resolve_recipes(self, data, items, errors):
+        """add the recipe each item updates to it as 'recipe', in one
+        query"""
+        ids = [raw.get('id') if isinstance(raw, dict) else None
+               for raw in data]
+        wanted = {pk for pk in ids
+                  if isinstance(pk, int) and not isinstance(pk, bool)}
+        recipes = self.instance.in_bulk(wanted) if wanted else {}
+        seen = set()
+        for pk, item, error in zip(ids, items, errors):
+            if pk not in wanted:
+                error['id'] = [_('A valid recipe id is required.')]
+            elif pk not in recipes:
+                error['id'] = [does_not_exist(pk)]
+            elif pk in seen:
+                error['id'] = [_('This recipe is updated more than once.')]
+            elif item is not None:
+                item['recipe'] = recipes[pk]
+            seen.add(pk)
+
+    def create(self, validated_data):
+        """bulk insert the recipes and their tag and ingredient links"""
+        related = [
+            {name: list(dict.fromkeys(attrs.pop(name)))
+             for name in self.related_models}
+            for attrs in validated_data
+        ]
+        user = self.context['request'].user
+        with transaction.atomic(using=user.shard):
+            recipes = Recipe.objects.using(user.shard).bulk_create(
+                [Recipe(**attrs) for attrs in validated_data]
+            )
+            for name, model in self.related_models.items():
+                link_recipes(model, [
+                    (recipe.pk, links[name])
+                    for recipe, links in zip(recipes, related)
+                ], user.shard)
+        return recipes
+
+    def update(self, instance, validated_data):
+        """bulk update the recipes, and replace the links of the relations
+        the items list with one delete and one bulk insert per relation"""
+        recipes, fields = [], set()
+        related = {name: [] for name in self.related_models}
+        for attrs in validated_data:
+            recipe = attrs.pop('recipe')
+            for name in self.related_models:
+                if name in attrs:
+                    related[name].append(
+                        (recipe.pk, list(dict.fromkeys(attrs.pop(name))))
+                    )
+            for field, value in attrs.items():
+                setattr(recipe, field, value)
+            fields.update(attrs)
+            recipes.append(recipe)
+
+        user = self.context['request'].user
+        with transaction.atomic(using=user.shard):
+            if fields:
+                Recipe.objects.using(user.shard).bulk_update(
+                    recipes, sorted(fields)
+                )
+            for name, model in self.related_models.items():
+                if related[name]:
+                    unlink_recipes(model, [pk for pk, _ in related[name]],
+                                   user.shard)
+                    link_recipes(model, related[name], user.shard)
+        return recipes
+
+
+class RecipeBulkDeleteSerializer(serializers.ListSerializer):
+    """validate the ids of a batch of recipes to delete, all of them
+    recipes of the requesting user, and delete them in a fixed number of
+    queries"""
+    child = serializers.IntegerField()
+    max_items = RecipeBulkListSerializer.max_items
+
+    def to_internal_value(self, data):
+        validate_bulk_list(data, self.max_items,
+                           _('Expected a list of recipe ids.'))
+        ids = super().to_internal_value(data)
+
+        user = self.context['request'].user
+        found = set(Recipe.objects.filter(
+            user=user, pk__in=ids
+        ).values_list('pk', flat=True))
+        errors = [[does_not_exist(pk)] if pk not in found else []
+                  for pk in ids]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return list(dict.fromkeys(ids))
+
+    def delete(self):
+        """delete the recipes with their links, signatures and bands,
+        without the per recipe signals of a queryset delete"""
+        ids = self.validated_data
+        using = self.context['request'].user.shard
+        with transaction.atomic(using=using):
+            for model in RecipeBulkListSerializer.related_models.values():
+                unlink_recipes(model, ids, using)
+            delete_signatures(ids, using)
+            # nothing else refers to the recipes, _raw_delete skips the
+            # collector, which would fetch them and send the signals of
+            # every recipe
+            Recipe.objects.filter(pk__in=ids)._raw_delete(using)
+        return ids
+
+
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """serializer for one item of a bulk recipe upload"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'title', 'price', 'time_minutes',
+                  'ingredients', 'tags', 'link')
+        read_only_fields = ('id',)
+        list_serializer_class = RecipeBulkListSerializer
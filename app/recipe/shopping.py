@@ -0,0 +1,28 @@
+"""merged ingredient lists of many recipes
+
+`shopping_list` answers with one GROUP BY over the recipe to ingredient
+through table, instead of serializing every recipe with its ingredients
+and merging them
+"""
+from django.db.models import Count
+
+from core.models import Recipe
+
+MAX_RECIPES = 100
+
+
+def shopping_list(user, recipe_ids):
+    """the ingredients used by the user's recipes among recipe_ids, each
+    once with the number of those recipes using it, ordered by name"""
+    through = Recipe.ingredients.through
+    rows = through.objects.filter(
+        recipe__user=user, recipe_id__in=recipe_ids
+    ).values('ingredient_id', 'ingredient__name').annotate(
+        recipe_count=Count('recipe_id')
+    ).order_by('ingredient__name', 'ingredient_id')
+    return [
+        {'id': ingredient_id, 'name': name, 'recipe_count': count}
+        for ingredient_id, name, count in rows.values_list(
+            'ingredient_id', 'ingredient__name', 'recipe_count'
+        )
+    ]
@@ -0,0 +1,297 @@
+"""similar recipes by the jaccard overlap of their ingredients and tags
+
+comparing a recipe with every other recipe of the user is quadratic over
+the collection, so every recipe keeps a MinHash signature instead: for
+each of PERMUTATIONS hash functions, the minimum hash of the recipe's
+ingredient and tag ids. two signatures agree at a position with the
+probability of the jaccard similarity of their sets, so the share of
+agreeing positions estimates it. the signature is cut into BANDS bands
+whose hashes are stored as `RecipeBand` keys; the recipes sharing a key
+with the one looked up are the candidates, shortlisted by their
+signatures and ranked by their exact similarity.
+
+with 64 permutations in 32 bands of 2 rows, a recipe with a similarity of
+0.3 is a candidate with probability 1 - (1 - 0.3 ** 2) ** 32 = 0.95, and
+one of 0.1 with 0.27. the signatures have to be rebuilt with
+`rebuild_recipe_signatures` after changing the setting
+
+signatures follow the m2m changes once they commit, the bulk inserts and
+updates call `signatures_changed` themselves and the bulk delete
+`delete_signatures`. the rebuild command computes them in batches,
+vectorized with NumPy when it is installed
+"""
+import hashlib
+import heapq
+import random
+import struct
+import threading
+from functools import lru_cache
+from itertools import chain
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from core.models import (
+    Ingredient, Recipe, RecipeBand, RecipeSignature, Tag,
+)
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+DEFAULTS = {
+    'PERMUTATIONS': 64,
+    'BANDS': 32,
+    'SEED': 0,
+    'SHORTLIST': 8,
+    'BATCH_SIZE': 1000,
+}
+# largest prime below 2 ** 32, the hashes fit 4 bytes and a * x + b fits
+# an unsigned 64 bit integer for NumPy
+PRIME = 4294967291
+# the token kinds, ingredient 3 and tag 3 must not hash alike
+RELATIONS = (('ingredients', 0), ('tags', 1))
+
+_pending = threading.local()
+
+
+def get_setting(name):
+    """read a value from the RECIPE_SIMILARITY setting"""
+    return getattr(settings, 'RECIPE_SIMILARITY', {}).get(name,
+                                                          DEFAULTS[name])
+
+
+@lru_cache(maxsize=None)
+def _coefficients(count, seed):
+    rnd = random.Random(seed)
+    return ([rnd.randrange(1, PRIME) for _ in range(count)],
+            [rnd.randrange(0, PRIME) for _ in range(count)])
+
+
+def coefficients():
+    """the (a, b) of the hash functions h(x) = (a * x + b) % PRIME"""
+    return _coefficients(get_setting('PERMUTATIONS'), get_setting('SEED'))
+
+
+def token(pk, kind):
+    return (pk * 2 + kind) % PRIME
+
+
+def minhash(tokens):
+    """the packed signature of a set of tokens, None when it is empty"""
+    if not tokens:
+        return None
+    signature = [min((a * x + b) % PRIME for x in tokens)
+                 for a, b in zip(*coefficients())]
+    return struct.pack(f'<{len(signature)}I', *signature)
+
+
+def minhash_many(tokens):
+    """{recipe id: packed signature or None} of {recipe id: tokens},
+    computed for the whole batch at once when NumPy is installed"""
+    if numpy is None:
+        return {pk: minhash(values) for pk, values in tokens.items()}
+    signed = [pk for pk, values in tokens.items() if values]
+    signatures = dict.fromkeys(tokens)
+    if not signed:
+        return signatures
+    a, b = (numpy.array(values, dtype=numpy.uint64)
+            for values in coefficients())
+    flat = numpy.fromiter(chain.from_iterable(tokens[pk] for pk in signed),
+                          dtype=numpy.uint64)
+    counts = numpy.fromiter((len(tokens[pk]) for pk in signed),
+                            dtype=numpy.int64, count=len(signed))
+    starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+    # one row of hashes per token, the minimum over the rows of a recipe
+    hashed = (flat[:, None] * a + b) % numpy.uint64(PRIME)
+    mins = numpy.minimum.reduceat(hashed, starts, axis=0).astype('<u4')
+    signatures.update(zip(signed, (row.tobytes() for row in mins)))
+    return signatures
+
+
+def band_keys(signature):
+    """the bucket of every band of a packed signature, as signed 64 bit
+    integers"""
+    bands = get_setting('BANDS')
+    size = len(signature) // bands
+    return [
+        int.from_bytes(hashlib.blake2b(
+            band.to_bytes(2, 'little') + signature[band * size:
+                                                   (band + 1) * size],
+            digest_size=8,
+        ).digest(), 'little', signed=True)
+        for band in range(bands)
+    ]
+
+
+def estimate(first, second):
+    """the share of agreeing positions of two packed signatures"""
+    count = len(first) // 4
+    matched = sum(x == y for x, y in zip(struct.unpack(f'<{count}I', first),
+                                         struct.unpack(f'<{count}I', second)))
+    return matched / count
+
+
+def read_links(recipe_ids, using):
+    """{recipe id: [tokens]} of the ingredients and tags of the recipes"""
+    tokens = {pk: [] for pk in recipe_ids}
+    for field, kind in RELATIONS:
+        through = getattr(Recipe, field).through
+        column = getattr(Recipe, field).field.m2m_reverse_name()
+        rows = through.objects.using(using).filter(
+            recipe_id__in=list(tokens)
+        ).values_list('recipe_id', column)
+        for recipe_id, pk in rows:
+            tokens[recipe_id].append(token(pk, kind))
+    return tokens
+
+
+def read_tokens(recipes, using):
+    """the owners and the ingredient and tag tokens of the recipes, as
+    ({recipe id: user id}, {recipe id: [tokens]})"""
+    users = dict(recipes.using(using).values_list('pk', 'user_id'))
+    return users, read_links(users, using)
+
+
+def jaccard(first, second):
+    first, second = set(first), set(second)
+    return len(first & second) / len(first | second) if first else 0.0
+
+
+def save_signatures(users, signatures, using):
+    """replace the stored signatures and bands of the recipes"""
+    with transaction.atomic(using=using):
+        RecipeBand.objects.using(using).filter(
+            recipe_id__in=list(signatures)
+        ).delete()
+        RecipeSignature.objects.using(using).filter(
+            recipe_id__in=list(signatures)
+        ).delete()
+        signed = [(pk, signature) for pk, signature in signatures.items()
+                  if signature is not None]
+        RecipeSignature.objects.using(using).bulk_create([
+            RecipeSignature(recipe_id=pk, user_id=users[pk],
+                            minhash=signature)
+            for pk, signature in signed
+        ])
+        RecipeBand.objects.using(using).bulk_create([
+            RecipeBand(recipe_id=pk, user_id=users[pk], key=key)
+            for pk, signature in signed
+            for key in set(band_keys(signature))
+        ], batch_size=get_setting('BATCH_SIZE'))
+
+
+def delete_signatures(recipe_ids, using):
+    """delete the signatures and bands of recipes that are deleted without
+    signals, before the recipes"""
+    RecipeBand.objects.using(using).filter(
+        recipe_id__in=recipe_ids
+    ).delete()
+    RecipeSignature.objects.using(using).filter(
+        recipe_id__in=recipe_ids
+    ).delete()
+
+
+def refresh_signatures(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """recompute the signatures of the recipes from their current links,
+    the ids of deleted recipes are skipped"""
+    users, tokens = read_tokens(
+        Recipe.objects.filter(pk__in=list(recipe_ids)), using
+    )
+    save_signatures(users, minhash_many(tokens), using)
+
+
+def rebuild_signatures(recipes, using, batch_size=None):
+    """recompute the signatures of every recipe of the queryset in batches,
+    return the number of recipes"""
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    ids = list(recipes.using(using).order_by('pk').values_list(
+        'pk', flat=True
+    ))
+    for start in range(0, len(ids), batch_size):
+        users, tokens = read_tokens(
+            Recipe.objects.filter(pk__in=ids[start:start + batch_size]),
+            using,
+        )
+        save_signatures(users, minhash_many(tokens), using)
+    return len(ids)
+
+
+def _flush(using):
+    pending = getattr(_pending, 'recipes', {}).pop(using, None)
+    if pending:
+        refresh_signatures(pending, using)
+
+
+def signatures_changed(recipe_ids, using=None):
+    """recompute the signatures of the recipes once the transaction commits
+
+    the recipes changed in one transaction are recomputed together, ids
+    left over by a rolled back transaction go with the next commit
+    """
+    using = using or DEFAULT_DB_ALIAS
+    if not hasattr(_pending, 'recipes'):
+        _pending.recipes = {}
+    _pending.recipes.setdefault(using, set()).update(recipe_ids)
+    transaction.on_commit(lambda: _flush(using), using=using)
+
+
+def similar_recipes(user, recipe_id, limit):
+    """[(recipe id, jaccard similarity)] of the user's recipes most
+    similar to the recipe, best first
+
+    the candidates sharing a band are shortlisted by their estimated
+    similarity, and the shortlist ranked by the exact one
+    """
+    signature = RecipeSignature.objects.filter(
+        user=user, recipe_id=recipe_id
+    ).values_list('minhash', flat=True).first()
+    if signature is None:
+        return []
+    signature = bytes(signature)
+    candidates = RecipeSignature.objects.filter(
+        user=user,
+        recipe_id__in=RecipeBand.objects.filter(
+            user=user, key__in=band_keys(signature)
+        ).values('recipe_id'),
+    ).exclude(recipe_id=recipe_id).values_list('recipe_id', 'minhash')
+    shortlist = heapq.nsmallest(
+        limit * get_setting('SHORTLIST'),
+        ((-estimate(signature, bytes(other)), pk)
+         for pk, other in candidates),
+    )
+    if not shortlist:
+        return []
+    tokens = read_links([recipe_id] + [pk for _, pk in shortlist],
+                        candidates.db)
+    mine = tokens.pop(recipe_id)
+    best = heapq.nsmallest(limit, (
+        (-jaccard(mine, values), pk) for pk, values in tokens.items()
+    ))
+    return [(pk, -score) for score, pk in best if score]
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_links_changed(sender, instance, action, reverse, pk_set, using,
+                         **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            signatures_changed([instance.pk], using)
+    elif action == 'pre_clear':
+        # the recipes are only known before they are unlinked
+        signatures_changed(instance.recipe_set.using(using).values_list(
+            'pk', flat=True), using)
+    elif action in ('post_add', 'post_remove'):
+        signatures_changed(pk_set, using)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, using, **kwargs):
+    # the through rows are deleted with it, without m2m_changed
+    signatures_changed(instance.recipe_set.using(using).values_list(
+        'pk', flat=True), using)
@@ -0,0 +1,158 @@
+from core.models import Recipe, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core.authentication import token_cache
+
+ASYNC_RECIPE_URL = reverse('recipe:async-recipe-list')
+ASYNC_TAG_URL = reverse('recipe:async-tag-list')
+ASYNC_INGREDIENT_URL = reverse('recipe:async-ingredient-list')
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+INGREDIENT_URL = reverse('recipe:ingredient-list')
+
+
+def async_detail_url(recipe_id):
+    """return an async recipe detail url"""
+    return reverse('recipe:async-recipe-detail', args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    """return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def sample_recipe(user, **params):
+    """create and return sample recipe"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class AsyncReadViewsTestCase(TestCase):
+    """test the async read endpoints against the viewsets"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_same_payload_as_viewsets(self):
+        """the async endpoints return what the viewsets return"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=other, name='Dessert')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = sample_recipe(self.user, title='Soup')
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+        sample_recipe(self.user, title='Stew', price=12)
+        sample_recipe(other)
+
+        pairs = (
+            (ASYNC_RECIPE_URL, RECIPE_URL),
+            (ASYNC_RECIPE_URL + '?price_min=10', RECIPE_URL + '?price_min=10'),
+            (ASYNC_TAG_URL, TAG_URL),
+            (ASYNC_INGREDIENT_URL, INGREDIENT_URL),
+            (async_detail_url(recipe.id), detail_url(recipe.id)),
+        )
+        for async_url, url in pairs:
+            async_res = self.client.get(async_url)
+            res = self.client.get(url)
+            self.assertEqual(async_res.status_code, status.HTTP_200_OK)
+            self.assertEqual(async_res['Content-Type'], 'application/json')
+            self.assertEqual(async_res.json(), res.json())
+
+    def test_next_page_follows_cursor(self):
+        """the next link of a page points at the async endpoint"""
+        for i in range(3):
+            sample_recipe(self.user, title=f'Recipe {i}')
+
+        res = self.client.get(ASYNC_RECIPE_URL, {'page_size': 2})
+        self.assertIn(ASYNC_RECIPE_URL, res.json()['next'])
+        res = self.client.get(res.json()['next'])
+
+        self.assertEqual(len(res.json()['results']), 1)
+        self.assertIsNone(res.json()['next'])
+
+    def test_cached_token_and_response_skip_database(self):
+        """a repeated request with a known token does not query"""
+        sample_recipe(self.user)
+        first = self.client.get(ASYNC_RECIPE_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(ASYNC_RECIPE_URL)
+
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_not_modified(self):
+        """a matching If-None-Match gets a 304 until the data changes"""
+        res = self.client.get(ASYNC_TAG_URL)
+
+        res = self.client.get(ASYNC_TAG_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.get(ASYNC_TAG_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['results'][0]['name'], 'Vegan')
+
+    def test_auth_required(self):
+        """requests without a valid token are rejected"""
+        self.client.credentials()
+        res = self.client.get(ASYNC_RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        res = self.client.get(ASYNC_RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_users_recipe_not_found(self):
+        """another user's recipe is a 404"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        recipe = sample_recipe(other)
+
+        res = self.client.get(async_detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_filter_bad_request(self):
+        """invalid filter values are a 400 like on the viewset"""
+        res = self.client.get(ASYNC_RECIPE_URL, {'price_min': 'cheap'})
+        sync_res = self.client.get(RECIPE_URL, {'price_min': 'cheap'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.json(), sync_res.json())
+
+    def test_read_only(self):
+        """the async endpoints only accept reads"""
+        res = self.client.post(ASYNC_TAG_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertFalse(Tag.objects.exists())
@@ -1,4 +1,4 @@
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -52,8 +52,8 @@ class PrivateIngredientApiTest(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
-        self.assertEqual(len(res.data), 2)
+        self.assertEqual(res.data['results'], serializer.data)
+        self.assertEqual(len(res.data['results']), 2)
 
     def test_ingredient_limited_to_authenticated_user(self):
         """ test that ingredient by authenticated user only will be listed"""
@@ -74,8 +74,8 @@ class PrivateIngredientApiTest(TestCase):
         res = self.client.get(INGREDIENT_URL)
         # ingredient = Ingredient.objects.filter(user=self.user).exists()
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(len(res.data['results']), 1)
 
     def test_creating_ingredient_valid_payload_success(self):
         """will create a new ingredient successfully with valid payload"""
@@ -96,3 +96,15 @@ class PrivateIngredientApiTest(TestCase):
         res = self.client.post(INGREDIENT_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_filter_assigned_only(self):
+        """assigned_only lists the ingredients used by a recipe"""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        Ingredient.objects.create(user=self.user, name='Sugar')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=10, price=5.00)
+        recipe.ingredients.add(salt)
+
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 'true'})
+
+        self.assertEqual([item['name'] for item in res.data['results']],
+                         ['Salt'])
@@ -0,0 +1,131 @@
+from unittest import mock
+
+from core.models import Recipe, Tag
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from recipe.pagination import RecipeCursorPagination
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+
+# one page query, plus one per relation on backends without id arrays
+LIST_QUERIES = 1 if connection.vendor == 'postgresql' else 3
+
+
+def sample_recipe(user, title='Sample Recipe'):
+    """create and return sample recipe"""
+    return Recipe.objects.create(user=user, title=title,
+                                 time_minutes=10, price=5.00)
+
+
+class CursorPaginationTestCase(TestCase):
+    """test the cursor pagination on the list endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def collect(self, url, page_size):
+        """follow the next links and return every page of results"""
+        pages = []
+        res = self.client.get(url, {'page_size': page_size})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.data['results'])
+            if not res.data['next']:
+                return pages
+            res = self.client.get(res.data['next'])
+
+    def test_recipes_paginated_by_id(self):
+        """recipe pages follow the id ordering of the viewset"""
+        recipes = [sample_recipe(self.user, f'recipe {i}') for i in range(5)]
+
+        pages = self.collect(RECIPE_URL, 2)
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        ids = [row['id'] for page in pages for row in page]
+        self.assertEqual(ids, [recipe.id for recipe in recipes])
+
+    def test_tags_paginated_by_name_desc(self):
+        """tag pages follow the descending name ordering of the viewset"""
+        for name in ('b', 'a', 'd', 'c', 'a'):
+            Tag.objects.create(user=self.user, name=name)
+
+        pages = self.collect(TAG_URL, 2)
+
+        names = [row['name'] for page in pages for row in page]
+        self.assertEqual(names, ['d', 'c', 'b', 'a', 'a'])
+
+    @mock.patch.object(RecipeCursorPagination, 'offset_cutoff', 1)
+    def test_tied_rows_paged_without_offset(self):
+        """runs of equal names longer than the offset cutoff are paged by
+        their ids and every tag is seen once"""
+        tags = [Tag.objects.create(user=self.user, name='same')
+                for _ in range(7)]
+
+        pages = self.collect(TAG_URL, 2)
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        ids = [row['id'] for page in pages for row in page]
+        self.assertEqual(ids, [tag.id for tag in reversed(tags)])
+
+    def test_previous_link(self):
+        """the previous link of a page returns the page before it"""
+        for name in ('a', 'b', 'b', 'b', 'c'):
+            Tag.objects.create(user=self.user, name=name)
+        first = self.client.get(TAG_URL, {'page_size': 2})
+        second = self.client.get(first.data['next'])
+
+        res = self.client.get(second.data['previous'])
+
+        self.assertEqual(res.data['results'], first.data['results'])
+        self.assertIsNone(res.data['previous'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('bad', 'cD1bMSwyXQ==', 'cD1bImEiXQ=='):
+            res = self.client.get(RECIPE_URL, {'cursor': cursor})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_stable_under_inserts(self):
+        """rows inserted before the cursor do not shift the next page"""
+        for i in range(4):
+            sample_recipe(self.user, f'recipe {i}')
+
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+        seen = [row['id'] for row in res.data['results']]
+        sample_recipe(self.user, 'inserted meanwhile')
+        res = self.client.get(res.data['next'])
+
+        ids = [row['id'] for row in res.data['results']]
+        self.assertEqual(len(ids), 2)
+        self.assertTrue(min(ids) > max(seen))
+
+    def test_page_size_capped(self):
+        """the page size query param cannot exceed the maximum"""
+        sample_recipe(self.user)
+        res = self.client.get(RECIPE_URL, {'page_size': 10 ** 6})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_no_offset_in_queries(self):
+        """fetching a later page does not issue an OFFSET scan"""
+        for i in range(6):
+            sample_recipe(self.user, f'recipe {i}')
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+
+        with self.assertNumQueries(LIST_QUERIES) as ctx:
+            self.client.get(res.data['next'])
+
+        for query in ctx.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'].upper())
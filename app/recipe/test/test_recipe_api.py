@@ -77,8 +77,8 @@ class PrivateRecipeTestCase(TestCase):
         serializer = RecipeSerializer(recipe, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_detail_view(self):
         """test viewing a recipe detail"""
@@ -153,3 +153,54 @@ class PrivateRecipeTestCase(TestCase):
         self.assertIn(ing1, ingredients)
         self.assertIn(ing2, ingredients)
         self.assertEqual(ingredients.count(), 2)
+
+    def test_create_recipe_with_foreign_tag_fails(self):
+        """test that a recipe cannot reference another user's tags"""
+        other = get_user_model().objects.create_user(
+            'testuser2@gmail.com',
+            'testpass'
+        )
+        tag = sample_tag(user=self.user)
+        foreign_tag = sample_tag(user=other, name='Not mine')
+        foreign_ingredient = sample_ingredient(user=other)
+
+        payload = {
+            'title': 'New Recipe',
+            'time_minutes': 5,
+            'price': 25,
+            'tags': [tag.id, foreign_tag.id, 9999],
+            'ingredients': [foreign_ingredient.id]
+        }
+        res = self.client.post(RECIPE_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertEqual(len(res.data['ingredients']), 1)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_invalid_tag_id(self):
+        """test that a non numeric tag id is rejected"""
+        payload = {
+            'title': 'New Recipe',
+            'time_minutes': 5,
+            'price': 25,
+            'tags': ['abc']
+        }
+        res = self.client.post(RECIPE_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_recipe_boolean_tag_id(self):
+        """test that a boolean is not taken as a tag id"""
+        sample_tag(user=self.user)
+        payload = {
+            'title': 'New Recipe',
+            'time_minutes': 5,
+            'price': 25,
+            'tags': [True]
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['tags'][0].code, 'incorrect_type')
+        self.assertFalse(Recipe.objects.exists())
@@ -0,0 +1,221 @@
+from core.models import Recipe, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def sample_payload(**params):
+    """return a valid recipe payload"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': '5.00'
+    }
+    defaults.update(params)
+    return defaults
+
+
+class PrivateRecipeBulkTestCase(TestCase):
+    """test the bulk recipe endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_requires_authentication(self):
+        """the bulk endpoint is not public"""
+        res = APIClient().post(BULK_URL, [sample_payload()], format='json')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_create_with_relations(self):
+        """create several recipes with their tags and ingredients"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+        ing1 = Ingredient.objects.create(user=self.user, name='salt')
+        ing2 = Ingredient.objects.create(user=self.user, name='rice')
+        payload = [
+            sample_payload(title='One', tags=[tag.id],
+                           ingredients=[ing1.id, ing2.id, ing1.id]),
+            sample_payload(title='Two'),
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['title'] for row in res.data], ['One', 'Two'])
+        one = Recipe.objects.get(user=self.user, title='One')
+        self.assertEqual(list(one.tags.all()), [tag])
+        self.assertEqual(set(one.ingredients.all()), {ing1, ing2})
+        self.assertEqual(sorted(res.data[0]['ingredients']),
+                         sorted([ing1.id, ing2.id]))
+
+    def test_bulk_query_count_is_constant(self):
+        """the number of queries does not grow with the batch size"""
+        tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                for i in range(5)]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ing {i}')
+            for i in range(5)
+        ]
+        payload = [
+            sample_payload(title=f'recipe {i}',
+                           tags=[tag.id for tag in tags],
+                           ingredients=[ing.id for ing in ingredients])
+            for i in range(50)
+        ]
+
+        with self.assertNumQueries(12):
+            res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 50)
+        self.assertEqual(
+            set(Tag.objects.values_list('recipe_count', flat=True)), {50}
+        )
+
+    def test_bulk_reports_errors_per_item(self):
+        """invalid items are reported by position and nothing is created"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        foreign_tag = Tag.objects.create(user=other, name='not mine')
+        payload = [
+            sample_payload(),
+            sample_payload(title=''),
+            sample_payload(tags=[foreign_tag.id]),
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertIn('tags', res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_rejects_non_list(self):
+        """the payload must be a list"""
+        res = self.client.post(BULK_URL, sample_payload(), format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PrivateRecipeBulkChangeTestCase(TestCase):
+    """test updating and deleting recipes through the bulk endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan, self.quick = (
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('vegan', 'quick')
+        )
+        self.salt = Ingredient.objects.create(user=self.user, name='salt')
+        res = self.client.post(BULK_URL, [
+            sample_payload(title=f'recipe {i}', tags=[self.vegan.id],
+                           ingredients=[self.salt.id])
+            for i in range(50)
+        ], format='json')
+        self.ids = [row['id'] for row in res.data]
+
+    def counts(self):
+        return {tag.name: tag.recipe_count for tag in Tag.objects.all()}
+
+    def test_bulk_partial_update(self):
+        """only the given fields and relations change"""
+        payload = [{'id': pk, 'title': f'new {i}', 'tags': [self.quick.id]}
+                   for i, pk in enumerate(self.ids)]
+
+        with self.assertNumQueries(12):
+            res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['title'], 'new 0')
+        self.assertEqual(res.data[0]['tags'], [self.quick.id])
+        self.assertEqual(res.data[0]['ingredients'], [self.salt.id])
+        self.assertEqual(self.counts(), {'vegan': 0, 'quick': 50})
+        self.assertEqual(
+            Ingredient.objects.get(pk=self.salt.pk).recipe_count, 50
+        )
+
+    def test_bulk_update_replaces(self):
+        """a full update needs every field and clears missing relations"""
+        payload = [sample_payload(id=self.ids[0], title='new')]
+
+        res = self.client.put(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe = Recipe.objects.get(pk=self.ids[0])
+        self.assertEqual(recipe.title, 'new')
+        self.assertFalse(recipe.tags.exists())
+        self.assertEqual(self.counts(), {'vegan': 49, 'quick': 0})
+
+        res = self.client.put(BULK_URL, [{'id': self.ids[0]}], format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('title', res.data[0])
+
+    def test_bulk_update_reports_ids(self):
+        """unknown, foreign and repeated ids are reported by position"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        foreign = Recipe.objects.create(user=other, title='not mine',
+                                        time_minutes=5, price=1)
+        payload = [{'id': pk, 'title': 'new'}
+                   for pk in (self.ids[0], foreign.id, None, self.ids[0])]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        for error in res.data[1:]:
+            self.assertIn('id', error)
+        self.assertFalse(Recipe.objects.filter(title='new').exists())
+
+    def test_bulk_delete(self):
+        """the recipes go with their links, in a fixed number of queries"""
+        with self.assertNumQueries(10):
+            res = self.client.delete(BULK_URL, self.ids[:40],
+                                     format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Recipe.objects.count(), 10)
+        self.assertEqual(self.counts(), {'vegan': 10, 'quick': 0})
+        self.assertEqual(
+            Ingredient.objects.get(pk=self.salt.pk).recipe_count, 10
+        )
+
+    def test_bulk_delete_only_own_recipes(self):
+        """an id of another user's recipe deletes nothing"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        foreign = Recipe.objects.create(user=other, title='not mine',
+                                        time_minutes=5, price=1)
+
+        res = self.client.delete(BULK_URL, [self.ids[0], foreign.id],
+                                 format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], [])
+        self.assertTrue(res.data[1])
+        self.assertEqual(Recipe.objects.count(), 51)
+
+    def test_bulk_delete_rejects_non_list(self):
+        res = self.client.delete(BULK_URL, {'id': self.ids[0]},
+                                 format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,222 @@
+from core.models import Recipe, Ingredient
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.urls import reverse
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from recipe import checks, pantry
+
+COOK_URL = reverse('recipe:recipe-what-can-i-cook')
+RECIPE_URL = reverse('recipe:recipe-list')
+# postgres reads the related ids in the row query
+LIST_QUERIES = 1 if connection.vendor == 'postgresql' else 3
+
+
+def sample_recipe(user, ingredients, **params):
+    """create and return sample recipe with the given ingredients"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class WhatCanICookTestCase(TestCase):
+    """test the what-can-i-cook endpoint"""
+
+    def setUp(self):
+        caches['default'].clear()
+        pantry.indexes.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.rice, self.tomato, self.beans, self.pepper = (
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Rice', 'Tomato', 'Beans', 'Pepper')
+        )
+        self.jollof = sample_recipe(self.user, [self.rice, self.tomato],
+                                    title='Jollof Rice')
+        self.moi = sample_recipe(self.user, [self.beans, self.pepper],
+                                 title='Moi Moi')
+        self.stew = sample_recipe(
+            self.user, [self.tomato, self.pepper, self.beans],
+            title='Stew'
+        )
+
+    def cook(self, **params):
+        """return the (title, missing ids) of the matched recipes"""
+        for name in ('ingredients', 'names'):
+            if name in params:
+                params[name] = ','.join(str(value)
+                                        for value in params[name])
+        res = self.client.get(COOK_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(match['recipe']['title'], match['missing'])
+                for match in res.data]
+
+    def test_recipes_fully_covered(self):
+        """only recipes with every ingredient at hand by default"""
+        at_hand = [self.rice.id, self.tomato.id, self.beans.id]
+
+        self.assertEqual(self.cook(ingredients=at_hand),
+                         [('Jollof Rice', [])])
+
+    def test_recipes_missing_ingredients(self):
+        """up to `missing` ingredients may lack, fewest first"""
+        at_hand = [self.tomato.id, self.beans.id]
+
+        self.assertEqual(self.cook(ingredients=at_hand, missing=2), [
+            ('Jollof Rice', [self.rice.id]),
+            ('Moi Moi', [self.pepper.id]),
+            ('Stew', [self.pepper.id]),
+        ])
+        self.assertEqual(self.cook(ingredients=[self.rice.id], missing=2), [
+            ('Jollof Rice', [self.tomato.id]),
+            ('Moi Moi', [self.beans.id, self.pepper.id]),
+        ])
+
+    def test_ingredients_by_name(self):
+        """names are matched case insensitively, together with ids"""
+        self.assertEqual(
+            self.cook(names=['rice', ' TOMATO', 'unknown']),
+            [('Jollof Rice', [])]
+        )
+        self.assertEqual(
+            self.cook(names=['beans'], ingredients=[self.pepper.id]),
+            [('Moi Moi', [])]
+        )
+
+    def test_limit(self):
+        """limit caps the matches, the best ones are kept"""
+        res = self.client.get(COOK_URL, {'ingredients': self.tomato.id,
+                                         'missing': 2, 'limit': 1})
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['recipe']['id'], self.jollof.id)
+        self.assertEqual(set(res.data[0]['recipe']),
+                         {'id', 'title', 'price', 'time_minutes',
+                          'ingredients', 'tags', 'link'})
+
+    def test_invalid_params(self):
+        """ingredients or names are required, missing is bounded"""
+        for params in ({}, {'ingredients': 'a'},
+                       {'names': 'rice', 'missing': pantry.MAX_MISSING + 1},
+                       {'names': 'rice', 'missing': 'many'}):
+            res = self.client.get(COOK_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipes_ignored(self):
+        """only the user's own recipes are matched"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        sample_recipe(other, [self.rice], title='Plain Rice')
+
+        self.assertEqual(self.cook(ingredients=[self.rice.id]), [])
+
+    def test_index_updated_in_place(self):
+        """changes are applied to the index once they commit"""
+        self.cook(names=['rice'])
+        index = pantry.indexes.get_local(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jollof.ingredients.remove(self.tomato)
+        with self.captureOnCommitCallbacks(execute=True):
+            onion = Ingredient.objects.create(user=self.user, name='Onion')
+            sample_recipe(self.user, [onion], title='Onion Soup')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.moi.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pepper.delete()
+
+        with self.assertNumQueries(LIST_QUERIES):
+            self.assertEqual(self.cook(names=['rice', 'onion']),
+                             [('Jollof Rice', []), ('Onion Soup', [])])
+        self.assertEqual(
+            self.cook(ingredients=[self.tomato.id, self.beans.id]),
+            [('Stew', [])]
+        )
+        self.assertIs(pantry.indexes.get_local(self.user.pk), index)
+
+    def test_index_updated_through_the_api(self):
+        """recipes saved through the api are matched"""
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(RECIPE_URL, {
+                'title': 'Fried Rice', 'time_minutes': 20, 'price': '4.00',
+                'tags': [], 'ingredients': [self.rice.id],
+            }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(self.cook(ingredients=[self.rice.id]),
+                         [('Fried Rice', [])])
+
+    def test_index_rebuilt_when_changed_elsewhere(self):
+        """a version bumped by another process rebuilds the index"""
+        self.cook(names=['rice'])
+        index = pantry.indexes.get_local(self.user.pk)
+        self.jollof.ingredients.remove(self.tomato)
+        pantry.bump_version(self.user.pk)
+
+        self.assertEqual(self.cook(names=['rice']), [('Jollof Rice', [])])
+        self.assertIsNot(pantry.indexes.get_local(self.user.pk), index)
+
+
+class PantryIndexTests(SimpleTestCase):
+
+    def test_match_counts_missing(self):
+        index = pantry.PantryIndex(version=1)
+        index.link(10, [1, 2, 3])
+        index.link(11, [1])
+        index.link(12, [4, 5])
+        index.add_recipe(13)
+
+        self.assertEqual(index.match({1}, max_missing=1),
+                         [(11, []), (13, [])])
+        self.assertEqual(index.match({1, 4}, max_missing=3),
+                         [(11, []), (13, []), (12, [5]), (10, [2, 3])])
+
+    def test_removed_recipe_not_matched(self):
+        index = pantry.PantryIndex(version=1)
+        index.link(10, [1])
+        index.remove_recipe(10)
+
+        self.assertEqual(index.match({1}), [])
+        self.assertEqual(index.bitmaps, {})
+
+
+@override_settings(DEBUG=False, TESTING=False)
+class PantryCacheCheckTests(SimpleTestCase):
+    """the index versions must live in a cache shared by the workers"""
+
+    def test_process_local_cache_rejected(self):
+        for backend in ('locmem.LocMemCache', 'dummy.DummyCache'):
+            caches = {'default': {
+                'BACKEND': f'django.core.cache.backends.{backend}',
+            }}
+            with override_settings(CACHES=caches):
+                errors = checks.check_response_cache(None)
+            self.assertEqual([error.id for error in errors], ['recipe.E001'])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379',
+    }})
+    def test_shared_cache_accepted(self):
+        self.assertEqual(checks.check_response_cache(None), [])
+
+    @override_settings(DEBUG=True)
+    def test_any_cache_in_debug(self):
+        self.assertEqual(checks.check_response_cache(None), [])
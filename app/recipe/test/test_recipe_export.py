@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+from unittest.mock import patch
+
+from core.models import Recipe, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def sample_recipe(user, **params):
+    """create and return sample recipe"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeExportTestCase(TestCase):
+    """test the streaming recipe export"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.recipe = sample_recipe(self.user, title='Jollof Rice')
+        self.tag = Tag.objects.create(user=self.user, name='Party')
+        self.ingredient = Ingredient.objects.create(user=self.user,
+                                                    name='Rice')
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+        sample_recipe(self.user, title='Toast')
+
+    def content(self, res):
+        """consume the streamed response body"""
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_requires_authentication(self):
+        """the export is not public"""
+        res = APIClient().get(EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_ndjson(self):
+        """every recipe is one json line with its relations"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        sample_recipe(other, title='Not mine')
+
+        res = self.client.get(EXPORT_URL)
+        rows = [json.loads(line) for line in self.content(res).splitlines()]
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([row['title'] for row in rows],
+                         ['Jollof Rice', 'Toast'])
+        self.assertEqual(rows[0]['price'], '5.00')
+        self.assertEqual(rows[0]['tags'],
+                         [{'id': self.tag.id, 'name': 'Party'}])
+        self.assertEqual(rows[0]['ingredients'],
+                         [{'id': self.ingredient.id, 'name': 'Rice'}])
+        self.assertEqual(rows[1]['tags'], [])
+
+    def test_export_csv(self):
+        """csv export has a header and joins relation names"""
+        res = self.client.get(EXPORT_URL, {'type': 'csv'})
+        rows = list(csv.DictReader(io.StringIO(self.content(res))))
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['title'], 'Jollof Rice')
+        self.assertEqual(rows[0]['tags'], 'Party')
+        self.assertEqual(rows[0]['ingredients'], 'Rice')
+
+    def test_export_in_chunks(self):
+        """relations are fetched once per chunk of recipes"""
+        for i in range(3):
+            sample_recipe(self.user, title=f'recipe {i}')
+
+        with patch('recipe.views.RecipeViewSet.export_chunk_size', 2):
+            res = self.client.get(EXPORT_URL)
+            with self.assertNumQueries(7):
+                lines = self.content(res).splitlines()
+
+        self.assertEqual(len(lines), 5)
+
+    def test_export_invalid_type(self):
+        """unknown export types are rejected"""
+        res = self.client.get(EXPORT_URL, {'type': 'xml'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
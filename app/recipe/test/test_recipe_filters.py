@@ -0,0 +1,115 @@
+from core.models import Recipe, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+# one page query, plus one per relation on backends without id arrays
+LIST_QUERIES = 1 if connection.vendor == 'postgresql' else 3
+
+
+def sample_recipe(user, **params):
+    """create and return sample recipe"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeFilterTestCase(TestCase):
+    """test filtering the recipe list with query params"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.vegan = Tag.objects.create(user=self.user, name='vegan')
+        self.quick = Tag.objects.create(user=self.user, name='quick')
+        self.rice = Ingredient.objects.create(user=self.user, name='rice')
+        self.beans = Ingredient.objects.create(user=self.user, name='beans')
+
+        self.jollof = sample_recipe(self.user, title='Jollof Rice',
+                                    price=10, time_minutes=60)
+        self.jollof.tags.add(self.vegan, self.quick)
+        self.jollof.ingredients.add(self.rice)
+        self.moi = sample_recipe(self.user, title='Moi Moi',
+                                 price=4, time_minutes=90)
+        self.moi.tags.add(self.vegan)
+        self.moi.ingredients.add(self.beans)
+        self.toast = sample_recipe(self.user, title='Toast',
+                                   price=1, time_minutes=5)
+
+    def titles(self, params):
+        """return the titles of the recipes listed with the params"""
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [row['title'] for row in res.data['results']]
+
+    def test_filter_tags_any(self):
+        """recipes with any of the tags are returned once"""
+        titles = self.titles({'tags': f'{self.vegan.id},{self.quick.id}'})
+        self.assertEqual(titles, ['Jollof Rice', 'Moi Moi'])
+
+    def test_filter_tags_all(self):
+        """only recipes with all of the tags are returned"""
+        titles = self.titles({
+            'tags': f'{self.vegan.id},{self.quick.id}',
+            'tags_match': 'all',
+        })
+        self.assertEqual(titles, ['Jollof Rice'])
+
+    def test_filter_ingredients(self):
+        """filter recipes by ingredient"""
+        titles = self.titles({'ingredients': f'{self.beans.id}'})
+        self.assertEqual(titles, ['Moi Moi'])
+
+    def test_filter_price_range(self):
+        """filter recipes by an inclusive price range"""
+        titles = self.titles({'price_min': '4', 'price_max': '10.00'})
+        self.assertEqual(titles, ['Jollof Rice', 'Moi Moi'])
+
+    def test_filter_time_range(self):
+        """filter recipes by preparation time"""
+        self.assertEqual(self.titles({'time_minutes_max': 60}),
+                         ['Jollof Rice', 'Toast'])
+        self.assertEqual(self.titles({'time_minutes_min': 61}), ['Moi Moi'])
+
+    def test_filter_title_prefix(self):
+        """filter recipes by the start of their title"""
+        self.assertEqual(self.titles({'title': 'Jol'}), ['Jollof Rice'])
+        self.assertEqual(self.titles({'title': 'Rice'}), [])
+
+    def test_filters_combine(self):
+        """several filters are applied together"""
+        titles = self.titles({'tags': f'{self.vegan.id}', 'price_max': 5})
+        self.assertEqual(titles, ['Moi Moi'])
+
+    def test_all_of_is_single_aggregate(self):
+        """all-of is one aggregated subquery rather than a join per tag"""
+        with self.assertNumQueries(LIST_QUERIES) as ctx:
+            self.client.get(RECIPE_URL, {
+                'tags': f'{self.vegan.id},{self.quick.id}',
+                'tags_match': 'all',
+            })
+        sql = ctx.captured_queries[0]['sql'].upper()
+        self.assertIn('HAVING', sql)
+        self.assertEqual(sql.count('JOIN'), 0)
+
+    def test_invalid_params_rejected(self):
+        """malformed filter values return a bad request"""
+        for params in ({'tags': 'a,b'}, {'price_min': 'cheap'},
+                       {'tags_match': 'some'}):
+            res = self.client.get(RECIPE_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
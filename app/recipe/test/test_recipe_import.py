@@ -0,0 +1,213 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from urllib.parse import urlencode
+
+from core.models import Recipe, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+IMPORT_URL = reverse('recipe:recipe-import-recipes')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+CSV_DATA = (
+    'title,price,time_minutes,link,tags,ingredients\n'
+    'Jollof Rice,10.00,60,,Party|Dinner,Rice|Pepper\n'
+    'Moi Moi,4.50,90,,Dinner,Beans\n'
+)
+
+
+def ndjson(*rows):
+    """return the rows as newline delimited json"""
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def sample_row(title, **params):
+    """return a valid ndjson row"""
+    row = {'title': title, 'price': '1.00', 'time_minutes': 5}
+    row.update(params)
+    return row
+
+
+class RecipeImportApiTestCase(TestCase):
+    """test the recipe upload endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content, params=None, **data):
+        """post a file to the import endpoint"""
+        if isinstance(content, str):
+            content = content.encode()
+        data['file'] = SimpleUploadedFile(name, content)
+        url = IMPORT_URL
+        if params:
+            url = f'{url}?{urlencode(params)}'
+        return self.client.post(url, data, format='multipart')
+
+    def test_import_csv(self):
+        """recipes, tags and ingredients are created from a csv file"""
+        res = self.upload('recipes.csv', CSV_DATA)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 2)
+        jollof = Recipe.objects.get(user=self.user, title='Jollof Rice')
+        self.assertEqual(
+            sorted(jollof.tags.values_list('name', flat=True)),
+            ['Dinner', 'Party']
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 3)
+
+    def test_import_reuses_existing_names(self):
+        """existing tags and ingredients are matched by name"""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        data = ndjson(sample_row('Toast', tags=['Dinner']))
+
+        res = self.upload('recipes.ndjson', data)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        toast = Recipe.objects.get(user=self.user, title='Toast')
+        self.assertEqual(list(toast.tags.all()), [tag])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+    def test_import_reports_invalid_rows(self):
+        """invalid rows are skipped and reported by row number"""
+        data = ndjson(sample_row('Good'), sample_row(''),
+                      sample_row('Bad price', price='cheap'))
+
+        res = self.upload('recipes.ndjson', data)
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['skipped'], 2)
+        self.assertEqual([error['row'] for error in res.data['errors']],
+                         [2, 3])
+
+    def test_import_reports_unparsable_lines(self):
+        """lines that are not json or not utf-8 are reported by line and
+        the lines after them are still imported"""
+        data = (ndjson(sample_row('First')).encode() + b'{"title": \n\n'
+                + b'\xff\xfe\n' + ndjson(sample_row('Last')).encode())
+
+        res = self.upload('recipes.ndjson', data)
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual(res.data['done'], 4)
+        self.assertEqual([(error['row'], error['line'])
+                          for error in res.data['errors']], [(2, 2), (3, 4)])
+
+    def test_import_csv_reports_undecodable_lines(self):
+        data = CSV_DATA.encode() + b'Ew\xe9du,1.00,5,,,\n' + \
+            b'Eba,2.00,10,,,Garri\n'
+
+        res = self.upload('recipes.csv', data)
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data['created'], 3)
+        self.assertEqual([error['line'] for error in res.data['errors']],
+                         [4])
+
+    def test_import_without_valid_rows(self):
+        """a file without a single valid row is a bad request"""
+        res = self.upload('recipes.ndjson', 'not json\n')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['done'], 1)
+        self.assertEqual(res.data['errors'][0]['line'], 1)
+
+    def test_import_skips_rows(self):
+        """skip resumes an upload after the rows already imported"""
+        data = ndjson(*[sample_row(f'recipe {i}') for i in range(4)])
+
+        res = self.upload('recipes.ndjson', data, params={'skip': 3})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['done'], 4)
+        self.assertEqual(list(Recipe.objects.filter(
+            user=self.user).values_list('title', flat=True)), ['recipe 3'])
+
+        res = self.upload('recipes.ndjson', data, params={'skip': -1})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_export_round_trip(self):
+        """a file produced by the export endpoint can be imported"""
+        self.upload('recipes.csv', CSV_DATA)
+        exported = b''.join(
+            self.client.get(EXPORT_URL).streaming_content
+        ).decode()
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.upload('export.ndjson', exported)
+
+        self.assertEqual(res.data['created'], 2)
+        moi = Recipe.objects.get(user=other, title='Moi Moi')
+        self.assertEqual(list(moi.ingredients.values_list('name', flat=True)),
+                         ['Beans'])
+        self.assertEqual(moi.ingredients.get().user, other)
+
+    def test_import_requires_known_type(self):
+        """files without a known type are rejected"""
+        res = self.upload('recipes.txt', CSV_DATA)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ImportRecipesCommandTestCase(TestCase):
+    """test the import_recipes management command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'recipes.ndjson')
+        with open(self.path, 'w') as f:
+            f.write(ndjson(*[sample_row(f'recipe {i}') for i in range(5)]))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_import_in_batches(self):
+        """the command writes the file in batches and reports progress"""
+        out = StringIO()
+        call_command('import_recipes', self.path, user=self.user.email,
+                     batch_size=2, stdout=out)
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        self.assertIn('imported 5 recipes', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_import_resumes_from_checkpoint(self):
+        """rows recorded in the checkpoint are not imported again"""
+        checkpoint = os.path.join(self.tmpdir.name, 'checkpoint')
+        with open(checkpoint, 'w') as f:
+            f.write('3')
+
+        call_command('import_recipes', self.path, user=self.user.email,
+                     checkpoint=checkpoint, stdout=StringIO())
+
+        titles = Recipe.objects.filter(user=self.user).values_list(
+            'title', flat=True)
+        self.assertEqual(sorted(titles), ['recipe 3', 'recipe 4'])
+        with open(checkpoint) as f:
+            self.assertEqual(f.read(), '5')
@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+from core.models import Recipe, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from recipe.serializers import (
+    RecipeListSerializer, RecipeSerializer, recipe_rows,
+)
+from recipe.views import user_recipes
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class RecipeListSerializerTestCase(TestCase):
+    """the fast list serializer gives the same output as RecipeSerializer"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+        tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                for i in range(4)]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ingredient {i}')
+            for i in range(3)
+        ]
+        recipes = [
+            ('Jollof Rice', Decimal('5'), 'https://example.com/jollof'),
+            ('Ọbẹ̀ Ata   "stew"', Decimal('0.5'), ''),
+            ('Moi Moi', Decimal('999.99'), ''),
+            ('Plain', Decimal('12.30'), ''),
+        ]
+        for title, price, link in recipes:
+            Recipe.objects.create(user=self.user, title=title, price=price,
+                                  time_minutes=20, link=link)
+        first, second, third, _ = Recipe.objects.order_by('id')
+        # linked out of id order, both serializers list ids ascending
+        first.tags.add(tags[3])
+        first.tags.add(tags[0], tags[2])
+        first.ingredients.add(ingredients[2], ingredients[0])
+        second.tags.add(tags[1])
+        third.ingredients.add(*ingredients)
+
+    def expected(self):
+        return RecipeSerializer(user_recipes(self.user), many=True).data
+
+    def test_same_data(self):
+        """rows give the same data as the model serializer"""
+        data = RecipeListSerializer(recipe_rows(user_recipes(self.user)),
+                                    many=True).data
+
+        self.assertEqual(data, self.expected())
+        self.assertEqual(data[0]['tags'], sorted(data[0]['tags']))
+        self.assertEqual([row['price'] for row in data],
+                         ['5.00', '0.50', '999.99', '12.30'])
+        self.assertEqual(data[3]['tags'], [])
+
+    def test_same_json(self):
+        """rows render to the same bytes, keys in the same order"""
+        data = RecipeListSerializer(recipe_rows(user_recipes(self.user)),
+                                    many=True).data
+
+        self.assertEqual(JSONRenderer().render(data),
+                         JSONRenderer().render(self.expected()))
+
+    def test_list_response_unchanged(self):
+        """the list endpoint returns the page RecipeSerializer would"""
+        expected = JSONRenderer().render({
+            'next': None, 'previous': None, 'results': self.expected(),
+        })
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, expected)
+
+    def test_filtered_list_unchanged(self):
+        """filters apply to the rows like to the model queryset"""
+        tag = Tag.objects.get(name='tag 1')
+
+        res = self.client.get(RECIPE_URL, {'tags': tag.id})
+
+        self.assertEqual(
+            res.data['results'],
+            RecipeSerializer(user_recipes(self.user).filter(tags=tag),
+                             many=True).data,
+        )
@@ -0,0 +1,127 @@
+from core.models import Recipe, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+# one page query, plus one per relation on backends without id arrays
+LIST_QUERIES = 1 if connection.vendor == 'postgresql' else 3
+
+
+def detail_url(recipe_id):
+    """return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def sample_recipe(user, tags=1, ingredients=1, **params):
+    """create a recipe with the given number of tags and ingredients"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, **defaults)
+    for i in range(tags):
+        recipe.tags.add(Tag.objects.create(user=user, name=f'tag {i}'))
+    for i in range(ingredients):
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=user, name=f'ingredient {i}')
+        )
+    return recipe
+
+
+class RecipeQueryCountTestCase(TestCase):
+    """make sure the recipe endpoints run a constant number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_query_count(self):
+        """listing recipes costs a fixed number of queries"""
+        for _ in range(10):
+            sample_recipe(self.user, tags=3, ingredients=5)
+
+        with self.assertNumQueries(LIST_QUERIES):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 10)
+
+    def test_list_query_count_does_not_grow(self):
+        """adding more recipes does not add queries to the list endpoint"""
+        sample_recipe(self.user)
+        with self.assertNumQueries(LIST_QUERIES):
+            self.client.get(RECIPE_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(20):
+                sample_recipe(self.user, tags=2, ingredients=2)
+        with self.assertNumQueries(LIST_QUERIES):
+            self.client.get(RECIPE_URL)
+
+    def test_retrieve_query_count(self):
+        """retrieving a recipe with nested tags and ingredients"""
+        recipe = sample_recipe(self.user, tags=5, ingredients=10)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['ingredients']), 10)
+
+    def test_partial_update_query_count(self):
+        """updating scalar fields does not depend on the number of relations"""
+        recipe = sample_recipe(self.user, tags=5, ingredients=10)
+
+        with self.assertNumQueries(6):
+            res = self.client.patch(detail_url(recipe.id), {'title': 'New'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_create_query_count(self):
+        """creating a recipe does not depend on how many recipes exist"""
+        for _ in range(10):
+            sample_recipe(self.user, tags=2, ingredients=2)
+        payload = {
+            'title': 'Fried Rice',
+            'time_minutes': 30,
+            'price': 10.00
+        }
+
+        with self.assertNumQueries(5):
+            res = self.client.post(RECIPE_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_create_with_relations_query_count(self):
+        """submitted tag and ingredient ids are resolved one query each"""
+        tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                for i in range(10)]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ing {i}')
+            for i in range(10)
+        ]
+        payload = {
+            'title': 'Fried Rice',
+            'time_minutes': 30,
+            'price': 10.00,
+            'tags': [tag.id for tag in tags],
+            'ingredients': [ingredient.id for ingredient in ingredients]
+        }
+
+        with self.assertNumQueries(13):
+            res = self.client.post(RECIPE_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['tags']), 10)
@@ -0,0 +1,78 @@
+from core.models import Recipe, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+SEARCH_URL = reverse('recipe:recipe-search')
+
+
+def sample_recipe(user, **params):
+    """create and return sample recipe"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSearchTestCase(TestCase):
+    """test the recipe search endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.jollof = sample_recipe(self.user, title='Jollof Rice')
+        self.moi = sample_recipe(self.user, title='Moi Moi')
+        self.moi.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        self.moi.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Beans')
+        )
+
+    def search(self, text):
+        """return the titles found for the search text"""
+        res = self.client.get(SEARCH_URL, {'q': text})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [row['title'] for row in res.data]
+
+    def test_search_title(self):
+        """recipes are found by a word of their title"""
+        self.assertEqual(self.search('jollof'), ['Jollof Rice'])
+
+    def test_search_tag_and_ingredient_names(self):
+        """recipes are found by the names of their tags and ingredients"""
+        self.assertEqual(self.search('vegan'), ['Moi Moi'])
+        self.assertEqual(self.search('beans'), ['Moi Moi'])
+
+    def test_search_all_terms_required(self):
+        """every term of the search text has to match"""
+        self.assertEqual(self.search('moi beans'), ['Moi Moi'])
+        self.assertEqual(self.search('jollof beans'), [])
+
+    def test_search_follows_relation_changes(self):
+        """linking a tag makes the recipe searchable by its name"""
+        self.jollof.tags.add(Tag.objects.create(user=self.user, name='Party'))
+        self.assertEqual(self.search('party'), ['Jollof Rice'])
+
+    def test_search_limited_to_user(self):
+        """other users' recipes are never returned"""
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        sample_recipe(other, title='Jollof Spaghetti')
+        self.assertEqual(self.search('jollof'), ['Jollof Rice'])
+
+    def test_search_requires_query(self):
+        """the q param is required"""
+        res = self.client.get(SEARCH_URL)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,81 @@
+from core.models import Recipe, Ingredient
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from recipe import shopping
+
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+
+def sample_recipe(user, ingredients, **params):
+    """create and return sample recipe with the given ingredients"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class ShoppingListTestCase(TestCase):
+    """test the shopping list endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.rice, self.tomato, self.beans = (
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Rice', 'Tomato', 'Beans')
+        )
+        self.jollof = sample_recipe(self.user, [self.rice, self.tomato])
+        self.fried = sample_recipe(self.user, [self.rice])
+        self.moi = sample_recipe(self.user, [self.beans])
+
+    def shopping_list(self, *recipes):
+        res = self.client.get(SHOPPING_LIST_URL, {
+            'recipes': ','.join(str(recipe.id) for recipe in recipes)
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_ingredients_merged(self):
+        """every ingredient once, with the number of recipes using it"""
+        with self.assertNumQueries(1):
+            data = self.shopping_list(self.jollof, self.fried)
+
+        self.assertEqual(data, [
+            {'id': self.rice.id, 'name': 'Rice', 'recipe_count': 2},
+            {'id': self.tomato.id, 'name': 'Tomato', 'recipe_count': 1},
+        ])
+
+    def test_other_users_recipes_ignored(self):
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        recipe = sample_recipe(
+            other, [Ingredient.objects.create(user=other, name='Salt')]
+        )
+
+        data = self.shopping_list(self.moi, recipe)
+
+        self.assertEqual([item['name'] for item in data], ['Beans'])
+
+    def test_invalid_params(self):
+        """recipes are required, as at most MAX_RECIPES ids"""
+        too_many = ','.join(map(str, range(1, shopping.MAX_RECIPES + 2)))
+        for params in ({}, {'recipes': 'a,b'}, {'recipes': too_many}):
+            res = self.client.get(SHOPPING_LIST_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,186 @@
+from io import StringIO
+
+from core.models import Recipe, RecipeSignature, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from recipe import similarity
+
+BULK_URL = reverse('recipe:recipe-bulk')
+# one row per band, so even the low similarities of these small sets are
+# candidates whatever ids the recipes get
+SIMILARITY = {'PERMUTATIONS': 64, 'BANDS': 64}
+
+
+def similar_url(recipe_id):
+    """return the similar recipes url of a recipe"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+@override_settings(RECIPE_SIMILARITY=SIMILARITY)
+class SimilarRecipesTestCase(TestCase):
+    """test the similar recipes endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.rice, self.tomato, self.pepper, self.beans = (
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Rice', 'Tomato', 'Pepper', 'Beans')
+        )
+        self.spicy = Tag.objects.create(user=self.user, name='Spicy')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jollof = self.recipe(
+                'Jollof Rice', [self.rice, self.tomato, self.pepper],
+                [self.spicy]
+            )
+            self.fried = self.recipe('Fried Rice', [self.rice, self.pepper],
+                                     [self.spicy])
+            self.white = self.recipe('White Rice', [self.rice])
+            self.moi = self.recipe('Moi Moi', [self.beans])
+
+    def recipe(self, title, ingredients, tags=()):
+        recipe = Recipe.objects.create(user=self.user, title=title,
+                                       time_minutes=10, price=5)
+        recipe.ingredients.add(*ingredients)
+        recipe.tags.add(*tags)
+        return recipe
+
+    def similar(self, recipe, **params):
+        """return the (title, similarity) of the similar recipes"""
+        res = self.client.get(similar_url(recipe.id), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(match['recipe']['title'], match['similarity'])
+                for match in res.data]
+
+    def test_similar_recipes_by_jaccard(self):
+        """recipes sharing ingredients or tags, most similar first"""
+        self.assertEqual(self.similar(self.jollof), [
+            ('Fried Rice', 0.75), ('White Rice', 0.25),
+        ])
+
+    def test_limit(self):
+        res = self.client.get(similar_url(self.jollof.id), {'limit': 1})
+
+        self.assertEqual([match['recipe']['id'] for match in res.data],
+                         [self.fried.id])
+        self.assertIn('ingredients', res.data[0]['recipe'])
+
+    def test_signatures_follow_changes(self):
+        """ingredients added or removed on either side are picked up"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.moi.ingredients.add(self.rice)
+            self.fried.ingredients.remove(self.pepper)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beans.recipe_set.add(self.white)
+
+        self.assertEqual(self.similar(self.moi), [
+            ('White Rice', 1.0), ('Fried Rice', 0.333),
+            ('Jollof Rice', 0.2),
+        ])
+
+    def test_deleted_ingredient_unlinked(self):
+        """deleting an ingredient updates the recipes that used it"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tomato.delete()
+
+        self.assertEqual(self.similar(self.jollof)[0], ('Fried Rice', 1.0))
+
+    def test_recipe_without_links(self):
+        """a recipe without ingredients or tags is similar to none"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.moi.ingredients.clear()
+
+        self.assertEqual(self.similar(self.moi), [])
+        self.assertFalse(
+            RecipeSignature.objects.filter(recipe=self.moi).exists()
+        )
+
+    def test_other_users_recipe_not_found(self):
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        recipe = Recipe.objects.create(user=other, title='Other',
+                                       time_minutes=10, price=5)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_created_recipes_signed(self):
+        """bulk inserts sign their recipes without m2m signals"""
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(BULK_URL, [{
+                'title': 'Rice and Beans', 'time_minutes': 20,
+                'price': '4.00', 'ingredients': [self.rice.id, self.beans.id],
+            }], format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(self.similar(self.moi)[0], ('Rice and Beans', 0.5))
+
+    def test_bulk_changes_signed(self):
+        """bulk updates re-sign their recipes, bulk deletes drop them"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(BULK_URL, [
+                {'id': self.moi.id, 'ingredients': [self.rice.id]},
+            ], format='json')
+        self.assertEqual(self.similar(self.moi)[0], ('White Rice', 1.0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.delete(BULK_URL, [self.white.id],
+                                     format='json')
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertFalse(
+            RecipeSignature.objects.filter(recipe_id=self.white.id).exists()
+        )
+        self.assertEqual(self.similar(self.moi)[0][0], 'Fried Rice')
+
+    def test_rebuild_command(self):
+        """the command signs recipes written without signals"""
+        RecipeSignature.objects.all().delete()
+        Recipe.ingredients.through.objects.create(
+            recipe=self.moi, ingredient=self.rice
+        )
+        out = StringIO()
+
+        call_command('rebuild_recipe_signatures', '--user', self.user.email,
+                     stdout=out)
+
+        self.assertIn('recipes: 4 signed', out.getvalue())
+        self.assertEqual(self.similar(self.moi)[0], ('White Rice', 0.5))
+
+
+class MinHashTests(SimpleTestCase):
+
+    def test_batch_matches_single(self):
+        """the batch computation gives the signatures of minhash"""
+        tokens = {1: [4, 9, 10], 2: [], 3: [similarity.PRIME - 1]}
+
+        signatures = similarity.minhash_many(tokens)
+
+        self.assertEqual(signatures, {
+            pk: similarity.minhash(values) for pk, values in tokens.items()
+        })
+        self.assertIsNone(signatures[2])
+
+    def test_estimate(self):
+        first = similarity.minhash(list(range(100)))
+        second = similarity.minhash(list(range(50, 150)))
+
+        self.assertEqual(similarity.estimate(first, first), 1.0)
+        self.assertAlmostEqual(similarity.estimate(first, second), 1 / 3,
+                               delta=0.2)
+        self.assertEqual(len(similarity.band_keys(first)),
+                         similarity.get_setting('BANDS'))
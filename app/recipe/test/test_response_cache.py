@@ -0,0 +1,164 @@
+from core.models import Recipe, Tag, Ingredient
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+INGREDIENT_URL = reverse('recipe:ingredient-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def detail_url(recipe_id):
+    """return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def sample_recipe(user, **params):
+    """create and return sample recipe"""
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ResponseCacheTestCase(TestCase):
+    """test the per-user response cache of the recipe api"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_served_from_cache(self):
+        """a repeated list request does not query the database"""
+        sample_recipe(self.user)
+        first = self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPE_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_not_modified(self):
+        """a matching If-None-Match gets a 304 without a body"""
+        res = self.client.get(TAG_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(res.content)
+
+    def test_save_invalidates(self):
+        """creating a tag changes the tag list and its etag"""
+        res = self.client.get(TAG_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(user=self.user, name='vegan')
+
+        new = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(new.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(new['ETag'], res['ETag'])
+        self.assertEqual(len(new.data['results']), 1)
+
+    def test_delete_invalidates(self):
+        """deleting an ingredient changes the ingredient list"""
+        ingredient = Ingredient.objects.create(user=self.user, name='salt')
+        self.client.get(INGREDIENT_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.delete()
+
+        res = self.client.get(INGREDIENT_URL)
+        self.assertEqual(res.data['results'], [])
+
+    def test_relation_change_invalidates_detail(self):
+        """adding a tag to a recipe changes its detail response"""
+        recipe = sample_recipe(self.user)
+        self.client.get(detail_url(recipe.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.add(Tag.objects.create(user=self.user, name='vegan'))
+
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_bulk_create_invalidates(self):
+        """the bulk endpoint invalidates the recipe list"""
+        self.client.get(RECIPE_URL)
+        payload = [{'title': 'Toast', 'time_minutes': 2, 'price': '1.00'}]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(BULK_URL, payload, format='json')
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_bulk_update_and_delete_invalidate(self):
+        """bulk updates and deletes invalidate the recipe list"""
+        recipe = sample_recipe(self.user)
+        self.client.get(RECIPE_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(BULK_URL, [{'id': recipe.id, 'title': 'New'}],
+                              format='json')
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'][0]['title'], 'New')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(BULK_URL, [recipe.id], format='json')
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'], [])
+
+    def test_invalidated_on_commit(self):
+        """the version is only bumped once the change commits, a response
+        read before the commit is not cached under the new version"""
+        res = self.client.get(TAG_URL)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Tag.objects.create(user=self.user, name='vegan')
+
+        stale = self.client.get(TAG_URL)
+        self.assertEqual(stale['ETag'], res['ETag'])
+
+        for callback in callbacks:
+            callback()
+        res = self.client.get(TAG_URL)
+        self.assertNotEqual(res['ETag'], stale['ETag'])
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_cache_is_per_user(self):
+        """responses are never shared between users"""
+        sample_recipe(self.user)
+        res = self.client.get(RECIPE_URL)
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+    def test_other_user_changes_keep_cache(self):
+        """writes by another user do not invalidate this user's cache"""
+        self.client.get(TAG_URL)
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com',
+            password='testpass'
+        )
+        Tag.objects.create(user=other, name='vegan')
+
+        with self.assertNumQueries(0):
+            self.client.get(TAG_URL)
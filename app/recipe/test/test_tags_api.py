@@ -1,6 +1,6 @@
-from core.models import Tag
+from core.models import Tag, Recipe
 from django.contrib.auth import get_user_model
-from django.urls import reverse
+from django.urls import NoReverseMatch, reverse
 from django.test import TestCase
 
 from rest_framework.test import APIClient
@@ -44,7 +44,7 @@ class PrivateTagApiTestCase(TestCase):
         res = self.client.get(TAG_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_authenticated_user_tags(self):
         """will retrieve the list of all tags for an authenticated user"""
@@ -59,8 +59,8 @@ class PrivateTagApiTestCase(TestCase):
         res = self.client.get(TAG_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
 
     def test_creating_tag_success(self):
         """Will test creating a new tag with valid payload will be successful"""
@@ -80,3 +80,67 @@ class PrivateTagApiTestCase(TestCase):
         }
         res = self.client.post(TAG_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_assigned_only(self):
+        """assigned_only lists the tags used by at least one recipe"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=10, price=5.00)
+        recipe.tags.add(vegan)
+
+        res = self.client.get(TAG_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [
+            {'id': vegan.id, 'name': 'Vegan', 'recipe_count': 1},
+        ])
+
+    def test_order_by_usage(self):
+        """ordering=usage lists the most used tags first"""
+        tags = [Tag.objects.create(user=self.user, name=name)
+                for name in ('Vegan', 'Dessert', 'Spicy')]
+        for i in range(3):
+            recipe = Recipe.objects.create(user=self.user, title=f'r {i}',
+                                           time_minutes=10, price=5.00)
+            recipe.tags.add(*tags[:i + 1])
+
+        res = self.client.get(TAG_URL, {'ordering': 'usage'})
+
+        self.assertEqual([tag['name'] for tag in res.data['results']],
+                         ['Vegan', 'Dessert', 'Spicy'])
+        self.assertEqual([tag['recipe_count'] for tag in res.data['results']],
+                         [3, 2, 1])
+
+    def test_usage_pages_through_ties(self):
+        """tags with the same count are paged by their ids, each once"""
+        tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                for i in range(5)]
+        recipe = Recipe.objects.create(user=self.user, title='r',
+                                       time_minutes=10, price=5.00)
+        recipe.tags.add(tags[2])
+
+        ids = []
+        res = self.client.get(TAG_URL, {'ordering': 'usage', 'page_size': 2})
+        while True:
+            ids += [tag['id'] for tag in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(ids, [tags[2].id] + [
+            tag.id for tag in reversed(tags) if tag != tags[2]
+        ])
+
+    def test_invalid_attr_filters(self):
+        """unknown assigned_only and ordering values are rejected"""
+        res = self.client.get(TAG_URL, {'assigned_only': 'maybe'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(TAG_URL, {'ordering': 'popularity'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_no_detail_route(self):
+        """tags are listed and created only, there is no detail route"""
+        with self.assertRaises(NoReverseMatch):
+            reverse('recipe:tag-detail', args=[1])
@@ -1,5 +1,5 @@
 from django.urls import path, include
-from recipe import views
+from recipe import async_views, views
 from rest_framework.routers import DefaultRouter
 
 app_name = 'recipe'
@@ -8,6 +8,16 @@ router.register('tags', views.TagViewSet)
 router.register('ingredient', views.IngredientViewSet)
 router.register('recipe', views.RecipeViewSet)
 
+async_urlpatterns = [
+    path('recipe/', async_views.recipe_list, name='async-recipe-list'),
+    path('recipe/<int:pk>/', async_views.recipe_detail,
+         name='async-recipe-detail'),
+    path('tags/', async_views.tag_list, name='async-tag-list'),
+    path('ingredient/', async_views.ingredient_list,
+         name='async-ingredient-list'),
+]
+
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
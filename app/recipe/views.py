@@ -1,19 +1,65 @@
-from rest_framework import viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
+import os
+
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, mixins, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from recipe import serializers
+from core.authentication import CachedTokenAuthentication
+from core.sharding import ShardedViewMixin
+from recipe import pantry, serializers, shopping, similarity
+from recipe.cache import (
+    CachedListMixin, CachedResponseMixin, version_changed,
+)
+from recipe.export import EXPORT_FORMATS, iter_recipes
+from recipe.filters import (
+    filter_recipe_attrs, filter_recipes, import_params, pantry_params,
+    shopping_list_params,
+)
+from recipe.importer import (
+    IMPORT_TYPES, DecodedLines, RecipeImporter, parse_rows,
+)
+from recipe.search import search_recipes
+from recipe.pagination import RecipeCursorPagination
 from core.models import Tag, Ingredient, Recipe
 
 
-class BaseRecipeAttr(viewsets.GenericViewSet,
+def user_recipe_attrs(model, user):
+    """the tags or ingredients of the user in list order"""
+    return model.objects.filter(user=user).order_by('-name', '-id')
+
+
+def user_recipes(user):
+    """the recipes of the user with their relations in list order
+
+    tags and ingredients are ordered by id, as in recipe_rows
+    """
+    return Recipe.objects.filter(user=user).defer(
+        'search_vector'
+    ).prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch('ingredients', queryset=Ingredient.objects.order_by('id')),
+    ).order_by('id')
+
+
+class BaseRecipeAttr(ShardedViewMixin,
+                     CachedListMixin,
+                     viewsets.GenericViewSet,
                      mixins.ListModelMixin,
                      mixins.CreateModelMixin):
     """base class for users recipe"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeCursorPagination
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = user_recipe_attrs(self.queryset.model, self.request.user)
+        if self.action == 'list':
+            queryset = filter_recipe_attrs(queryset, self.request.query_params)
+        return queryset
 
     def perform_create(self, serializer):
         return serializer.save(user=self.request.user)
@@ -32,17 +78,46 @@ class IngredientViewSet(BaseRecipeAttr):
     serializer_class = serializers.IngredientSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ShardedViewMixin, CachedResponseMixin,
+                    viewsets.ModelViewSet):
     """viewset for recipe objects"""
 
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeCursorPagination
+    search_max_results = 100
+    export_chunk_size = 1000
+    import_batch_size = 1000
 
     def get_queryset(self):
         """get the queryset for the current user"""
-        return self.queryset.filter(user=self.request.user).order_by('id')
+        queryset = user_recipes(self.request.user)
+        if self.action == 'list':
+            queryset = serializers.recipe_rows(
+                filter_recipes(queryset, self.request.query_params)
+            )
+        return queryset
+
+    def recipe_results(self, results, name):
+        """the listed recipes of [(recipe id, value)], in that order, each
+        as {'recipe': ..., name: value}"""
+        rows = serializers.recipe_rows(self.get_queryset().filter(
+            pk__in=[recipe_id for recipe_id, _ in results]
+        ))
+        recipes = {recipe['id']: recipe
+                   for recipe in self.get_serializer(rows, many=True).data}
+        return [{'recipe': recipes[recipe_id], name: value}
+                for recipe_id, value in results if recipe_id in recipes]
+
+    def get_result_limit(self):
+        """the limit query param of search and what-can-i-cook"""
+        try:
+            return min(int(self.request.query_params.get('limit', 20)),
+                       self.search_max_results)
+        except ValueError:
+            raise ValidationError({'limit': 'Expected an integer.'})
 
     def perform_create(self, serializer):
         """create the recipe instance"""
@@ -50,8 +125,147 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def get_serializer_class(self):
         """get and return the serializer class for the right verb/method"""
+        if self.action in ('list', 'what_can_i_cook', 'similar'):
+            return serializers.RecipeListSerializer
         if self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
+        if self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
         return self.serializer_class
 
+    @action(methods=['post', 'put', 'patch', 'delete'], detail=False)
+    def bulk(self, request):
+        """create, update or delete a list of recipes in a single
+        transaction, updates and deletes name the recipes by id"""
+        user = request.user
+        if request.method == 'DELETE':
+            serializer = serializers.RecipeBulkDeleteSerializer(
+                data=request.data, context=self.get_serializer_context()
+            )
+            serializer.is_valid(raise_exception=True)
+            self.bulk_changed(serializer.delete(), deleted=True)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=request.data, many=True)
+            serializer.is_valid(raise_exception=True)
+            recipes = serializer.save(user=user)
+            code = status.HTTP_201_CREATED
+        else:
+            serializer = self.get_serializer(
+                Recipe.objects.filter(user=user).defer('search_vector'),
+                data=request.data, many=True,
+                partial=request.method == 'PATCH',
+            )
+            serializer.is_valid(raise_exception=True)
+            recipes = serializer.save()
+            code = status.HTTP_200_OK
+        ids = [recipe.pk for recipe in recipes]
+        self.bulk_changed(ids)
+
+        queryset = self.get_queryset().filter(pk__in=ids)
+        data = serializers.RecipeSerializer(queryset, many=True).data
+        return Response(data, status=code)
+
+    def bulk_changed(self, recipe_ids, deleted=False):
+        """do what the signals a bulk write does not send would do:
+        invalidate the cached responses and the pantry index, and update
+        the similarity signatures, once the transaction commits"""
+        user = self.request.user
+        version_changed(user.pk, user.shard)
+        pantry.index_changed(user.pk, user.shard)
+        if not deleted:
+            similarity.signatures_changed(recipe_ids, user.shard)
+
+    @action(methods=['get'], detail=False)
+    def search(self, request):
+        """return the recipes that best match the q query param"""
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'This query param is required.'})
+        limit = self.get_result_limit()
+
+        queryset = search_recipes(self.get_queryset(), text)[:max(limit, 1)]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(methods=['get'], detail=False, url_path='what-can-i-cook')
+    def what_can_i_cook(self, request):
+        """return the recipes that can be cooked with the ingredients at
+        hand, or lack at most `missing` of theirs, fewest missing first"""
+        ids, names, missing = pantry_params(request.query_params,
+                                            pantry.MAX_MISSING)
+        limit = self.get_result_limit()
+
+        matches = pantry.what_can_i_cook(request.user, ids, names, missing,
+                                         max(limit, 1))
+        return Response(self.recipe_results(matches, 'missing'))
+
+    @action(methods=['get'], detail=True)
+    def similar(self, request, pk=None):
+        """return the recipes most alike this one by their ingredients and
+        tags, with their estimated jaccard similarity, best first"""
+        limit = self.get_result_limit()
+        recipe = get_object_or_404(
+            self.get_queryset().prefetch_related(None).only('id'), pk=pk
+        )
+
+        matches = similarity.similar_recipes(request.user, recipe.pk,
+                                             max(limit, 1))
+        return Response(self.recipe_results(
+            [(recipe_id, round(score, 3)) for recipe_id, score in matches],
+            'similarity',
+        ))
+
+    @action(methods=['get'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """return the ingredients of the recipes given by id, each once with
+        the number of those recipes that use it"""
+        ids = shopping_list_params(request.query_params,
+                                   shopping.MAX_RECIPES)
+        return Response(shopping.shopping_list(request.user, ids))
+
+    @action(methods=['get'], detail=False)
+    def export(self, request):
+        """stream every recipe of the user as ndjson (default) or csv"""
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in EXPORT_FORMATS:
+            raise ValidationError(
+                {'type': f'Expected one of {", ".join(EXPORT_FORMATS)}.'}
+            )
+        render, content_type = EXPORT_FORMATS[export_type]
+
+        recipes = iter_recipes(request.user, self.export_chunk_size)
+        response = StreamingHttpResponse(render(recipes),
+                                         content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{export_type}"'
+        )
+        return response
+
+    @action(methods=['post'], detail=False, url_path='import')
+    def import_recipes(self, request):
+        """import an uploaded csv or ndjson file of recipes"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'This field is required.'})
+        import_type = request.data.get('type') or os.path.splitext(
+            upload.name)[1].lstrip('.').lower()
+        if import_type not in IMPORT_TYPES:
+            raise ValidationError(
+                {'type': f'Expected one of {", ".join(IMPORT_TYPES)}.'}
+            )
 
+        importer = RecipeImporter(request.user,
+                                  batch_size=self.import_batch_size,
+                                  skip=import_params(request.query_params))
+        importer.run(parse_rows(DecodedLines(upload), import_type))
+        # 207 when only some rows were imported, the errors and `done`
+        # tell the client what to fix and where to resume
+        if not importer.skipped:
+            response_status = status.HTTP_201_CREATED
+        elif importer.created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(importer.report(), status=response_status)
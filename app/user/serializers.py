@@ -2,8 +2,10 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import gettext_lazy as _
 
+from core.metrics import MeasuredSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """Serializer for the users object"""
     # password = serializers.CharField(
     #     style={'input_type': 'password'},
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+TOKEN_URL = reverse('user:token')
+PBKDF2_HASHERS = ['core.hashers.PBKDF2PasswordHasher',
+                  'django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class TokenLoginTest(TestCase):
+    """Test the token login fast path"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {'email': 'test@mail.com', 'password': 'testpass'}
+        self.user = get_user_model().objects.create_user(**self.payload)
+
+    def test_existing_token_reused_in_one_query(self):
+        """an existing token is loaded together with the user"""
+        token = Token.objects.create(user=self.user)
+
+        with self.assertNumQueries(1):
+            res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['token'], token.key)
+
+    def test_token_created_once(self):
+        """the first login creates the token, later logins return it"""
+        first = self.client.post(TOKEN_URL, self.payload)
+        second = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(first.data['token'], second.data['token'])
+        self.assertEqual(Token.objects.filter(user=self.user).count(), 1)
+
+    def test_inactive_user_rejected(self):
+        """an inactive user cannot get a token"""
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.post(TOKEN_URL, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(PASSWORD_HASHERS=PBKDF2_HASHERS,
+                       PASSWORD_HASH_ITERATIONS=1000)
+    def test_password_rehashed_on_login(self):
+        """a hash from a non preferred hasher is upgraded on login"""
+        self.user.password = make_password(self.payload['password'],
+                                           hasher='md5')
+        self.user.save()
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    @override_settings(PASSWORD_HASHERS=PBKDF2_HASHERS,
+                       PASSWORD_HASH_ITERATIONS=2000)
+    def test_password_rehashed_when_iterations_change(self):
+        """changing the work factor upgrades hashes on the next login"""
+        with self.settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.user.set_password(self.payload['password'])
+            self.user.save()
+
+        self.client.post(TOKEN_URL, self.payload)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
@@ -1,6 +1,8 @@
 from django.shortcuts import render
 from .serializers import UserSerializer, AuthTokenSerializer
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.generics import CreateAPIView
 
@@ -12,3 +14,14 @@ class CreateTokenView(ObtainAuthToken):
     """create new authentication token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        try:
+            # loaded together with the user by the authentication backend
+            token = user.auth_token
+        except Token.DoesNotExist:
+            token, created = Token.objects.get_or_create(user=user)
+        return Response({'token': token.key})